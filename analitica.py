@@ -0,0 +1,217 @@
+# analitica.py
+"""Copia analítica local (Parquet) de compras, asientos y entidades, consultada con DuckDB.
+
+`sincronizar()` lee la base transaccional una sola vez por corrida y escribe
+`<directorio>/<tabla>/mes=AAAA-MM/datos.parquet`. Es incremental: solo se
+reescriben los meses con filas nuevas (id mayor a la marca de agua del
+manifiesto) y los meses abiertos, que todavía pueden cambiar. Un mes cerrado
+se exporta una vez y queda sellado con la fecha de su cierre; si se reabre o se
+vuelve a cerrar, se exporta de nuevo. `entidades` es pequeña y se copia entera.
+
+Los reportes comparativos corren con DuckDB sobre esos archivos, sin carga para
+la base que recibe los registros. Salvedad: `saldo_pendiente` de un mes sellado
+refleja el momento de su exportación; `sincronizar(completo=True)` lo rehace todo.
+
+Uso fuera de Streamlit (cron): python analitica.py --sincronizar [--completo]
+"""
+import glob
+import json
+import os
+import sys
+from datetime import datetime
+import duckdb
+import pandas as pd
+import streamlit as st
+import database
+import periodos
+
+MANIFIESTO = "manifiesto.json"
+
+# Grupo -> (tabla que da la marca de agua, tablas que se exportan por mes)
+GRUPOS = {
+    "compras": ("compras", ("compras",)),
+    "asientos": ("asientos_cabecera", ("asientos_cabecera", "asientos_detalle")),
+}
+
+SQL_MESES_NUEVOS = "SELECT DISTINCT to_char(fecha, 'YYYY-MM') FROM {tabla} WHERE id > %s AND fecha IS NOT NULL"
+
+# El detalle se particiona por la fecha de su cabecera
+SQL_MES = {
+    "compras": "SELECT * FROM compras WHERE fecha >= %(desde)s AND fecha < %(hasta)s ORDER BY id",
+    "asientos_cabecera": "SELECT * FROM asientos_cabecera WHERE fecha >= %(desde)s AND fecha < %(hasta)s ORDER BY id",
+    "asientos_detalle": """SELECT d.*, a.fecha FROM asientos_detalle d JOIN asientos_cabecera a ON a.id = d.asiento_id
+                           WHERE a.fecha >= %(desde)s AND a.fecha < %(hasta)s ORDER BY d.id""",
+}
+
+SQL_COMPRAS_MENSUAL = """
+    SELECT CAST(year(fecha) AS INTEGER) AS ano, CAST(month(fecha) AS INTEGER) AS mes, COUNT(*) AS documentos,
+           SUM(base_imponible) AS base_imponible, SUM(iva_monto) AS iva_monto,
+           SUM(iva_retenido) AS iva_retenido, SUM(total_factura) AS total_factura
+    FROM compras WHERE list_contains(?, CAST(year(fecha) AS INTEGER))
+    GROUP BY 1, 2 ORDER BY 1, 2
+"""
+
+SQL_MOVIMIENTOS_CUENTA = """
+    SELECT cuenta_codigo, CAST(year(fecha) AS INTEGER) AS ano, SUM(debe) AS debe, SUM(haber) AS haber,
+           SUM(debe) - SUM(haber) AS saldo
+    FROM asientos_detalle WHERE list_contains(?, CAST(year(fecha) AS INTEGER))
+    GROUP BY 1, 2 ORDER BY 1, 2
+"""
+
+SQL_LIBRO_COMPRAS = """
+    SELECT c.id, c.fecha, e.rif, e.nombre, c.num_factura, c.num_control, c.tipo_documento,
+           c.base_imponible, c.iva_monto, c.iva_retenido, c.total_factura, c.saldo_pendiente
+    FROM compras c JOIN entidades e ON c.rif_proveedor = e.rif
+    WHERE c.mes = ?
+    ORDER BY c.fecha, c.id
+"""
+
+def directorio():
+    """Carpeta de la copia analítica; configurable en secrets [analitica]: directorio."""
+    try:
+        conf = st.secrets.get("analitica", {})
+    except Exception:
+        conf = {}
+    return conf.get("directorio", ".analitica")
+
+def _escribir_atomico(ruta, escribir):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + ".tmp"
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+def _leer_manifiesto(base):
+    try:
+        with open(os.path.join(base, MANIFIESTO), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _guardar_manifiesto(base, manifiesto):
+    def escribir(ruta):
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+    _escribir_atomico(os.path.join(base, MANIFIESTO), escribir)
+
+def _escribir_particion(base, tabla, mes, df):
+    """Reemplaza la partición del mes; un mes que quedó vacío se elimina. Retorna las filas escritas."""
+    ruta = os.path.join(base, tabla, f"mes={mes}", "datos.parquet")
+    if df.empty:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        return 0
+    _escribir_atomico(ruta, lambda temporal: df.to_parquet(temporal, index=False))
+    return len(df)
+
+def sincronizar(completo=False, progreso=None):
+    """Actualiza la copia analítica. Retorna {grupo: meses reescritos} más las filas de entidades."""
+    base = directorio()
+    manifiesto = {} if completo else _leer_manifiesto(base)
+    resumen = {}
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            # Una sola foto consistente de todas las tablas
+            c.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            c.execute("SELECT periodo, cerrado_en FROM periodos_fiscales WHERE estatus = %s", (periodos.CERRADO,))
+            cierres = {p: (f.isoformat() if f else "") for p, f in c.fetchall()}
+
+        for grupo, (tabla_marca, tablas) in GRUPOS.items():
+            estado = manifiesto.setdefault("grupos", {}).setdefault(grupo, {"marca": 0, "meses": {}})
+            with conn.cursor() as c:
+                c.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla_marca}")
+                marca = c.fetchone()[0]
+                c.execute(SQL_MESES_NUEVOS.format(tabla=tabla_marca), (estado["marca"],))
+                nuevos = {fila[0] for fila in c.fetchall()}
+            # Meses ya exportados que pudieron cambiar: abiertos, o cerrados otra vez tras reabrirse
+            cambiantes = {mes for mes, info in estado["meses"].items()
+                          if info["cierre"] is None or info["cierre"] != cierres.get(mes)}
+            pendientes = sorted(nuevos | cambiantes)
+            for i, mes in enumerate(pendientes):
+                desde, hasta = periodos.rango(mes)
+                filas = {}
+                for tabla in tablas:
+                    df = pd.read_sql(SQL_MES[tabla], conn, params={"desde": desde, "hasta": hasta})
+                    filas[tabla] = _escribir_particion(base, tabla, mes, df)
+                if any(filas.values()):
+                    estado["meses"][mes] = {"cierre": cierres.get(mes), "filas": filas}
+                else:
+                    estado["meses"].pop(mes, None)
+                if progreso:
+                    progreso(grupo, i + 1, len(pendientes))
+            estado["marca"] = marca
+            resumen[grupo] = pendientes
+
+        df = pd.read_sql("SELECT * FROM entidades ORDER BY rif", conn)
+        ruta = os.path.join(base, "entidades", "datos.parquet")
+        _escribir_atomico(ruta, lambda temporal: df.to_parquet(temporal, index=False))
+        manifiesto["entidades"] = {"filas": len(df)}
+        resumen["entidades"] = len(df)
+        conn.rollback()
+
+    manifiesto["actualizado_en"] = datetime.now().isoformat(timespec="seconds")
+    _guardar_manifiesto(base, manifiesto)
+    return resumen
+
+def estado():
+    """Fecha de la última sincronización y filas por grupo y mes (DataFrame vacío si nunca se sincronizó)."""
+    manifiesto = _leer_manifiesto(directorio())
+    filas = [
+        {"grupo": grupo, "mes": mes, "sellado": info["cierre"] is not None, **info["filas"]}
+        for grupo, datos in manifiesto.get("grupos", {}).items()
+        for mes, info in sorted(datos["meses"].items())
+    ]
+    return manifiesto.get("actualizado_en"), pd.DataFrame(filas)
+
+def conexion():
+    """Conexión DuckDB en memoria con una vista por cada tabla exportada."""
+    base = directorio()
+    con = duckdb.connect()
+    for _, tablas in GRUPOS.values():
+        for tabla in tablas:
+            patron = os.path.join(base, tabla, "*", "*.parquet")
+            if glob.glob(patron):
+                con.execute(f"""CREATE VIEW {tabla} AS SELECT * FROM read_parquet('{patron.replace("'", "''")}',
+                                hive_partitioning = true, union_by_name = true)""")
+    ruta = os.path.join(base, "entidades", "datos.parquet")
+    if os.path.exists(ruta):
+        con.execute(f"CREATE VIEW entidades AS SELECT * FROM read_parquet('{ruta.replace(chr(39), chr(39) * 2)}')")
+    return con
+
+def consultar(sql, params=None):
+    """Consulta ad hoc sobre la copia analítica; retorna un DataFrame."""
+    con = conexion()
+    try:
+        return con.execute(sql, params or []).df()
+    finally:
+        con.close()
+
+def compras_por_mes(anos):
+    """Documentos y montos de compras por año y mes."""
+    return consultar(SQL_COMPRAS_MENSUAL, [[int(a) for a in anos]])
+
+def comparativo_compras(anos, medida="total_factura"):
+    """Meses en filas y años en columnas para `medida`, con la variación del último año contra el anterior."""
+    df = compras_por_mes(anos)
+    tabla = df.pivot(index="mes", columns="ano", values=medida).reindex(range(1, 13)).fillna(0)
+    anos = sorted(tabla.columns)
+    if len(anos) >= 2:
+        anterior, actual = tabla[anos[-2]], tabla[anos[-1]]
+        tabla["variacion_%"] = ((actual - anterior) / anterior.where(anterior != 0) * 100).round(1)
+    return tabla
+
+def movimientos_por_cuenta(anos):
+    """Debe, haber y saldo por cuenta y año, desde el detalle de asientos."""
+    return consultar(SQL_MOVIMIENTOS_CUENTA, [[int(a) for a in anos]])
+
+def libro_compras(mes, ano):
+    """Libro de Compras del mes leído de la copia analítica (solo lee la partición del mes)."""
+    return consultar(SQL_LIBRO_COMPRAS, [periodos.nombre(mes, ano)])
+
+if __name__ == "__main__":
+    if "--sincronizar" in sys.argv:
+        hecho = sincronizar(completo="--completo" in sys.argv)
+        for grupo in GRUPOS:
+            print(f"{grupo}: {len(hecho[grupo])} meses reescritos {hecho[grupo]}")
+        print(f"entidades: {hecho['entidades']} filas")
+    else:
+        print(__doc__)
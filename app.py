@@ -2,38 +2,51 @@
 import streamlit as st
 import pandas as pd
 import database
+import analitica
+import auditoria
+import cache_datos
+import contabilizacion
+import correlativos
+import diario
+import migraciones
+import paginacion
 import parametro
+import periodos
 import hashlib
 from datetime import datetime
-from modulos import entidades, compras, cotizaciones
+from modulos import entidades, compras, cotizaciones, dashboard
 
 # 1. Configuración de página
 st.set_page_config(page_title="Adonai ERP", layout="wide")
 
-# 2. Inicializar base de datos y correr migraciones limpias
-database.inicializar_db()
+# 2. Verificar el esquema una vez por proceso (el DDL solo corre si hay migraciones pendientes)
+try:
+    migraciones.asegurar_esquema()
+    auditoria.asegurar_particiones()
+except Exception as e:
+    st.error(f"Error al migrar el esquema: {e}")
 
 # --- MÓDULOS DE CONTABILIDAD GENERAL (CG) ---
 
 def modulo_contabilidad_general():
     st.title("🏛️ Contabilidad General (CG)")
-    t1, t2, t3 = st.tabs(["📖 Diario General", "🏢 Centros de Costo", "🔒 Períodos Fiscales"])
+    t1, t2, t3, t4, t5 = st.tabs(["📖 Diario General", "🏢 Centros de Costo", "🔒 Períodos Fiscales", "⚖️ Balance de Comprobación", "📊 Analítica"])
 
     with t1:
         st.subheader("Asientos Contables")
         st.info("Consulte aquí todos los asientos generados por CP y CG.")
-        conn = database.conectar()
-        query = """
-            SELECT a.num_asiento, a.fecha, a.concepto, a.origen, a.creado_por,
-                   COALESCE(SUM(d.debe), 0) as total_debe
-            FROM asientos_cabecera a
-            LEFT JOIN asientos_detalle d ON a.id = d.asiento_id
-            GROUP BY a.id, a.num_asiento, a.fecha, a.concepto, a.origen, a.creado_por 
-            ORDER BY a.fecha DESC
-        """
-        df_asientos = pd.read_sql(query, conn)
-        st.dataframe(df_asientos, use_container_width=True)
-        conn.close()
+        f1, f2, f3, f4 = st.columns(4)
+        origen = f1.selectbox("Origen", ("Todos",) + diario.ORIGENES)
+        desde = f2.date_input("Desde", value=None)
+        hasta = f3.date_input("Hasta", value=None)
+        numero = f4.text_input("N° de asiento").strip()
+        filtros = {"origen": None if origen == "Todos" else origen, "desde": desde, "hasta": hasta, "numero": numero}
+
+        clave = "pag_diario"
+        df_asientos, hay_mas = diario.pagina(**filtros, despues_de=paginacion.llave_inicio(clave, tuple(filtros.values())))
+        st.dataframe(df_asientos.drop(columns="id"), use_container_width=True, hide_index=True)
+        ultima = (df_asientos["fecha"].iloc[-1], int(df_asientos["id"].iloc[-1])) if not df_asientos.empty else None
+        paginacion.controles(clave, ultima, hay_mas)
 
     with t2:
         st.subheader("Configuración de Centros de Costo")
@@ -43,30 +56,109 @@ def modulo_contabilidad_general():
             nom_cc = c2.text_input("Nombre del Departamento")
             if st.form_submit_button("Añadir Centro"):
                 if cod_cc and nom_cc:
-                    conn = database.conectar()
-                    c = conn.cursor()
-                    c.execute("INSERT INTO centros_costo (codigo, nombre) VALUES (%s, %s) ON CONFLICT (codigo) DO NOTHING", (cod_cc, nom_cc))
-                    conn.commit()
+                    database.ejecutar_transaccion("INSERT INTO centros_costo (codigo, nombre) VALUES (%s, %s) ON CONFLICT (codigo) DO NOTHING", (cod_cc, nom_cc))
+                    cache_datos.invalidar("centros_costo")
                     database.registrar_log(st.session_state['usuario_autenticado'], "CREAR", "centros_costo", f"Añadió CC: {nom_cc}")
-                    conn.close()
                     st.success("Centro de costo creado.")
                     st.rerun()
         
-        conn = database.conectar()
-        df_cc = pd.read_sql("SELECT codigo as \"Código\", nombre as \"Nombre\" FROM centros_costo", conn)
-        conn.close()
+        df_cc = cache_datos.centros_costo()[["codigo", "nombre"]].rename(columns={"codigo": "Código", "nombre": "Nombre"})
         st.table(df_cc)
 
     with t3:
         st.subheader("Cierre de Períodos")
         st.warning("⚠️ Un período cerrado bloquea los registros ante el SENIAT.")
+        p1, p2 = st.columns(2)
+        mes_p = p1.selectbox("Mes", range(1, 13), index=datetime.now().month - 1, key="per_mes")
+        ano_p = p2.number_input("Año", value=datetime.now().year, step=1, key="per_ano")
+        periodo = periodos.nombre(mes_p, ano_p)
+        usuario = st.session_state['usuario_autenticado']
+        if periodos.esta_cerrado(periodo):
+            st.info(f"El período {periodo} está cerrado. Sus reportes se leen de la instantánea de cierre.")
+            if st.button("🔓 Reabrir período"):
+                periodos.reabrir(periodo)
+                database.registrar_log(usuario, "REABRIR", "periodos_fiscales", f"Reabrió el período {periodo}", sincrono=True)
+                st.rerun()
+        elif st.button(f"🔒 Cerrar período {periodo}"):
+            cerrado, detalle = periodos.cerrar(periodo, usuario)
+            if cerrado:
+                database.registrar_log(usuario, "CERRAR", "periodos_fiscales", f"Cerró el período {periodo} ({detalle} filas de instantánea)", sincrono=True)
+                st.success(f"Período {periodo} cerrado.")
+                st.rerun()
+            else:
+                st.error("No se puede cerrar el período:")
+                st.table(pd.DataFrame(detalle, columns=["Problema", "Cantidad"]))
+        st.dataframe(periodos.listado(), use_container_width=True, hide_index=True)
+
+        st.subheader("Auditoría de Correlativos")
+        a1, a2 = st.columns(2)
+        origen_aud = a1.selectbox("Origen", diario.ORIGENES, key="aud_origen")
+        ano_aud = a2.number_input("Año fiscal", value=datetime.now().year, step=1, key="aud_ano")
+        if st.button("🔎 Buscar huecos"):
+            df_huecos = correlativos.huecos(origen_aud, int(ano_aud))
+            if df_huecos.empty:
+                st.success("Numeración continua: no hay huecos.")
+            else:
+                st.warning(f"{int(df_huecos['faltantes'].sum())} números sin asiento.")
+                st.dataframe(df_huecos, use_container_width=True, hide_index=True)
+
+    with t4:
+        st.subheader("Balance de Comprobación")
+        b1, b2, b3 = st.columns(3)
+        hoy = datetime.now()
+        desde = b1.text_input("Desde (AAAA-MM)", value=f"{hoy.year}-01")
+        hasta = b2.text_input("Hasta (AAAA-MM)", value=hoy.strftime("%Y-%m"))
+        cc_df = cache_datos.centros_costo()
+        nombres_cc = {int(i): f"{cod} - {nom}" for i, cod, nom in zip(cc_df["id"], cc_df["codigo"], cc_df["nombre"])}
+        cc_id = b3.selectbox("Centro de Costo", [None] + list(nombres_cc), format_func=lambda i: nombres_cc.get(i, "Todos"))
+        df_balance = contabilizacion.balance_comprobacion(desde, hasta, cc_id)
+        st.dataframe(df_balance, use_container_width=True, hide_index=True)
+        if not df_balance.empty:
+            k1, k2 = st.columns(2)
+            k1.metric("Total Debe", f"{df_balance['debe'].sum():,.2f}")
+            k2.metric("Total Haber", f"{df_balance['haber'].sum():,.2f}")
+
+    with t5:
+        st.subheader("Comparativos sobre la Copia Analítica")
+        actualizado, df_estado = analitica.estado()
+        st.caption(f"Última sincronización: {actualizado}" if actualizado else "La copia analítica aún no se ha generado.")
+        s1, s2 = st.columns(2)
+        if s1.button("🔄 Sincronizar"):
+            with st.spinner("Copiando meses nuevos y abiertos..."):
+                hecho = analitica.sincronizar()
+            st.success(f"Compras: {len(hecho['compras'])} meses, asientos: {len(hecho['asientos'])} meses, entidades: {hecho['entidades']}.")
+            st.rerun()
+        if s2.button("♻️ Reconstruir todo"):
+            with st.spinner("Reconstruyendo la copia completa..."):
+                analitica.sincronizar(completo=True)
+            st.rerun()
+        if actualizado:
+            ano_actual = datetime.now().year
+            anos = st.multiselect("Años", list(range(ano_actual - 5, ano_actual + 1)), default=[ano_actual - 1, ano_actual])
+            medida = st.selectbox("Medida", ("total_factura", "base_imponible", "iva_monto", "iva_retenido", "documentos"))
+            if anos:
+                st.markdown("**Compras por mes**")
+                st.dataframe(analitica.comparativo_compras(anos, medida), use_container_width=True)
+                st.markdown("**Movimientos por cuenta**")
+                st.dataframe(analitica.movimientos_por_cuenta(anos), use_container_width=True, hide_index=True)
+            with st.expander("Meses exportados"):
+                st.dataframe(df_estado, use_container_width=True, hide_index=True)
 
 def modulo_auditoria():
     st.title("🕵️ Historial de Actividad (Auditoría)")
-    conn = database.conectar()
-    df_logs = pd.read_sql("SELECT fecha_hora, usuario, accion, tabla_afectada, detalle FROM logs_actividad ORDER BY fecha_hora DESC LIMIT 100", conn)
-    conn.close()
-    st.dataframe(df_logs, use_container_width=True)
+    f1, f2, f3, f4, f5 = st.columns(5)
+    usuario = f1.text_input("Usuario").lower().strip()
+    accion = f2.selectbox("Acción", ("Todas",) + auditoria.ACCIONES)
+    tabla = f3.text_input("Tabla").strip()
+    desde = f4.date_input("Desde", value=None, key="log_desde")
+    hasta = f5.date_input("Hasta", value=None, key="log_hasta")
+    filtros = {"usuario": usuario, "accion": None if accion == "Todas" else accion, "tabla": tabla, "desde": desde, "hasta": hasta}
+
+    clave = "pag_logs"
+    df_logs, hay_mas = auditoria.pagina(**filtros, despues_de=paginacion.llave_inicio(clave, tuple(filtros.values())))
+    st.dataframe(df_logs.drop(columns="id"), use_container_width=True, hide_index=True)
+    ultima = (df_logs["fecha_hora"].iloc[-1], int(df_logs["id"].iloc[-1])) if not df_logs.empty else None
+    paginacion.controles(clave, ultima, hay_mas)
 
 # --- GESTIÓN DE PERFIL Y USUARIOS ---
 
@@ -106,51 +198,6 @@ def modulo_gestion_usuarios():
                 else:
                     st.error("Complete los campos obligatorios.")
 
-# --- FORMULARIO DE CONFIGURACIÓN GLOBAL ÚNICO ---
-
-def modulo_configuracion_sistema():
-    st.title("⚙️ Configuración Global del Sistema")
-    conf = database.obtener_configuracion_empresa()
-    
-    with st.form("form_configuracion_global"):
-        st.subheader("Datos del Agente de Retención (Tu Empresa)")
-        col1, col2 = st.columns(2)
-        n = col1.text_input("Razón Social / Nombre Legal", value=conf.get('nombre_empresa', 'ADONAI GROUP'))
-        r = col2.text_input("RIF de la Empresa", value=conf.get('rif_empresa', ''))
-        d = st.text_area("Dirección Fiscal", value=conf.get('direccion_empresa', ''))
-        
-        contribuyente_actual = conf.get('tipo_contribuyente', 'Ordinario')
-        opciones_contribuyente = ["Especial", "Ordinario", "Formal"]
-        try:
-            posicion_index = opciones_contribuyente.index(contribuyente_actual)
-        except ValueError:
-            posicion_index = 1
-            
-        t = col1.selectbox("Tipo de Contribuyente", opciones_contribuyente, index=posicion_index)
-        
-        st.divider()
-        st.subheader("Parámetros Fiscales de Control")
-        col3, col4 = st.columns(2)
-        nueva_ut = col3.number_input("Valor Unidad Tributaria (Bs.)", value=float(conf.get('ut_valor', 0.00)), format="%.2f")
-        factor = col4.number_input("Factor Sustraendo (Estándar 83.3334)", value=float(conf.get('factor_sustraendo', 83.3334)), format="%.4f")
-        
-        if st.form_submit_button("Actualizar Todo el Sistema"):
-            database.ejecutar_transaccion(
-                """UPDATE configuracion SET 
-                   nombre_empresa=%s, rif_empresa=%s, direccion_empresa=%s, 
-                   tipo_contribuyente=%s, ut_valor=%s, factor_sustraendo=%s 
-                   WHERE id=1""",
-                (n, r, d, t, nueva_ut, factor)
-            )
-            database.registrar_log(
-                st.session_state.get('usuario_autenticado', 'admin'), 
-                "EDITAR", 
-                "configuracion", 
-                "Actualizó datos de empresa y parámetros tributarios unificados"
-            )
-            st.success("✅ Configuración corporativa y parámetros fiscales sincronizados en Neon.")
-            st.rerun()
-
 # --- CONTROL DE ACCESO (MIGRACIÓN CONTABLE INTELIGENTE) ---
 
 def check_password():
@@ -161,25 +208,23 @@ def check_password():
             pw = st.text_input("Contraseña", type="password")
             if st.form_submit_button("Entrar"):
                 pw_hash = hashlib.sha256(pw.encode()).hexdigest()
-                conn = database.conectar()
-                c = conn.cursor()
-                
-                # Paso 1: Intentar buscar por la estructura nueva (Criptográfica en la columna 'clave')
-                c.execute("SELECT username, rol FROM usuarios WHERE username = %s AND clave = %s", (user, pw_hash))
-                res = c.fetchone()
-                
-                # Paso 2: Si no lo halla, buscar por la estructura vieja (Texto plano en la columna 'password')
-                if not res:
-                    try:
-                        c.execute("SELECT username, rol FROM usuarios WHERE username = %s AND password = %s", (user, pw))
-                        res = c.fetchone()
-                        if res:
-                            # ¡AUTOMIGRACIÓN EN CALIENTE! Encriptamos al usuario para blindar su seguridad
-                            c.execute("UPDATE usuarios SET clave = %s WHERE username = %s", (pw_hash, user))
-                            conn.commit()
-                    except Exception: pass
-                
-                conn.close()
+                with database.obtener_conexion() as conn:
+                    c = conn.cursor()
+                    
+                    # Paso 1: Intentar buscar por la estructura nueva (Criptográfica en la columna 'clave')
+                    c.execute("SELECT username, rol FROM usuarios WHERE username = %s AND clave = %s", (user, pw_hash))
+                    res = c.fetchone()
+                    
+                    # Paso 2: Si no lo halla, buscar por la estructura vieja (Texto plano en la columna 'password')
+                    if not res:
+                        try:
+                            c.execute("SELECT username, rol FROM usuarios WHERE username = %s AND password = %s", (user, pw))
+                            res = c.fetchone()
+                            if res:
+                                # ¡AUTOMIGRACIÓN EN CALIENTE! Encriptamos al usuario para blindar su seguridad
+                                c.execute("UPDATE usuarios SET clave = %s WHERE username = %s", (pw_hash, user))
+                                conn.commit()
+                        except Exception: pass
                 
                 if res:
                     st.session_state["usuario_autenticado"] = res[0]
@@ -211,23 +256,23 @@ if check_password():
             del st.session_state["rol"]
         st.rerun()
 
-    # Ejecución de vistas según la opción seleccionada
-    if menu == "Dashboard":
-        st.title("📈 Dashboard Finanzas")
-        st.write(f"Bienvenido al sistema, **{st.session_state['usuario_autenticado'].upper()}**")
-    elif menu == "Registrar Entidad":
-        entidades.modulo_maestro_entidades()
-    elif menu == "Crear Cotización":
-        cotizaciones.modulo_crear_cotizaciones()  # <-- Ejecuta correctamente el módulo comercial
-    elif menu == "Cuentas por Pagar (CP)":
-        compras.modulo_compras()
-    elif menu == "Mi Perfil":
-        modulo_perfil()
-    elif menu == "Contabilidad General (CG)":
-        modulo_contabilidad_general()
-    elif menu == "Gestión de Usuarios":
-        modulo_gestion_usuarios()
-    elif menu == "Historial de Log":
-        modulo_auditoria()
-    elif menu == "Configuración Sistema":
-        parametro.modulo_configuracion_sistema()
+    # Ejecución de vistas según la opción seleccionada; las consultas quedan asociadas a la página
+    with database.medir_rerun(menu):
+        if menu == "Dashboard":
+            dashboard.modulo_dashboard()
+        elif menu == "Registrar Entidad":
+            entidades.modulo_maestro_entidades()
+        elif menu == "Crear Cotización":
+            cotizaciones.modulo_crear_cotizaciones()  # <-- Ejecuta correctamente el módulo comercial
+        elif menu == "Cuentas por Pagar (CP)":
+            compras.modulo_compras()
+        elif menu == "Mi Perfil":
+            modulo_perfil()
+        elif menu == "Contabilidad General (CG)":
+            modulo_contabilidad_general()
+        elif menu == "Gestión de Usuarios":
+            modulo_gestion_usuarios()
+        elif menu == "Historial de Log":
+            modulo_auditoria()
+        elif menu == "Configuración Sistema":
+            parametro.modulo_configuracion_sistema()
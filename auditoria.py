@@ -0,0 +1,120 @@
+# auditoria.py
+"""Consulta y mantenimiento de `logs_actividad`.
+
+La tabla está particionada por mes (`logs_actividad_AAAA_MM`, migración 6).
+El navegador filtra por usuario, acción, tabla y rango de fechas, y pagina por
+llave (fecha_hora, id) descendente sobre los índices del padre. La retención
+separa (DETACH) las particiones viejas sin tocar las filas recientes.
+
+Uso administrativo:  python auditoria.py --archivar MESES [--eliminar]
+"""
+import re
+import sys
+from datetime import date, timedelta
+import streamlit as st
+from psycopg2 import sql
+import database
+
+ACCIONES = ("CREAR", "EDITAR", "IMPORTAR", "MIGRAR", "CERRAR", "REABRIR", "PAGAR")
+MESES_ADELANTE = 2
+_PATRON_PARTICION = re.compile(r"^logs_actividad_(\d{4})_(\d{2})$")
+
+SQL_LOGS = """
+    SELECT l.id, l.fecha_hora, l.usuario, l.accion, l.tabla_afectada, l.detalle
+    FROM logs_actividad l
+    WHERE TRUE {filtros}
+    ORDER BY l.fecha_hora DESC, l.id DESC
+"""
+
+def _filtros(usuario=None, accion=None, tabla=None, desde=None, hasta=None):
+    """Condiciones SQL y parámetros para los filtros indicados (los vacíos se omiten)."""
+    condiciones, params = [], {}
+    if usuario:
+        condiciones.append("l.usuario = %(usuario)s")
+        params["usuario"] = usuario
+    if accion:
+        condiciones.append("l.accion = %(accion)s")
+        params["accion"] = accion
+    if tabla:
+        condiciones.append("l.tabla_afectada = %(tabla)s")
+        params["tabla"] = tabla
+    # Rangos sobre la columna de partición: PostgreSQL descarta los meses fuera del rango
+    if desde:
+        condiciones.append("l.fecha_hora >= %(desde)s")
+        params["desde"] = desde
+    if hasta:
+        condiciones.append("l.fecha_hora < %(hasta)s")
+        params["hasta"] = hasta + timedelta(days=1)
+    return condiciones, params
+
+def pagina(usuario=None, accion=None, tabla=None, desde=None, hasta=None, despues_de=None, tamano=100):
+    """Página del historial, del evento más reciente al más antiguo.
+
+    `despues_de` es la llave (fecha_hora, id) de la última fila vista; `hasta` es inclusivo.
+    """
+    condiciones, params = _filtros(usuario, accion, tabla, desde, hasta)
+    if despues_de is not None:
+        condiciones.append("(l.fecha_hora, l.id) < (%(fecha_hora)s, %(id)s)")
+        params.update({"fecha_hora": despues_de[0], "id": despues_de[1]})
+    filtros = "".join(f" AND {cond}" for cond in condiciones)
+    return database.consultar_pagina(SQL_LOGS.format(filtros=filtros), params, tamano)
+
+def _primer_dia(mes, desplazamiento=0):
+    indice = mes.year * 12 + mes.month - 1 + desplazamiento
+    return date(indice // 12, indice % 12 + 1, 1)
+
+def crear_particiones(meses_adelante=MESES_ADELANTE):
+    """Crea las particiones del mes actual y de los `meses_adelante` siguientes. Retorna sus nombres."""
+    hoy = date.today()
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            nombres = []
+            for i in range(meses_adelante + 1):
+                c.execute("SELECT crear_particion_logs(%s)", (_primer_dia(hoy, i),))
+                nombres.append(c.fetchone()[0])
+        conn.commit()
+    return nombres
+
+@st.cache_resource(ttl=24 * 3600)
+def asegurar_particiones():
+    """Una vez al día por proceso, para que los eventos nunca caigan en la partición DEFAULT."""
+    return crear_particiones()
+
+def particiones():
+    """Particiones mensuales adjuntas, de la más antigua a la más reciente."""
+    df = database.consultar_df("""
+        SELECT c.relname AS particion, pg_total_relation_size(c.oid) AS bytes
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'logs_actividad'::regclass
+        ORDER BY c.relname
+    """)
+    return df[df["particion"].str.match(_PATRON_PARTICION.pattern)].reset_index(drop=True)
+
+def archivar(meses_retener, eliminar=False):
+    """Separa las particiones de meses anteriores a los últimos `meses_retener`.
+
+    Las particiones separadas quedan como tablas sueltas (para exportarlas o
+    respaldarlas) salvo que `eliminar=True`. Retorna los nombres procesados.
+    """
+    limite = _primer_dia(date.today(), -int(meses_retener))
+    viejas = []
+    for nombre in particiones()["particion"]:
+        ano, mes = map(int, _PATRON_PARTICION.match(nombre).groups())
+        if date(ano, mes, 1) < limite:
+            viejas.append(nombre)
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            for nombre in viejas:
+                c.execute(sql.SQL("ALTER TABLE logs_actividad DETACH PARTITION {}").format(sql.Identifier(nombre)))
+                if eliminar:
+                    c.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(nombre)))
+                conn.commit()
+    return viejas
+
+if __name__ == "__main__":
+    if "--archivar" in sys.argv:
+        meses = int(sys.argv[sys.argv.index("--archivar") + 1])
+        procesadas = archivar(meses, eliminar="--eliminar" in sys.argv)
+        print(f"Particiones separadas: {procesadas}" if procesadas else "No hay particiones que archivar.")
+    else:
+        print(f"Particiones creadas o existentes: {crear_particiones()}")
@@ -0,0 +1,124 @@
+# benchmarks/generador.py
+"""Datos sintéticos con volúmenes realistas para los benchmarks.
+
+Todo se genera en el servidor con generate_series (sin viajar filas por la red)
+y con una semilla fija, así dos corridas del mismo tamaño producen los mismos
+datos. Solo debe apuntarse a una base local desechable: `reiniciar_esquema`
+borra el esquema public completo.
+"""
+from urllib.parse import urlparse
+
+HOSTS_LOCALES = ("localhost", "127.0.0.1", "::1", "")
+MESES = 24
+SEMILLA = 0.42
+
+def verificar_destino(url, forzar=False):
+    """Se niega a trabajar sobre una base que no sea local, salvo con `forzar`."""
+    host = urlparse(url).hostname or ""
+    if host not in HOSTS_LOCALES and not forzar:
+        raise SystemExit(f"El benchmark borra datos: {host!r} no es local. Use --forzar si está seguro.")
+
+def reiniciar_esquema(conn):
+    with conn.cursor() as c:
+        c.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+    conn.commit()
+
+TABLAS_DATOS = ("snapshot_libro_compras", "snapshot_saldos", "saldos_cuenta", "resumen_compras", "asientos_detalle",
+                "pago_aplicaciones", "pagos", "compras", "asientos_cabecera", "cotizacion_items", "cotizaciones",
+                "entidades", "logs_actividad", "periodos_fiscales")
+
+SQL_ENTIDADES = """
+    INSERT INTO entidades (rif, nombre, direccion, tipo_persona, tipo_contribuyente, categoria,
+                           retencion_islr_pct, retencion_iva_pct)
+    SELECT 'J' || lpad(g::text, 9, '0'),
+           (ARRAY['Comercial', 'Inversiones', 'Servicios', 'Distribuidora', 'Suministros'])[1 + g %% 5]
+               || ' ' || (ARRAY['Andes', 'Caribe', 'Oriente', 'Llanos', 'Centro', 'Zulia'])[1 + g %% 6] || ' ' || g || ' C.A.',
+           'Av. Principal, Caracas',
+           CASE WHEN g %% 10 = 0 THEN 'Natural Residente' ELSE 'Jurídica Domiciliada' END,
+           (ARRAY['Especial', 'Ordinario', 'Formal'])[1 + g %% 3],
+           (ARRAY['PROVEEDOR', 'AMBOS', 'CLIENTE'])[1 + g %% 3],
+           (ARRAY[0, 1, 2, 3])[1 + g %% 4], (ARRAY[0, 75, 100])[1 + g %% 3]
+    FROM generate_series(1, %(entidades)s) g
+"""
+
+SQL_ASIENTOS = """
+    INSERT INTO asientos_cabecera (num_asiento, fecha, concepto, origen, creado_por)
+    SELECT 'CP-' || to_char(f, 'YYYY') || '-' || lpad(g::text, 8, '0'), f,
+           'FAC ' || g || ' - benchmark', CASE WHEN g %% 7 = 0 THEN 'CG' ELSE 'CP' END, 'bench'
+    FROM generate_series(1, %(compras)s) g,
+         LATERAL (SELECT (date_trunc('month', CURRENT_DATE) - make_interval(months => %(meses)s))::date
+                         + (g * 7919 %% (%(meses)s * 30)) AS f) d
+"""
+
+# Proveedores válidos: categorías PROVEEDOR y AMBOS (g %% 3 en 0 o 1)
+SQL_COMPRAS = """
+    INSERT INTO compras (fecha, rif_proveedor, num_factura, num_control, tipo_documento, base_imponible, monto_exento,
+                         iva_monto, iva_retenido, islr_retenido, total_factura, saldo_pendiente, subtipo, asiento_id, creado_por)
+    SELECT a.fecha, 'J' || lpad(p::text, 9, '0'), 'F-' || a.id, '00-' || a.id,
+           CASE WHEN a.id %% 20 = 0 THEN 'NC' ELSE 'FAC' END, m.base, 0, round(m.base * 0.16, 2),
+           round(m.base * 0.16 * 0.75, 2), round(m.base * 0.02, 2),
+           round(m.base * 1.16 - m.base * 0.16 * 0.75 - m.base * 0.02, 2),
+           CASE WHEN a.id %% 3 = 0 THEN 0
+                WHEN a.id %% 20 = 0 THEN -round(m.base * 1.16 - m.base * 0.16 * 0.75 - m.base * 0.02, 2)
+                ELSE round(m.base * 1.16 - m.base * 0.16 * 0.75 - m.base * 0.02, 2) END,
+           NULL, a.id, 'bench'
+    FROM asientos_cabecera a,
+         LATERAL (SELECT round((100 + random() * 20000)::numeric, 2) AS base) m,
+         LATERAL (SELECT 1 + ((a.id * 31) %% %(entidades)s) AS p0) q,
+         LATERAL (SELECT CASE WHEN q.p0 %% 3 = 2 THEN GREATEST(q.p0 - 1, 1) ELSE q.p0 END AS p) r
+"""
+
+SQL_DETALLE = """
+    INSERT INTO asientos_detalle (asiento_id, cuenta_codigo, descripcion, debe, haber, centro_costo_id)
+    SELECT c.asiento_id, l.cuenta, l.descripcion, l.debe, l.haber, 0
+    FROM compras c,
+         LATERAL (VALUES ('6.1.01.01', 'Gasto', c.base_imponible, 0::numeric),
+                         ('1.1.04.01', 'IVA crédito fiscal', c.iva_monto, 0),
+                         ('2.1.03.01', 'Retención de IVA por pagar', 0, c.iva_retenido),
+                         ('2.1.03.02', 'Retención de ISLR por pagar', 0, c.islr_retenido),
+                         ('2.1.01.01', 'Cuentas por pagar proveedores', 0, c.total_factura)) AS l (cuenta, descripcion, debe, haber)
+"""
+
+SQL_TOTALES_Y_SALDOS = """
+    UPDATE asientos_cabecera a SET total_debe = t.debe, total_haber = t.haber
+    FROM (SELECT asiento_id, SUM(debe) AS debe, SUM(haber) AS haber FROM asientos_detalle GROUP BY asiento_id) t
+    WHERE a.id = t.asiento_id;
+    INSERT INTO saldos_cuenta (cuenta_codigo, centro_costo_id, periodo, debe, haber)
+    SELECT d.cuenta_codigo, d.centro_costo_id, to_char(a.fecha, 'YYYY-MM'), SUM(d.debe), SUM(d.haber)
+    FROM asientos_detalle d JOIN asientos_cabecera a ON a.id = d.asiento_id
+    GROUP BY 1, 2, 3;
+"""
+
+SQL_LOGS = """
+    INSERT INTO logs_actividad (fecha_hora, usuario, accion, tabla_afectada, detalle)
+    SELECT CURRENT_TIMESTAMP - make_interval(mins => (g * 7919) %% (%(meses)s * 30 * 24 * 60)),
+           'usuario' || (g %% 25), (ARRAY['CREAR', 'EDITAR', 'IMPORTAR'])[1 + g %% 3],
+           (ARRAY['compras', 'entidades', 'centros_costo', 'usuarios'])[1 + g %% 4], 'Evento sintético ' || g
+    FROM generate_series(1, %(logs)s) g
+"""
+
+def volumenes(tamano):
+    """Volúmenes por tabla para un tamaño (número de compras)."""
+    return {"compras": tamano, "entidades": max(tamano // 10, 100), "logs": tamano * 2, "meses": MESES}
+
+def generar(conn, tamano):
+    """Vacía las tablas de datos y las llena para `tamano` compras. Retorna los volúmenes usados."""
+    vol = volumenes(tamano)
+    with conn.cursor() as c:
+        c.execute("TRUNCATE " + ", ".join(TABLAS_DATOS) + " RESTART IDENTITY CASCADE")
+        c.execute("SELECT setseed(%s)", (SEMILLA,))
+        c.execute("""SELECT crear_particion_logs(m::date) FROM generate_series(
+                         date_trunc('month', CURRENT_DATE) - make_interval(months => %(meses)s),
+                         date_trunc('month', CURRENT_DATE), INTERVAL '1 month') AS m""", vol)
+        c.execute(SQL_ENTIDADES, vol)
+        c.execute(SQL_ASIENTOS, vol)
+        c.execute(SQL_COMPRAS, vol)
+        # Sin los triggers por fila el detalle se carga mucho más rápido; los totales se recalculan abajo
+        c.execute("ALTER TABLE asientos_detalle DISABLE TRIGGER USER")
+        c.execute(SQL_DETALLE)
+        c.execute("ALTER TABLE asientos_detalle ENABLE TRIGGER USER")
+        c.execute(SQL_TOTALES_Y_SALDOS)
+        c.execute(SQL_LOGS, vol)
+        c.execute("ANALYZE")
+    conn.commit()
+    return vol
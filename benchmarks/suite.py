@@ -0,0 +1,278 @@
+# benchmarks/suite.py
+"""Suite de benchmarks reproducible contra un PostgreSQL local.
+
+Mide, fuera de Streamlit y a varios tamaños de datos, los caminos costosos de
+la aplicación: creación del esquema (migraciones), importación de maestros
+desde Excel/CSV, Libro de Compras, Diario General y generación de PDF de
+cotizaciones. El resultado es un JSON con el commit y la mediana/p95 de cada
+caso, comparable entre commits:
+
+    ADONAI_BENCH_URL=postgresql://postgres@localhost/adonai_bench \\
+        python -m benchmarks.suite --tamanos 1000 10000 100000 --salida base.json
+    python -m benchmarks.suite --comparar base.json nuevo.json
+
+La base indicada se BORRA completa; por eso se exige un host local salvo --forzar.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime
+from openpyxl import Workbook
+import database
+import diario
+import importador
+import indicadores
+import libro_compras
+import migraciones
+import pagos
+import pdf_cotizaciones
+from lector_archivos import ArchivoCarga
+from benchmarks import generador
+
+TAMANOS = (1000, 10000, 100000)
+REPETICIONES = 5
+# Variación de la mediana a partir de la cual --comparar marca un caso
+UMBRAL_CAMBIO = 0.10
+
+# Listado del Diario agregando el detalle en cada consulta (como antes de los totales en cabecera); referencia
+SQL_DIARIO_AGREGADO = """
+    SELECT a.id, a.num_asiento, a.fecha, a.concepto, a.origen, SUM(d.debe) AS total_debe, SUM(d.haber) AS total_haber
+    FROM asientos_cabecera a LEFT JOIN asientos_detalle d ON d.asiento_id = a.id
+    GROUP BY a.id ORDER BY a.fecha DESC, a.id DESC LIMIT 100
+"""
+
+def medir(funcion, repeticiones=REPETICIONES, calentamiento=1):
+    """Ejecuta `funcion` y retorna estadísticas en milisegundos."""
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        "mediana_ms": round(statistics.median(tiempos), 3),
+        "p95_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 3),
+        "min_ms": round(tiempos[0], 3),
+        "repeticiones": repeticiones,
+    }
+
+def _una_vez(funcion):
+    inicio = time.perf_counter()
+    funcion()
+    ms = round((time.perf_counter() - inicio) * 1000, 3)
+    return {"mediana_ms": ms, "p95_ms": ms, "min_ms": ms, "repeticiones": 1}
+
+def _commit():
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return salida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# --- Archivos de maestros en memoria ---
+
+def _filas_maestro(n):
+    return [(f"J{i:09d}", f"Proveedor importado {i} C.A.", "Zona Industrial, Valencia") for i in range(1, n + 1)]
+
+def archivo_xlsx(n):
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet()
+    hoja.append(["LISTADO DE PROVEEDORES"])
+    hoja.append(["RIF", "RAZON SOCIAL", "DIRECCION"])
+    for fila in _filas_maestro(n):
+        hoja.append(fila)
+    archivo = io.BytesIO()
+    libro.save(archivo)
+    return archivo
+
+def archivo_csv(n):
+    texto = io.StringIO()
+    escritor = csv.writer(texto)
+    escritor.writerow(["RIF", "RAZON SOCIAL", "DIRECCION"])
+    escritor.writerows(_filas_maestro(n))
+    return io.BytesIO(texto.getvalue().encode("utf-8"))
+
+def _importar(archivo, nombre):
+    carga = ArchivoCarga(archivo, nombre)
+    return importador.importar_entidades(carga.lotes(), "PROVEEDOR")
+
+# --- Casos ---
+
+def caso_migraciones(conn):
+    """Esquema completo sobre una base vacía (reemplaza a la antigua inicialización de tablas)."""
+    generador.reiniciar_esquema(conn)
+    return _una_vez(lambda: migraciones.migrar(conn))
+
+def _mes_central():
+    """Mes en la mitad del rango generado: (mes, año)."""
+    hoy = date.today()
+    total = hoy.year * 12 + hoy.month - 1 - generador.MESES // 2
+    return total % 12 + 1, total // 12
+
+def _llave_profunda(df):
+    return None if df.empty else (df["fecha"].iloc[-1], df["id"].iloc[-1])
+
+def _dashboard(desde, hasta):
+    """Las cuatro consultas que hace el Dashboard al abrirse."""
+    indicadores.mensual(desde, hasta)
+    indicadores.top_proveedores(desde, hasta)
+    indicadores.por_pagar()
+    indicadores.gasto_centros(desde, hasta)
+
+def casos_por_tamano(tamano, repeticiones):
+    mes, ano = _mes_central()
+    resultados = {}
+
+    def pagina_libro_profunda():
+        # Diez páginas seguidas por llave: el costo de avanzar no debe crecer con la posición
+        llave = None
+        for _ in range(10):
+            df, hay_mas = libro_compras.pagina(mes, ano, llave)
+            llave = _llave_profunda(df)
+            if not hay_mas:
+                break
+
+    def pagina_diario_profunda():
+        llave = None
+        for _ in range(10):
+            df, hay_mas = diario.pagina(despues_de=llave)
+            llave = _llave_profunda(df)
+            if not hay_mas:
+                break
+
+    desde = date(ano, mes, 1)
+    casos = {
+        "libro_compras.totales": lambda: libro_compras.totales(mes, ano),
+        "libro_compras.primera_pagina": lambda: libro_compras.pagina(mes, ano),
+        "libro_compras.diez_paginas": pagina_libro_profunda,
+        "diario.primera_pagina": lambda: diario.pagina(),
+        "diario.diez_paginas": pagina_diario_profunda,
+        "diario.filtro_origen_mes": lambda: diario.pagina(origen="CP", desde=desde, hasta=libro_compras.rango_mes(mes, ano)[1]),
+        "diario.filtro_numero": lambda: diario.pagina(numero=f"CP-{ano}-0000"),
+        "diario.agregado_detalle": lambda: database.consultar_df(SQL_DIARIO_AGREGADO),
+        "dashboard.indicadores": lambda: _dashboard(*indicadores.rango_meses(12)),
+        "pagos.antiguedad": lambda: pagos.antiguedad(),
+        "pagos.documentos_abiertos": lambda: pagos.documentos_abiertos("J000000001"),
+    }
+    for nombre, funcion in casos.items():
+        resultados[nombre] = medir(funcion, repeticiones)
+
+    # Importación de maestros: el archivo se arma antes de medir; RIF repetidos entre corridas = actualizaciones
+    filas = max(tamano // 10, 100)
+    xlsx, texto = archivo_xlsx(filas), archivo_csv(filas)
+    resultados["importador.entidades_xlsx"] = medir(lambda: _importar(xlsx, "maestro.xlsx"), repeticiones)
+    resultados["importador.entidades_csv"] = medir(lambda: _importar(texto, "maestro.csv"), repeticiones)
+    return resultados
+
+def casos_pdf(cotizaciones, procesos=None):
+    res = pdf_cotizaciones.benchmark(cotizaciones, procesos)
+    return {
+        f"pdf_cotizaciones.{modo}": {
+            "mediana_ms": round(res[modo]["segundos"] * 1000, 3),
+            "paginas": res[modo]["paginas"],
+            "paginas_por_segundo": res[modo]["paginas_por_segundo"],
+            "repeticiones": 1,
+        }
+        for modo in ("en_proceso", "pool")
+    }
+
+def ejecutar(url, tamanos, repeticiones, cotizaciones, forzar=False, progreso=print):
+    generador.verificar_destino(url, forzar)
+    pool = database.PoolConexiones(url, sslmode=os.environ.get("ADONAI_BENCH_SSLMODE", "disable"), maximo=4)
+    database.usar_pool(pool)
+    resultado = {
+        "commit": _commit(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+        "procesadores": os.cpu_count(),
+        "repeticiones": repeticiones,
+        "casos": {},
+    }
+    with database.obtener_conexion() as conn:
+        progreso("migraciones sobre esquema vacío")
+        resultado["casos"]["migraciones.esquema_vacio"] = {"sin_datos": caso_migraciones(conn)}
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            c.execute("SELECT current_setting('server_version')")
+            resultado["postgres"] = c.fetchone()[0]
+        conn.rollback()
+
+    for tamano in tamanos:
+        progreso(f"tamaño {tamano}: generando datos")
+        inicio = time.perf_counter()
+        with database.obtener_conexion() as conn:
+            volumenes = generador.generar(conn, tamano)
+        clave = str(tamano)
+        resultado.setdefault("volumenes", {})[clave] = volumenes
+        resultado["casos"].setdefault("generador.carga", {})[clave] = {
+            "mediana_ms": round((time.perf_counter() - inicio) * 1000, 3), "repeticiones": 1}
+        progreso(f"tamaño {tamano}: midiendo")
+        for nombre, estad in casos_por_tamano(tamano, repeticiones).items():
+            resultado["casos"].setdefault(nombre, {})[clave] = estad
+
+    if cotizaciones:
+        progreso(f"PDF: {cotizaciones} cotizaciones")
+        for nombre, estad in casos_pdf(cotizaciones).items():
+            resultado["casos"][nombre] = {"sin_datos": estad}
+    return resultado
+
+def comparar(base, nuevo, umbral=UMBRAL_CAMBIO):
+    """Filas (caso, tamaño, mediana base, mediana nueva, variación) de los casos presentes en ambos."""
+    filas = []
+    for caso, por_tamano in sorted(nuevo["casos"].items()):
+        for tamano, estad in por_tamano.items():
+            anterior = base["casos"].get(caso, {}).get(tamano)
+            if not anterior:
+                continue
+            a, b = anterior["mediana_ms"], estad["mediana_ms"]
+            variacion = (b - a) / a if a else 0.0
+            marca = "PEOR" if variacion > umbral else ("MEJOR" if variacion < -umbral else "")
+            filas.append((caso, tamano, a, b, variacion, marca))
+    return filas
+
+def _imprimir_comparacion(base, nuevo):
+    print(f"base {base.get('commit')}  ->  nuevo {nuevo.get('commit')}")
+    print(f"{'caso':<34} {'tamaño':>9} {'base ms':>11} {'nuevo ms':>11} {'var':>8}")
+    for caso, tamano, a, b, variacion, marca in comparar(base, nuevo):
+        print(f"{caso:<34} {tamano:>9} {a:>11.2f} {b:>11.2f} {variacion:>+7.1%} {marca}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=os.environ.get("ADONAI_BENCH_URL"),
+                        help="URL de un PostgreSQL desechable (por defecto ADONAI_BENCH_URL)")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS), help="número de compras por corrida")
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--cotizaciones", type=int, default=100, help="cotizaciones para el caso PDF (0 lo omite)")
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto, la salida estándar)")
+    parser.add_argument("--forzar", action="store_true", help="permite un host que no sea local")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVO"), help="compara dos archivos de resultados")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        with open(args.comparar[0], encoding="utf-8") as a, open(args.comparar[1], encoding="utf-8") as b:
+            _imprimir_comparacion(json.load(a), json.load(b))
+        return
+    if not args.url:
+        parser.error("indique --url o la variable ADONAI_BENCH_URL")
+
+    resultado = ejecutar(args.url, args.tamanos, args.repeticiones, args.cotizaciones,
+                         forzar=args.forzar, progreso=lambda m: print(m, file=sys.stderr))
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False, default=str)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+if __name__ == "__main__":
+    main()
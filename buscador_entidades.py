@@ -0,0 +1,55 @@
+# buscador_entidades.py
+"""Búsqueda de clientes y proveedores en el servidor.
+
+Coincide por prefijo de RIF (índice `idx_entidades_rif_patron`) y por nombre
+aproximado con `pg_trgm` (índice GIN `idx_entidades_nombre_trgm`, migración 8).
+Los resultados vienen limitados, filtrados por categoría y se identifican por
+RIF, nunca por nombre (los nombres se pueden repetir).
+"""
+import pandas as pd
+import streamlit as st
+import database
+
+PROVEEDORES = ("PROVEEDOR", "AMBOS")
+CLIENTES = ("CLIENTE", "AMBOS")
+MINIMO_CARACTERES = 2
+COLUMNAS = ["rif", "nombre", "categoria"]
+
+SQL_BUSCAR = """
+    SELECT rif, nombre, categoria
+    FROM entidades
+    WHERE categoria = ANY(%(categorias)s)
+      AND (rif LIKE %(prefijo)s OR nombre %% %(texto)s OR nombre ILIKE %(contiene)s)
+    ORDER BY (rif LIKE %(prefijo)s) DESC, similarity(nombre, %(texto)s) DESC, nombre, rif
+    LIMIT %(limite)s
+"""
+
+def _escapar_like(texto):
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def buscar(texto, categorias=PROVEEDORES, limite=20):
+    """DataFrame (rif, nombre, categoria) con las mejores coincidencias; vacío si el texto es muy corto."""
+    texto = (texto or "").strip()
+    if len(texto) < MINIMO_CARACTERES:
+        return pd.DataFrame(columns=COLUMNAS)
+    rif = texto.upper().replace("-", "").replace(" ", "")
+    return database.consultar_df(SQL_BUSCAR, {
+        "categorias": list(categorias), "texto": texto, "limite": int(limite),
+        "prefijo": _escapar_like(rif) + "%", "contiene": "%" + _escapar_like(texto) + "%",
+    })
+
+def selector(etiqueta, categorias=PROVEEDORES, key="entidad", contenedor=st):
+    """Buscador con lista de resultados. Retorna {"rif", "nombre"} de la entidad elegida o None.
+
+    No funciona dentro de un `st.form`: la búsqueda necesita un rerun al escribir.
+    """
+    texto = contenedor.text_input(f"{etiqueta} (RIF o nombre)", key=f"{key}_texto")
+    resultados = buscar(texto, categorias)
+    if resultados.empty:
+        if len(texto.strip()) >= MINIMO_CARACTERES:
+            contenedor.caption("Sin coincidencias.")
+        return None
+    nombres = dict(zip(resultados["rif"], resultados["nombre"]))
+    rif = contenedor.selectbox(etiqueta, list(nombres), key=f"{key}_rif",
+                               format_func=lambda r: f"{nombres[r]} ({r})")
+    return {"rif": rif, "nombre": nombres[rif]}
@@ -0,0 +1,148 @@
+# cache_datos.py
+"""Caché en memoria de datos de referencia (entidades, subtipos, centros de costo, artículos).
+
+Cada entrada recuerda la versión de las tablas de las que depende. Una escritura
+hecha por la app sube la versión de inmediato con `invalidar()`; las escrituras
+de otros procesos llegan por LISTEN/NOTIFY (canal `cambios_datos`, disparado por
+triggers de la migración 2). El TTL es la red de seguridad si el canal se cae.
+"""
+import select
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+import psycopg2
+import streamlit as st
+import database
+
+CANAL = "cambios_datos"
+TTL_POR_DEFECTO = 300
+
+class CacheReferencias:
+    """Entradas por consulta con TTL, límite de tamaño (LRU) y versión por tabla."""
+
+    def __init__(self, pool, max_entradas=64, ttl=TTL_POR_DEFECTO):
+        self.pool = pool
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict()  # llave -> (df, versiones, instante de carga)
+        self._versiones = {}
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self.escuchando = False
+        self._stats = {"aciertos": 0, "fallos": 0, "invalidaciones": 0, "notificaciones": 0, "expiradas": 0}
+        self._hilo = threading.Thread(target=self._escuchar, name="cache-referencias", daemon=True)
+        self._hilo.start()
+
+    def _version(self, tablas):
+        return tuple(self._versiones.get(t, 0) for t in tablas)
+
+    def consultar(self, tablas, query, params=None, ttl=None):
+        """DataFrame de `query`, recargado solo si cambió alguna de `tablas` o venció el TTL.
+
+        El DataFrame es compartido entre sesiones: tratarlo como de solo lectura.
+        """
+        llave = (query, tuple(params) if params else None)
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            entrada = self._entradas.get(llave)
+            version = self._version(tablas)
+            if entrada and entrada[1] == version:
+                if time.monotonic() - entrada[2] < ttl:
+                    self._entradas.move_to_end(llave)
+                    self._stats["aciertos"] += 1
+                    return entrada[0]
+                self._stats["expiradas"] += 1
+            self._stats["fallos"] += 1
+
+        with self.pool.conexion() as conn:
+            df = pd.read_sql(query, conn, params=params)
+
+        with self._lock:
+            # Si hubo una invalidación durante la lectura, no se guarda un dato posiblemente viejo
+            if self._version(tablas) == version:
+                self._entradas[llave] = (df, version, time.monotonic())
+                self._entradas.move_to_end(llave)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+        return df
+
+    def invalidar(self, *tablas):
+        with self._lock:
+            for tabla in tablas:
+                self._versiones[tabla] = self._versiones.get(tabla, 0) + 1
+            self._stats["invalidaciones"] += len(tablas)
+
+    def invalidar_todo(self):
+        with self._lock:
+            self._entradas.clear()
+            self._versiones = {t: v + 1 for t, v in self._versiones.items()}
+
+    def _escuchar(self):
+        """Hilo con una conexión dedicada en LISTEN; se reconecta con espera exponencial."""
+        espera = 1
+        while not self._detener.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.pool.url, sslmode=self.pool.sslmode)
+                conn.autocommit = True
+                with conn.cursor() as c:
+                    c.execute(f"LISTEN {CANAL}")
+                # Lo que cambió mientras no escuchábamos es desconocido: se descarta todo
+                self.invalidar_todo()
+                self.escuchando = True
+                espera = 1
+                while not self._detener.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        aviso = conn.notifies.pop(0)
+                        with self._lock:
+                            self._stats["notificaciones"] += 1
+                        self.invalidar(aviso.payload)
+            except (psycopg2.Error, OSError):
+                self.escuchando = False
+                self._detener.wait(espera)
+                espera = min(espera * 2, 60)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def detener(self):
+        self._detener.set()
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entradas"] = len(self._entradas)
+        stats["escuchando"] = self.escuchando
+        return stats
+
+@st.cache_resource
+def obtener_cache():
+    return CacheReferencias(database.obtener_pool())
+
+def consultar(tablas, query, params=None, ttl=None):
+    return obtener_cache().consultar(tablas, query, params, ttl)
+
+def invalidar(*tablas):
+    """Llamar después de confirmar una escritura para que el próximo rerun vea el dato nuevo."""
+    obtener_cache().invalidar(*tablas)
+
+def estadisticas():
+    return obtener_cache().estadisticas()
+
+# --- Consultas de referencia usadas por los formularios ---
+
+def entidades():
+    return consultar(("entidades",), "SELECT rif, nombre FROM entidades")
+
+def subtipos_compra():
+    return consultar(("compra_subtipos",), "SELECT nombre, cuenta_codigo FROM compra_subtipos")
+
+def centros_costo():
+    return consultar(("centros_costo",), "SELECT id, codigo, nombre FROM centros_costo")
+
+def articulos():
+    return consultar(("articulos",), "SELECT descripcion, precio_sugerido FROM articulos")
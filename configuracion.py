@@ -0,0 +1,65 @@
+# configuracion.py
+"""Configuración de la empresa, leída una vez y mantenida en memoria del proceso.
+
+Se apoya en la caché de referencia: el formulario de configuración llama a
+`invalidar()` al guardar y las otras instancias se enteran por el canal
+`cambios_datos` (trigger de la migración 11). Mientras nada cambie, `obtener()`
+no viaja a la base.
+
+La Unidad Tributaria y el factor sustraendo no se guardan aquí: se toman de los
+parámetros vigentes hoy en `parametros_fiscales` (ver `impuestos.parametros`),
+única fuente de esos valores.
+"""
+import threading
+from dataclasses import dataclass, asdict, replace
+import cache_datos
+import impuestos
+
+SQL_CONFIGURACION = """
+    SELECT nombre_empresa, rif_empresa, direccion_empresa, tipo_contribuyente
+    FROM configuracion WHERE id = 1
+"""
+
+@dataclass(frozen=True)
+class ConfiguracionEmpresa:
+    nombre_empresa: str = "ADONAI GROUP"
+    rif_empresa: str = ""
+    direccion_empresa: str = ""
+    tipo_contribuyente: str = "Ordinario"
+    ut_valor: float = 0.0
+    factor_sustraendo: float = 83.3334
+
+    def como_dict(self):
+        return asdict(self)
+
+POR_DEFECTO = ConfiguracionEmpresa()
+
+# Objeto armado a partir del último DataFrame y los últimos parámetros fiscales entregados por la caché
+_memo = {"tabla": None, "parametros": None, "conf": POR_DEFECTO}
+_lock = threading.Lock()
+
+def _armar(df):
+    if df.empty:
+        return POR_DEFECTO
+    fila = df.iloc[0]
+    # Los campos vacíos en la base conservan el valor por defecto
+    valores = {campo: fila[campo] for campo in df.columns
+               if fila[campo] is not None and fila[campo] == fila[campo] and fila[campo] != ""}
+    return ConfiguracionEmpresa(**valores)
+
+def obtener():
+    """Configuración vigente; si la base no responde se usan los valores por defecto."""
+    try:
+        df = cache_datos.consultar(("configuracion",), SQL_CONFIGURACION)
+        vigentes = impuestos.parametros()
+    except Exception:
+        return POR_DEFECTO
+    with _lock:
+        if _memo["tabla"] is not df or _memo["parametros"] is not vigentes:
+            conf = replace(_armar(df), ut_valor=vigentes.ut_valor, factor_sustraendo=vigentes.factor_sustraendo)
+            _memo["tabla"], _memo["parametros"], _memo["conf"] = df, vigentes, conf
+        return _memo["conf"]
+
+def invalidar():
+    """Llamar tras confirmar el UPDATE de `configuracion`."""
+    cache_datos.invalidar("configuracion")
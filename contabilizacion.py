@@ -0,0 +1,167 @@
+# contabilizacion.py
+"""Contabilización automática de documentos de compra.
+
+Cada FAC/NC genera su asiento de partida doble:
+
+    Debe   gasto (cuenta del subtipo, con centro de costo)   base + exento
+    Debe   IVA crédito fiscal                                 IVA
+    Haber  retención de IVA por pagar                         retención IVA
+    Haber  retención de ISLR por pagar                        retención ISLR
+    Haber  proveedores                                        neto a pagar
+
+(la NC invierte debe y haber). Las líneas se escriben con un único INSERT de
+varias filas que, en la misma sentencia, acumula `saldos_cuenta` por cuenta,
+centro de costo y período; así los balances leen saldos ya calculados.
+"""
+import pandas as pd
+import psycopg2.extras
+import cache_datos
+import database
+
+SIN_CENTRO = 0
+COLUMNAS_LINEA = ["asiento_id", "cuenta_codigo", "descripcion", "debe", "haber", "centro_costo_id"]
+
+SQL_REGISTRAR = """
+    WITH nuevas AS (
+        INSERT INTO asientos_detalle (asiento_id, cuenta_codigo, descripcion, debe, haber, centro_costo_id)
+        VALUES %s
+        RETURNING asiento_id, cuenta_codigo, debe, haber, centro_costo_id
+    )
+    INSERT INTO saldos_cuenta (cuenta_codigo, centro_costo_id, periodo, debe, haber)
+    SELECT n.cuenta_codigo, n.centro_costo_id, to_char(a.fecha, 'YYYY-MM'), SUM(n.debe), SUM(n.haber)
+    FROM nuevas n JOIN asientos_cabecera a ON a.id = n.asiento_id
+    GROUP BY n.cuenta_codigo, n.centro_costo_id, to_char(a.fecha, 'YYYY-MM')
+    ON CONFLICT (cuenta_codigo, centro_costo_id, periodo) DO UPDATE SET
+        debe = saldos_cuenta.debe + EXCLUDED.debe,
+        haber = saldos_cuenta.haber + EXCLUDED.haber
+"""
+
+def cuentas():
+    """Cuentas de contrapartida configuradas (concepto -> código)."""
+    df = cache_datos.consultar(("cuentas_contabilizacion",), "SELECT concepto, cuenta_codigo FROM cuentas_contabilizacion")
+    return dict(zip(df["concepto"], df["cuenta_codigo"]))
+
+def cuentas_gasto():
+    """Cuenta de gasto de cada subtipo de compra."""
+    df = cache_datos.subtipos_compra()
+    return {nombre: cuenta for nombre, cuenta in zip(df["nombre"], df["cuenta_codigo"]) if cuenta}
+
+def lineas_lote(docs):
+    """Líneas de asiento de muchos documentos a la vez.
+
+    `docs` trae asiento_id, tipo, subtipo, base, exento, iva, ret_iva, ret_islr, total
+    y, opcional, centro_costo_id. Retorna un DataFrame con COLUMNAS_LINEA, sin líneas en cero.
+    """
+    c = cuentas()
+    gasto = docs["subtipo"].map(cuentas_gasto()).fillna(c["GASTO"])
+    cc = docs["centro_costo_id"].fillna(SIN_CENTRO).astype(int) if "centro_costo_id" in docs else SIN_CENTRO
+    es_nc = docs["tipo"].eq("NC")
+    partes = []
+    for cuenta, descripcion, monto, al_debe, centro in (
+        (gasto, ("Gasto " + docs["subtipo"].fillna("")).str.strip(), docs["base"] + docs["exento"], True, cc),
+        (c["IVA_CREDITO"], "IVA crédito fiscal", docs["iva"], True, SIN_CENTRO),
+        (c["RET_IVA"], "Retención de IVA por pagar", docs["ret_iva"], False, SIN_CENTRO),
+        (c["RET_ISLR"], "Retención de ISLR por pagar", docs["ret_islr"], False, SIN_CENTRO),
+        (c["PROVEEDORES"], "Cuentas por pagar proveedores", docs["total"], False, SIN_CENTRO),
+    ):
+        monto = monto.astype(float).round(2)
+        # En la NC la línea cambia de lado
+        al_debe_fila = es_nc != al_debe
+        partes.append(pd.DataFrame({
+            "asiento_id": docs["asiento_id"], "cuenta_codigo": cuenta, "descripcion": descripcion,
+            "debe": monto.where(al_debe_fila, 0.0), "haber": monto.where(~al_debe_fila, 0.0), "centro_costo_id": centro,
+        }, index=docs.index))
+    lineas = pd.concat(partes)
+    lineas = lineas[(lineas["debe"] != 0) | (lineas["haber"] != 0)]
+    return lineas.sort_index(kind="stable")[COLUMNAS_LINEA].reset_index(drop=True)
+
+def lineas_documento(asiento_id, tipo, subtipo, base, exento, iva, ret_iva, ret_islr, total, centro_costo_id=None):
+    """Líneas de un solo documento (misma regla que `lineas_lote`)."""
+    doc = pd.DataFrame([{"asiento_id": asiento_id, "tipo": tipo, "subtipo": subtipo, "base": base, "exento": exento,
+                         "iva": iva, "ret_iva": ret_iva, "ret_islr": ret_islr, "total": total,
+                         "centro_costo_id": centro_costo_id}])
+    return lineas_lote(doc)
+
+def lineas_pago(asiento_id, monto):
+    """Líneas del pago a un proveedor: Debe proveedores, Haber bancos."""
+    c = cuentas()
+    monto = round(float(monto), 2)
+    return pd.DataFrame([
+        {"asiento_id": asiento_id, "cuenta_codigo": c["PROVEEDORES"], "descripcion": "Pago a proveedor",
+         "debe": monto, "haber": 0.0, "centro_costo_id": SIN_CENTRO},
+        {"asiento_id": asiento_id, "cuenta_codigo": c["BANCO"], "descripcion": "Salida de bancos",
+         "debe": 0.0, "haber": monto, "centro_costo_id": SIN_CENTRO},
+    ], columns=COLUMNAS_LINEA)
+
+def registrar(conn, lineas):
+    """Inserta las líneas y acumula `saldos_cuenta` en una sentencia, dentro de la transacción de `conn`.
+
+    Exige que cada asiento quede cuadrado; el commit lo hace quien llama.
+    """
+    if lineas.empty:
+        return 0
+    descuadre = lineas.groupby("asiento_id")[["debe", "haber"]].sum().round(2)
+    descuadre = descuadre[descuadre["debe"] != descuadre["haber"]]
+    if not descuadre.empty:
+        raise ValueError(f"Asientos descuadrados: {descuadre.index.tolist()}")
+    filas = [(int(a), cuenta, desc, float(d), float(h), int(cc)) for a, cuenta, desc, d, h, cc
+             in lineas[COLUMNAS_LINEA].itertuples(index=False)]
+    with conn.cursor() as c:
+        psycopg2.extras.execute_values(c, SQL_REGISTRAR, filas, page_size=len(filas))
+    return len(filas)
+
+# Compras con cabecera CP pero sin líneas: se registraron antes de la contabilización automática
+SQL_COMPRAS_SIN_LINEAS = """
+    SELECT c.asiento_id, c.tipo_documento AS tipo, c.subtipo, c.base_imponible AS base, c.monto_exento AS exento,
+           c.iva_monto AS iva, c.iva_retenido AS ret_iva, c.islr_retenido AS ret_islr, c.total_factura AS total
+    FROM compras c JOIN asientos_cabecera a ON a.id = c.asiento_id
+    WHERE a.origen = 'CP' AND a.fecha >= %(desde)s AND a.fecha < %(hasta)s
+      AND NOT EXISTS (SELECT 1 FROM asientos_detalle d WHERE d.asiento_id = a.id)
+"""
+
+def contabilizar_pendientes(conn, desde, hasta):
+    """Genera las líneas de las compras de [desde, hasta) cuyo asiento quedó sin detalle.
+
+    Los documentos cuyas líneas no cuadran (montos incoherentes en el registro viejo) se
+    dejan como están para que la validación del cierre los siga mostrando. Retorna los
+    asientos completados; el commit lo hace quien llama.
+    """
+    with conn.cursor() as c:
+        c.execute(SQL_COMPRAS_SIN_LINEAS, {"desde": desde, "hasta": hasta})
+        docs = pd.DataFrame(c.fetchall(), columns=[d[0] for d in c.description])
+    if docs.empty:
+        return 0
+    montos = ["base", "exento", "iva", "ret_iva", "ret_islr", "total"]
+    docs[montos] = docs[montos].astype(float).fillna(0.0)
+    lineas = lineas_lote(docs)
+    sumas = lineas.groupby("asiento_id")[["debe", "haber"]].sum().round(2)
+    cuadrados = sumas.index[sumas["debe"] == sumas["haber"]]
+    registrar(conn, lineas[lineas["asiento_id"].isin(cuadrados)])
+    return len(cuadrados)
+
+# --- Lectura de saldos precalculados ---
+
+# Períodos cerrados desde su instantánea de cierre; los abiertos desde saldos_cuenta
+SQL_BALANCE = """
+    WITH cerrados AS (SELECT periodo FROM periodos_fiscales WHERE estatus = 'Cerrado')
+    SELECT s.cuenta_codigo, SUM(s.debe) AS debe, SUM(s.haber) AS haber, SUM(s.debe - s.haber) AS saldo
+    FROM (
+        SELECT periodo, cuenta_codigo, centro_costo_id, debe, haber FROM snapshot_saldos
+        WHERE periodo IN (SELECT periodo FROM cerrados)
+        UNION ALL
+        SELECT periodo, cuenta_codigo, centro_costo_id, debe, haber FROM saldos_cuenta
+        WHERE periodo NOT IN (SELECT periodo FROM cerrados)
+    ) s
+    WHERE s.periodo >= %(desde)s AND s.periodo <= %(hasta)s {filtro_cc}
+    GROUP BY s.cuenta_codigo
+    ORDER BY s.cuenta_codigo
+"""
+
+def balance_comprobacion(desde, hasta, centro_costo_id=None):
+    """Sumas y saldos por cuenta entre dos períodos 'AAAA-MM' (inclusive), sin tocar el diario."""
+    params = {"desde": desde, "hasta": hasta}
+    filtro_cc = ""
+    if centro_costo_id is not None:
+        filtro_cc = "AND s.centro_costo_id = %(cc)s"
+        params["cc"] = int(centro_costo_id)
+    return database.consultar_df(SQL_BALANCE.format(filtro_cc=filtro_cc), params)
@@ -0,0 +1,129 @@
+# correlativos.py
+"""Numeración correlativa de asientos por origen y año fiscal.
+
+Cada par (origen, año) tiene su propia secuencia de PostgreSQL
+(`correlativo_cp_2026`, ...), registrada en la tabla `correlativos`. `nextval`
+es O(1) y no toma bloqueos de fila, así que usuarios de orígenes o años
+distintos (o del mismo) nunca se esperan entre sí. Las secuencias no se
+devuelven con un ROLLBACK: un documento que falla deja un hueco, que se
+documenta con `huecos()` para el SENIAT.
+
+Formato: ORIGEN-AÑO-NNNNNN, p. ej. CP-2026-000123.
+"""
+import re
+import threading
+from datetime import date
+import pandas as pd
+from psycopg2 import sql
+import database
+
+DIGITOS = 6
+_PATRON_ORIGEN = re.compile(r"^[A-Z]{2,4}$")
+
+# Secuencias ya verificadas en este proceso; evita repetir el CREATE en cada asiento
+_conocidas = set()
+_lock = threading.Lock()
+
+def formatear(origen, ano, numero):
+    return f"{origen}-{ano}-{numero:0{DIGITOS}d}"
+
+def _nombre_secuencia(origen, ano):
+    if not _PATRON_ORIGEN.match(origen or ""):
+        raise ValueError(f"Origen de correlativo inválido: {origen!r}")
+    return f"correlativo_{origen.lower()}_{int(ano)}"
+
+def _asegurar_secuencia(origen, ano):
+    """Crea (una vez) la secuencia del par origen/año en su propia transacción."""
+    nombre = _nombre_secuencia(origen, ano)
+    with _lock:
+        if nombre in _conocidas:
+            return nombre
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            # Serializa solo la creación de esta secuencia entre procesos
+            c.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (nombre,))
+            c.execute(sql.SQL("CREATE SEQUENCE IF NOT EXISTS {} MINVALUE 1 START 1").format(sql.Identifier(nombre)))
+            c.execute("""INSERT INTO correlativos (origen, ano, secuencia) VALUES (%s, %s, %s)
+                         ON CONFLICT (origen, ano) DO NOTHING""", (origen, int(ano), nombre))
+        conn.commit()
+    with _lock:
+        _conocidas.add(nombre)
+    return nombre
+
+def _tomar(conn, origen, ano, cantidad):
+    nombre = _asegurar_secuencia(origen, ano)
+    with conn.cursor() as c:
+        c.execute(sql.SQL("SELECT nextval({}) FROM generate_series(1, %s)").format(sql.Literal(nombre)), (cantidad,))
+        return [formatear(origen, int(ano), fila[0]) for fila in c.fetchall()]
+
+def siguiente(origen, ano=None, conn=None):
+    """Próximo número del origen para el año fiscal (por defecto el actual).
+
+    Con `conn` se usa la conexión de la transacción en curso; si no, una del pool.
+    """
+    ano = ano or date.today().year
+    if conn is not None:
+        return _tomar(conn, origen, ano, 1)[0]
+    with database.obtener_conexion() as propia:
+        numero = _tomar(propia, origen, ano, 1)[0]
+        propia.commit()
+    return numero
+
+def reservar_bloque(origen, ano, cantidad, conn=None):
+    """Reserva `cantidad` números de una sola vez para cargas masivas.
+
+    Un único viaje a la base. Los números son crecientes pero, si otros usuarios
+    asientan al mismo tiempo, no necesariamente contiguos.
+    """
+    if cantidad < 1:
+        return []
+    if conn is not None:
+        return _tomar(conn, origen, ano, cantidad)
+    with database.obtener_conexion() as propia:
+        numeros = _tomar(propia, origen, ano, cantidad)
+        propia.commit()
+    return numeros
+
+SQL_HUECOS = """
+    WITH usados AS (
+        SELECT split_part(num_asiento, '-', 3)::bigint AS n
+        FROM asientos_cabecera
+        WHERE num_asiento LIKE %(prefijo)s AND num_asiento ~ %(patron)s
+    ), ordenados AS (
+        SELECT n, LAG(n, 1, 0::bigint) OVER (ORDER BY n) AS previo FROM usados
+    )
+    SELECT previo + 1 AS desde, n - 1 AS hasta FROM ordenados WHERE n - previo > 1
+    ORDER BY desde
+"""
+
+SQL_ULTIMO_USADO = """
+    SELECT COALESCE(MAX(split_part(num_asiento, '-', 3)::bigint), 0)
+    FROM asientos_cabecera
+    WHERE num_asiento LIKE %(prefijo)s AND num_asiento ~ %(patron)s
+"""
+
+def huecos(origen, ano):
+    """Rangos de números emitidos por la secuencia que no tienen asiento.
+
+    Incluye los números reservados después del último asiento registrado.
+    Retorna un DataFrame con columnas desde, hasta, faltantes.
+    """
+    nombre = _nombre_secuencia(origen, ano)
+    prefijo = f"{origen}-{int(ano)}-"
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            params = {"prefijo": prefijo + "%", "patron": f"^{prefijo}[0-9]+$"}
+            c.execute(SQL_HUECOS, params)
+            rangos = [list(fila) for fila in c.fetchall()]
+            c.execute(SQL_ULTIMO_USADO, params)
+            ultimo_usado = c.fetchone()[0]
+            c.execute("SELECT to_regclass(%s) IS NOT NULL", (nombre,))
+            emitido = 0
+            if c.fetchone()[0]:
+                c.execute(sql.SQL("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {}").format(sql.Identifier(nombre)))
+                emitido = c.fetchone()[0]
+    if emitido > ultimo_usado:
+        rangos.append([ultimo_usado + 1, emitido])
+    df = pd.DataFrame(rangos, columns=["desde", "hasta"])
+    df["faltantes"] = df["hasta"] - df["desde"] + 1
+    return df
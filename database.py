@@ -1,100 +1,622 @@
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from psycopg2 import pool as pg_pool
+import pandas as pd
 import streamlit as st
-import hashlib
+import atexit
+import logging
+import queue
+import re
+import sys
+import threading
+import time
+import numpy as np
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
 
-@st.cache_resource
-def obtener_conexion_base():
-    """Crea la conexión base inicial y la guarda en caché."""
+class PoolConexiones:
+    """Pool de conexiones psycopg2 compartido por todas las sesiones de Streamlit.
+
+    Cada sesión toma una conexión propia al inicio de una operación y la devuelve
+    al terminar, de modo que el handshake TLS con Neon se paga una sola vez por
+    conexión y no en cada rerun.
+    """
+
+    def __init__(self, url, sslmode='require', minimo=1, maximo=10, timeout=30,
+                 reintentos=4, espera_base=0.5, verificar_tras=60):
+        self.url = url
+        self.sslmode = sslmode
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.verificar_tras = verificar_tras
+        self._libres = deque()  # (conexion, instante del último uso)
+        self._cupos = threading.BoundedSemaphore(maximo)
+        self._lock = threading.Lock()
+        self._abiertas = 0
+        self._en_uso = 0
+        self._stats = {
+            "checkouts": 0, "devoluciones": 0, "max_en_uso": 0, "esperas": 0,
+            "tiempo_espera_total": 0.0, "timeouts": 0, "conexiones_creadas": 0,
+            "reconexiones": 0, "descartadas": 0, "fallidas_verificacion": 0,
+        }
+        # Precarga del mínimo; si Neon no responde aún, se abrirán bajo demanda
+        for _ in range(minimo):
+            try:
+                conn = self._nueva_conexion()
+            except psycopg2.Error:
+                break
+            self._libres.append((conn, time.monotonic()))
+
+    def _nueva_conexion(self):
+        """Abre una conexión reintentando con espera exponencial."""
+        for intento in range(self.reintentos):
+            try:
+                conn = psycopg2.connect(self.url, sslmode=self.sslmode, cursor_factory=CursorMedido)
+                with self._lock:
+                    self._abiertas += 1
+                    self._stats["conexiones_creadas"] += 1
+                return conn
+            except psycopg2.OperationalError:
+                if intento == self.reintentos - 1:
+                    raise
+                with self._lock:
+                    self._stats["reconexiones"] += 1
+                time.sleep(self.espera_base * (2 ** intento))
+
+    def _esta_viva(self, conn, ultimo_uso):
+        """Descarta conexiones cerradas; si llevan tiempo ociosas, las prueba con SELECT 1."""
+        if conn.closed:
+            return False
+        if time.monotonic() - ultimo_uso < self.verificar_tras:
+            return True
+        try:
+            with conn.cursor() as c:
+                c.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._lock:
+                self._stats["fallidas_verificacion"] += 1
+            return False
+
+    def _cerrar(self, conn):
+        try:
+            conn.close()
+        except Exception: pass
+        with self._lock:
+            self._abiertas -= 1
+            self._stats["descartadas"] += 1
+
+    def tomar(self):
+        """Entrega una conexión viva; espera hasta `timeout` segundos si el pool está lleno."""
+        inicio = time.monotonic()
+        if not self._cupos.acquire(blocking=False):
+            if not self._cupos.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise pg_pool.PoolError("Pool de conexiones agotado")
+            with self._lock:
+                self._stats["esperas"] += 1
+                self._stats["tiempo_espera_total"] += time.monotonic() - inicio
+
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    item = self._libres.pop() if self._libres else None
+                if item is None:
+                    conn = self._nueva_conexion()
+                elif self._esta_viva(*item):
+                    conn = item[0]
+                else:
+                    self._cerrar(item[0])
+        except Exception:
+            self._cupos.release()
+            raise
+
+        with self._lock:
+            self._en_uso += 1
+            self._stats["checkouts"] += 1
+            self._stats["max_en_uso"] = max(self._stats["max_en_uso"], self._en_uso)
+        return conn
+
+    def devolver(self, conn, descartar=False):
+        """Regresa la conexión al pool, limpiando cualquier transacción pendiente."""
+        try:
+            if descartar or conn.closed:
+                self._cerrar(conn)
+            else:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                with self._lock:
+                    self._libres.append((conn, time.monotonic()))
+        except psycopg2.Error:
+            self._cerrar(conn)
+        finally:
+            with self._lock:
+                self._en_uso -= 1
+                self._stats["devoluciones"] += 1
+            self._cupos.release()
+
+    @contextmanager
+    def conexion(self):
+        """Checkout/devolución como bloque `with`; descarta la conexión si quedó rota."""
+        conn = self.tomar()
+        descartar = False
+        try:
+            yield conn
+        except (psycopg2.InterfaceError, psycopg2.OperationalError):
+            descartar = True
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                descartar = True
+            raise
+        finally:
+            self.devolver(conn, descartar)
+
+    def cerrar_todo(self):
+        with self._lock:
+            libres, self._libres = list(self._libres), deque()
+        for conn, _ in libres:
+            self._cerrar(conn)
+
+    def estadisticas(self):
+        """Foto del uso del pool para dimensionar `pool_min`/`pool_max`."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "minimo": self.minimo, "maximo": self.maximo,
+                "abiertas": self._abiertas, "en_uso": self._en_uso,
+                "libres": len(self._libres),
+            })
+        esperas = stats.pop("tiempo_espera_total")
+        stats["espera_promedio_ms"] = round(esperas * 1000 / stats["esperas"], 2) if stats["esperas"] else 0.0
+        return stats
+
+# --- Instrumentación de consultas ---
+
+# Módulos que se saltan al buscar quién originó una consulta
+MODULOS_INTERNOS = ("database", "pandas", "psycopg2", "numpy", "contextlib")
+MAX_CONSULTAS_DISTINTAS = 2000
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_contexto = threading.local()
+
+def huella(query):
+    """Texto de la consulta sin literales ni espacios sobrantes: agrupa ejecuciones de la misma sentencia."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)
+    # execute_values y mogrify traen los valores incrustados; basta el comienzo de la sentencia
+    texto = _LITERALES.sub("?", query[:2000])
+    return " ".join(texto.split())[:300]
+
+def _modulo_llamador():
+    marco = sys._getframe(1)
+    while marco is not None:
+        nombre = marco.f_globals.get("__name__", "")
+        if nombre.split(".")[0] not in MODULOS_INTERNOS:
+            return "app" if nombre == "__main__" else nombre
+        marco = marco.f_back
+    return "?"
+
+class MonitorConsultas:
+    """Latencia y filas de cada consulta, agrupadas por (página, módulo, huella).
+
+    Guarda las últimas `muestras` latencias de cada grupo para percentiles móviles,
+    las consultas que superan `umbral_lenta_ms` y el tiempo de base de cada rerun.
+    Todo vive en memoria del proceso; `reiniciar()` lo vacía.
+    """
+
+    def __init__(self, umbral_lenta_ms=500, muestras=200, max_lentas=200, max_reruns=1000):
+        self.umbral_lenta_ms = umbral_lenta_ms
+        self.muestras = muestras
+        self._lock = threading.Lock()
+        self._grupos = {}
+        self._lentas = deque(maxlen=max_lentas)
+        self._reruns = deque(maxlen=max_reruns)
+        self._log = logging.getLogger("adonai.consultas_lentas")
+
+    def registrar(self, query, ms, filas, modulo, pagina):
+        texto = huella(query)
+        clave = (pagina, modulo, texto)
+        with self._lock:
+            grupo = self._grupos.get(clave)
+            if grupo is None:
+                if len(self._grupos) >= MAX_CONSULTAS_DISTINTAS:
+                    clave = (pagina, modulo, "(otras consultas)")
+                grupo = self._grupos.setdefault(clave, {"llamadas": 0, "total_ms": 0.0, "max_ms": 0.0, "filas": 0,
+                                                        "latencias": deque(maxlen=self.muestras)})
+            grupo["llamadas"] += 1
+            grupo["total_ms"] += ms
+            grupo["max_ms"] = max(grupo["max_ms"], ms)
+            grupo["filas"] += max(filas, 0)
+            grupo["latencias"].append(ms)
+            lenta = ms >= self.umbral_lenta_ms
+            if lenta:
+                self._lentas.append({"fecha_hora": datetime.now(), "pagina": pagina, "modulo": modulo,
+                                     "ms": round(ms, 1), "filas": filas, "consulta": texto})
+        if lenta:
+            self._log.warning("%.1f ms, %s filas [%s / %s] %s", ms, filas, pagina, modulo, texto)
+
+    def registrar_rerun(self, pagina, consultas, db_ms, total_ms):
+        with self._lock:
+            self._reruns.append({"fecha_hora": datetime.now(), "pagina": pagina, "consultas": consultas,
+                                 "db_ms": round(db_ms, 1), "total_ms": round(total_ms, 1)})
+
+    def consultas(self):
+        """Un registro por grupo con percentiles sobre las últimas muestras, del más costoso al menos."""
+        with self._lock:
+            grupos = [(clave, dict(g, latencias=list(g["latencias"]))) for clave, g in self._grupos.items()]
+        filas = []
+        for (pagina, modulo, texto), g in grupos:
+            p50, p95, p99 = np.percentile(g["latencias"], [50, 95, 99])
+            filas.append({"pagina": pagina, "modulo": modulo, "consulta": texto, "llamadas": g["llamadas"],
+                          "total_ms": round(g["total_ms"], 1), "p50_ms": round(p50, 2), "p95_ms": round(p95, 2),
+                          "p99_ms": round(p99, 2), "max_ms": round(g["max_ms"], 1),
+                          "filas_promedio": round(g["filas"] / g["llamadas"], 1)})
+        df = pd.DataFrame(filas, columns=["pagina", "modulo", "consulta", "llamadas", "total_ms", "p50_ms",
+                                          "p95_ms", "p99_ms", "max_ms", "filas_promedio"])
+        return df.sort_values("total_ms", ascending=False, ignore_index=True)
+
+    def lentas(self):
+        with self._lock:
+            return pd.DataFrame(list(reversed(self._lentas)),
+                                columns=["fecha_hora", "pagina", "modulo", "ms", "filas", "consulta"])
+
+    def reruns(self):
+        """Tiempo de base por rerun, resumido por página."""
+        with self._lock:
+            df = pd.DataFrame(list(self._reruns), columns=["fecha_hora", "pagina", "consultas", "db_ms", "total_ms"])
+        if df.empty:
+            return pd.DataFrame(columns=["pagina", "reruns", "consultas_promedio", "db_ms_p50", "db_ms_p95", "db_ms_max", "total_ms_p50"])
+        return df.groupby("pagina").agg(
+            reruns=("db_ms", "size"), consultas_promedio=("consultas", "mean"),
+            db_ms_p50=("db_ms", "median"), db_ms_p95=("db_ms", lambda s: s.quantile(0.95)),
+            db_ms_max=("db_ms", "max"), total_ms_p50=("total_ms", "median"),
+        ).round(1).sort_values("db_ms_p95", ascending=False).reset_index()
+
+    def reiniciar(self):
+        with self._lock:
+            self._grupos.clear()
+            self._lentas.clear()
+            self._reruns.clear()
+
+def _conf_monitoreo():
+    try:
+        return st.secrets.get("monitoreo", {})
+    except Exception:
+        return {}
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+def obtener_monitor():
+    """Monitor único por proceso. Configurable en secrets [monitoreo]: umbral_lenta_ms, muestras, archivo_lentas."""
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                conf = _conf_monitoreo()
+                monitor = MonitorConsultas(umbral_lenta_ms=float(conf.get("umbral_lenta_ms", 500)),
+                                           muestras=int(conf.get("muestras", 200)))
+                if conf.get("archivo_lentas"):
+                    manejador = logging.FileHandler(conf["archivo_lentas"], encoding="utf-8")
+                    manejador.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                    monitor._log.addHandler(manejador)
+                _monitor = monitor
+    return _monitor
+
+def _registrar_consulta(query, ms, filas):
+    pagina = getattr(_contexto, "pagina", None)
+    if pagina is not None:
+        _contexto.consultas += 1
+        _contexto.db_ms += ms
+    obtener_monitor().registrar(query, ms, filas, _modulo_llamador(), pagina or "(sin página)")
+
+class CursorMedido(psycopg2.extensions.cursor):
+    """Cursor de todas las conexiones del pool: reporta latencia y filas de cada sentencia.
+
+    En los cursores con nombre el trabajo ocurre al leer, así que se acumula el
+    tiempo de execute y de los fetch y se reporta al cerrar.
+    """
+
+    _pendiente = None
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._medido(query, inicio)
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._medido(query, inicio)
+
+    def copy_expert(self, sql, file, size=8192):
+        inicio = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._medido(sql, inicio)
+
+    def _medido(self, query, inicio):
+        ms = (time.perf_counter() - inicio) * 1000
+        if self.name:
+            self._pendiente = [query, ms, 0]
+        else:
+            _registrar_consulta(query, ms, self.rowcount)
+
+    def _leido(self, inicio, filas):
+        if self._pendiente is not None:
+            self._pendiente[1] += (time.perf_counter() - inicio) * 1000
+            self._pendiente[2] += filas
+        return filas
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = super().fetchone()
+        self._leido(inicio, int(fila is not None))
+        return fila
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        filas = super().fetchmany(self.arraysize if size is None else size)
+        self._leido(inicio, len(filas))
+        return filas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        filas = super().fetchall()
+        self._leido(inicio, len(filas))
+        return filas
+
+    def close(self):
+        if self._pendiente is not None:
+            query, ms, filas = self._pendiente
+            self._pendiente = None
+            _registrar_consulta(query, ms, filas)
+        return super().close()
+
+@contextmanager
+def medir_rerun(pagina):
+    """Asocia a `pagina` las consultas hechas dentro del bloque y registra el tiempo de base del rerun."""
+    _contexto.pagina, _contexto.consultas, _contexto.db_ms = pagina, 0, 0.0
+    inicio = time.perf_counter()
     try:
-        url = st.secrets["database"]["url"]
-        return psycopg2.connect(url, sslmode='require')
-    except Exception as e:
-        st.error(f"Error de conexión crítica: {e}")
-        return None
-
-def conectar():
-    """Retorna la conexión. Si se detecta cerrada o rota, la regenera."""
-    conn = obtener_conexion_base()
-    if conn is None or conn.closed != 0:
-        st.cache_resource.clear()  # Limpia la caché si la conexión se rompió
-        conn = obtener_conexion_base()
-    return conn
+        yield
+    finally:
+        obtener_monitor().registrar_rerun(pagina, _contexto.consultas, _contexto.db_ms,
+                                          (time.perf_counter() - inicio) * 1000)
+        _contexto.pagina = None
+
+
+# Pool fijado por scripts fuera de Streamlit (benchmarks, tareas administrativas)
+_pool_externo = None
+
+def usar_pool(pool):
+    """Hace que `obtener_pool()` entregue `pool` en lugar de leer st.secrets."""
+    global _pool_externo
+    _pool_externo = pool
+
+def obtener_pool():
+    return _pool_externo if _pool_externo is not None else _pool_desde_secrets()
+
+@st.cache_resource
+def _pool_desde_secrets():
+    """Crea el pool una sola vez por proceso. Tamaño configurable en secrets: pool_min / pool_max."""
+    conf = st.secrets["database"]
+    return PoolConexiones(
+        conf["url"],
+        sslmode=conf.get("sslmode", "require"),
+        minimo=int(conf.get("pool_min", 1)),
+        maximo=int(conf.get("pool_max", 10)),
+        timeout=float(conf.get("pool_timeout", 30)),
+    )
+
+def obtener_conexion():
+    """Toma una conexión del pool y la devuelve al salir del bloque `with`.
+
+    No se debe llamar a `conn.close()` dentro del bloque: el pool se encarga.
+    """
+    return obtener_pool().conexion()
+
+def estadisticas_pool():
+    return obtener_pool().estadisticas()
+
+def consultar_df(query, params=None):
+    """Ejecuta un SELECT y retorna un DataFrame usando una conexión del pool."""
+    with obtener_conexion() as conn:
+        return pd.read_sql(query, conn, params=params)
+
+def consultar_pagina(query, params=None, tamano=100):
+    """Lee una página con un cursor con nombre (del lado del servidor).
+
+    Solo viajan `tamano + 1` filas; la fila extra indica si hay más. Retorna (DataFrame, hay_mas).
+    """
+    with obtener_conexion() as conn:
+        with conn.cursor(name="cursor_pagina") as c:
+            c.itersize = tamano + 1
+            c.execute(f"SELECT * FROM ({query}) AS pagina LIMIT {int(tamano) + 1}", params)
+            filas = c.fetchmany(tamano + 1)
+            columnas = [d[0] for d in c.description]
+    df = pd.DataFrame.from_records(filas[:tamano], columns=columnas, coerce_float=True)
+    return df, len(filas) > tamano
 
 def ejecutar_transaccion(query, params=None):
     """Ejecuta consultas de forma segura controlando errores de interfaz."""
-    conn = conectar()
-    if conn:
+    for intento in range(2):
         try:
-            with conn.cursor() as c:
-                c.execute(query, params)
-            conn.commit()
-        except (psycopg2.InterfaceError, psycopg2.OperationalError):
-            st.cache_resource.clear()
-            conn = conectar()
-            if conn:
-                try:
+            with obtener_conexion() as conn:
+                with conn.cursor() as c:
+                    c.execute(query, params)
+                conn.commit()
+            return
+        except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
+            # La conexión rota ya fue descartada por el pool; se reintenta con una nueva
+            if intento == 1:
+                st.error(f"Error crítico en reintento: {e}")
+        except Exception as e:
+            st.error(f"Error en transacción: {e}")
+            return
+
+class EscritorAuditoria:
+    """Escritor de `logs_actividad` en segundo plano.
+
+    Los eventos se encolan sin tocar la base y un hilo los inserta por lotes
+    (cada `tamano_lote` eventos o cada `intervalo` segundos, lo que ocurra primero)
+    con un único INSERT de varias filas. Al cerrar el proceso se vacía la cola.
+    """
+
+    SQL_INSERT = "INSERT INTO logs_actividad (fecha_hora, usuario, accion, tabla_afectada, detalle) VALUES %s"
+
+    def __init__(self, pool, tamano_lote=50, intervalo=2.0, capacidad=10000, reintentos=3):
+        self.pool = pool
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.reintentos = reintentos
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"encolados": 0, "escritos": 0, "descartados": 0, "lotes": 0, "sincronos": 0, "errores": 0}
+        self._hilo = threading.Thread(target=self._bucle, name="escritor-auditoria", daemon=True)
+        self._hilo.start()
+        atexit.register(self.cerrar)
+
+    def _contar(self, clave, n=1):
+        with self._lock:
+            self._stats[clave] += n
+
+    def encolar(self, evento):
+        """Agrega un evento (fecha_hora, usuario, accion, tabla, detalle). Retorna False si se descartó."""
+        if self._detener.is_set() or not self._hilo.is_alive():
+            self.escribir_sincrono([evento])
+            return True
+        try:
+            self._cola.put_nowait(evento)
+        except queue.Full:
+            self._contar("descartados")
+            return False
+        self._contar("encolados")
+        return True
+
+    def escribir_sincrono(self, eventos):
+        self._contar("sincronos", len(eventos))
+        return self._escribir(eventos)
+
+    def _escribir(self, eventos):
+        for intento in range(self.reintentos):
+            try:
+                with self.pool.conexion() as conn:
                     with conn.cursor() as c:
-                        c.execute(query, params)
+                        psycopg2.extras.execute_values(c, self.SQL_INSERT, eventos, page_size=len(eventos))
                     conn.commit()
-                except Exception as e:
-                    st.error(f"Error crítico en reintento: {e}")
-        except Exception as e:
+                self._contar("escritos", len(eventos))
+                self._contar("lotes")
+                return True
+            except Exception:
+                self._contar("errores")
+                if intento < self.reintentos - 1:
+                    time.sleep(0.5 * (2 ** intento))
+        self._contar("descartados", len(eventos))
+        return False
+
+    def _tomar_lote(self):
+        """Espera el primer evento y junta más hasta llenar el lote o agotar el intervalo."""
+        try:
+            lote = [self._cola.get(timeout=self.intervalo)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tamano_lote:
+            restante = limite - time.monotonic()
             try:
-                conn.rollback()
-            except Exception: pass
-            st.error(f"Error en transacción: {e}")
+                lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _bucle(self):
+        while not (self._detener.is_set() and self._cola.empty()):
+            lote = self._tomar_lote()
+            if lote:
+                try:
+                    self._escribir(lote)
+                finally:
+                    for _ in lote:
+                        self._cola.task_done()
 
-def registrar_log(usuario, accion, tabla_afectada, detalle):
-    """Sincronizado con la tabla logs_actividad real de tu base de datos Neon."""
-    ejecutar_transaccion('''CREATE TABLE IF NOT EXISTS logs_actividad (
-        id SERIAL PRIMARY KEY, fecha_hora TIMESTAMP DEFAULT CURRENT_TIMESTAMP, 
-        usuario TEXT, accion TEXT, tabla_afectada TEXT, detalle TEXT)''')
-    ejecutar_transaccion(
-        "INSERT INTO logs_actividad (usuario, accion, tabla_afectada, detalle) VALUES (%s, %s, %s, %s)", 
-        (usuario, accion, tabla_afectada, detalle)
+    def vaciar(self, timeout=10):
+        """Bloquea hasta que todo lo encolado esté escrito (o venza el timeout)."""
+        limite = time.monotonic() + timeout
+        while self._cola.unfinished_tasks and time.monotonic() < limite and self._hilo.is_alive():
+            time.sleep(0.05)
+        return self._cola.unfinished_tasks == 0
+
+    def cerrar(self, timeout=10):
+        self._detener.set()
+        self._hilo.join(timeout)
+        # Si el hilo no alcanzó a terminar, lo pendiente se escribe aquí mismo
+        pendientes = []
+        while True:
+            try:
+                pendientes.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        if pendientes:
+            self._escribir(pendientes)
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["en_cola"] = self._cola.qsize()
+        stats["hilo_activo"] = self._hilo.is_alive()
+        return stats
+
+def _conf_auditoria():
+    try:
+        return st.secrets.get("auditoria", {})
+    except Exception:
+        return {}
+
+@st.cache_resource
+def obtener_escritor_auditoria():
+    """Escritor único por proceso. Configurable en secrets [auditoria]: tamano_lote, intervalo, capacidad."""
+    conf = _conf_auditoria()
+    return EscritorAuditoria(
+        obtener_pool(),
+        tamano_lote=int(conf.get("tamano_lote", 50)),
+        intervalo=float(conf.get("intervalo", 2.0)),
+        capacidad=int(conf.get("capacidad", 10000)),
     )
 
-def obtener_configuracion_empresa():
-    conn = conectar()
-    res = None
-    if conn:
-        try:
-            with conn.cursor() as c:
-                c.execute("SELECT nombre_empresa, rif_empresa, direccion_empresa FROM configuracion WHERE id = 1")
-                res = c.fetchone()
-        except Exception: pass
-    
-    if res:
-        return {
-            "nombre_empresa": res[0] if res[0] else "ADONAI GROUP", 
-            "rif_empresa": res[1] if res[1] else "", 
-            "direccion_empresa": res[2] if res[2] else "",
-            "tipo_contribuyente": "Ordinario",
-            "ut_valor": 0.00,
-            "factor_sustraendo": 83.3334
-        }
-    return {"nombre_empresa": "ADONAI GROUP", "rif_empresa": "", "direccion_empresa": "", "tipo_contribuyente": "Ordinario", "ut_valor": 0.00, "factor_sustraendo": 83.3334}
-
-def inicializar_db():
-    """Garantiza la existencia de las tablas principales respetando las columnas existentes."""
-    ejecutar_transaccion('''CREATE TABLE IF NOT EXISTS usuarios (id SERIAL PRIMARY KEY, username TEXT UNIQUE, password TEXT, rol TEXT, usuario TEXT, clave TEXT)''')
-    ejecutar_transaccion("ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS username TEXT UNIQUE;")
-    ejecutar_transaccion("ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS password TEXT;")
-    ejecutar_transaccion("ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS clave TEXT;")
-    ejecutar_transaccion("ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS rol TEXT;")
-    
-    ejecutar_transaccion('''CREATE TABLE IF NOT EXISTS periodos_fiscales (id SERIAL PRIMARY KEY, periodo TEXT UNIQUE, estatus TEXT DEFAULT 'Abierto')''')
-    ejecutar_transaccion('''CREATE TABLE IF NOT EXISTS asientos_cabecera (id SERIAL PRIMARY KEY, num_asiento TEXT UNIQUE, fecha DATE, concepto TEXT, origen TEXT, creado_por TEXT)''')
-    
-    # Asegurar parámetros fiscales en configuración
-    ejecutar_transaccion('''CREATE TABLE IF NOT EXISTS configuracion (
-        id INTEGER PRIMARY KEY DEFAULT 1, nombre_empresa TEXT, rif_empresa TEXT, 
-        direccion_empresa TEXT, tipo_contribuyente TEXT, ut_valor NUMERIC(12,2), factor_sustraendo NUMERIC(12,4))''')
-    ejecutar_transaccion("ALTER TABLE configuracion ADD COLUMN IF NOT EXISTS tipo_contribuyente TEXT;")
-    ejecutar_transaccion("ALTER TABLE configuracion ADD COLUMN IF NOT EXISTS ut_valor NUMERIC(12,2);")
-    ejecutar_transaccion("ALTER TABLE configuracion ADD COLUMN IF NOT EXISTS factor_sustraendo NUMERIC(12,4);")
-
-    # Inicializaciones por defecto
-    pw_hash = hashlib.sha256("admin123".encode()).hexdigest()
-    ejecutar_transaccion("INSERT INTO usuarios (username, usuario, password, rol) VALUES ('admin', 'admin', 'admin123', 'admin') ON CONFLICT DO NOTHING")
-    ejecutar_transaccion("INSERT INTO configuracion (id, nombre_empresa) VALUES (1, 'ADONAI GROUP') ON CONFLICT (id) DO NOTHING")
+def registrar_log(usuario, accion, tabla_afectada, detalle, sincrono=None):
+    """Registra un evento en logs_actividad sin bloquear la página.
+
+    Con `sincrono=True` (o `modo = "sincrono"` en secrets [auditoria]) se escribe
+    de inmediato, para los casos que exigen durabilidad antes de continuar.
+    """
+    evento = (datetime.now(), usuario, accion, tabla_afectada, detalle)
+    if sincrono is None:
+        sincrono = _conf_auditoria().get("modo", "asincrono") == "sincrono"
+    escritor = obtener_escritor_auditoria()
+    if sincrono:
+        if not escritor.escribir_sincrono([evento]):
+            st.error("Error en transacción: no se pudo registrar el evento de auditoría.")
+    else:
+        escritor.encolar(evento)
+
+def estadisticas_auditoria():
+    return obtener_escritor_auditoria().estadisticas()
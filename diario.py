@@ -0,0 +1,49 @@
+# diario.py
+"""Consultas del Diario General.
+
+Las páginas se piden por llave (fecha, id) en orden descendente, apoyadas en
+`idx_asientos_fecha`. Los totales de debe y haber viven en la cabecera
+(`total_debe`, `total_haber`) y los mantiene el trigger `trg_totales_asiento`
+al escribir en `asientos_detalle`; el listado nunca agrega el detalle.
+"""
+import database
+
+ORIGENES = ("CP", "CG")
+
+SQL_ASIENTOS = """
+    SELECT a.id, a.num_asiento, a.fecha, a.concepto, a.origen, a.creado_por,
+           a.total_debe, a.total_haber
+    FROM asientos_cabecera a
+    WHERE TRUE {filtros}
+    ORDER BY a.fecha DESC, a.id DESC
+"""
+
+def _filtros(origen=None, desde=None, hasta=None, numero=None):
+    """Condiciones SQL y parámetros para los filtros indicados (los vacíos se omiten)."""
+    condiciones, params = [], {}
+    if origen:
+        condiciones.append("a.origen = %(origen)s")
+        params["origen"] = origen
+    if desde:
+        condiciones.append("a.fecha >= %(desde)s")
+        params["desde"] = desde
+    if hasta:
+        condiciones.append("a.fecha <= %(hasta)s")
+        params["hasta"] = hasta
+    if numero:
+        # Prefijo con LIKE: usa idx_asientos_num_asiento (text_pattern_ops)
+        condiciones.append("a.num_asiento LIKE %(numero)s")
+        params["numero"] = numero.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return condiciones, params
+
+def pagina(origen=None, desde=None, hasta=None, numero=None, despues_de=None, tamano=100):
+    """Página del diario, del asiento más reciente al más antiguo.
+
+    `despues_de` es la llave (fecha, id) de la última fila vista; `hasta` es inclusivo.
+    """
+    condiciones, params = _filtros(origen, desde, hasta, numero)
+    if despues_de is not None:
+        condiciones.append("(a.fecha, a.id) < (%(fecha)s, %(id)s)")
+        params.update({"fecha": despues_de[0], "id": despues_de[1]})
+    filtros = "".join(f" AND {cond}" for cond in condiciones)
+    return database.consultar_pagina(SQL_ASIENTOS.format(filtros=filtros), params, tamano)
@@ -0,0 +1,86 @@
+# exportacion.py
+"""Generación de exportaciones CSV y XLSX de consultas completas sin cargarlas en memoria.
+
+CSV: `COPY (consulta) TO STDOUT` escribe directo al archivo destino.
+XLSX: un cursor con nombre trae bloques de filas y xlsxwriter, en modo
+`constant_memory`, vuelca cada fila al disco apenas se escribe.
+El destino es un archivo temporal en disco, no un buffer en memoria.
+
+La memoria constante vale solo para la generación: `st.download_button` no
+acepta el archivo temporal y recibe sus bytes (`para_descarga`), así que la
+descarga ocupa en el servidor lo que pese el archivo terminado.
+"""
+import tempfile
+import xlsxwriter
+import database
+
+TAMANO_BLOQUE = 2000
+
+def archivo_temporal():
+    """Archivo binario en disco que se borra al cerrarlo."""
+    return tempfile.TemporaryFile(prefix="export_")
+
+def para_descarga(archivo):
+    """Contenido del archivo generado para `st.download_button`; lo cierra, con lo que se borra del disco."""
+    with archivo:
+        archivo.seek(0)
+        return archivo.read()
+
+def a_csv(query, params=None, destino=None):
+    """Vuelca la consulta como CSV con encabezado (UTF-8 con BOM para Excel). Retorna el destino rebobinado."""
+    destino = destino if destino is not None else archivo_temporal()
+    destino.write("\ufeff".encode())
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            consulta = c.mogrify(query, params).decode()
+            c.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv, HEADER true, ENCODING 'UTF8')", destino)
+        conn.rollback()
+    destino.seek(0)
+    return destino
+
+def bloques(conn, query, params=None, tamano=TAMANO_BLOQUE):
+    """Recorre la consulta con un cursor con nombre (del lado del servidor).
+
+    Genera (nombres de columna, lista de hasta `tamano` filas); el primer bloque puede venir
+    vacío si la consulta no trae filas. En memoria nunca hay más de un bloque.
+    """
+    with conn.cursor(name="cursor_exportacion") as c:
+        c.itersize = tamano
+        c.execute(query, params)
+        bloque = c.fetchmany(tamano)
+        columnas = [d[0] for d in c.description]
+        yield columnas, bloque
+        while bloque:
+            bloque = c.fetchmany(tamano)
+            if bloque:
+                yield columnas, bloque
+
+def a_xlsx(query, params=None, destino=None, hoja="Datos", encabezados=None, formatos=None):
+    """Vuelca la consulta a una hoja XLSX fila por fila. Retorna (destino rebobinado, filas escritas).
+
+    `encabezados` reemplaza los nombres de columna; `formatos` mapea nombre de columna a
+    formato numérico de Excel (p. ej. {"total": "#,##0.00"}).
+    """
+    destino = destino if destino is not None else archivo_temporal()
+    libro = xlsxwriter.Workbook(destino, {"constant_memory": True, "default_date_format": "dd/mm/yyyy",
+                                          "remove_timezone": True})
+    pagina = libro.add_worksheet(hoja)
+    negrita = libro.add_format({"bold": True})
+    filas, estilos = 0, None
+    with database.obtener_conexion() as conn:
+        for columnas, bloque in bloques(conn, query, params):
+            if estilos is None:
+                estilos = [libro.add_format({"num_format": (formatos or {})[col]}) if col in (formatos or {}) else None
+                           for col in columnas]
+                pagina.write_row(0, 0, encabezados or columnas, negrita)
+            for fila in bloque:
+                filas += 1
+                for j, valor in enumerate(fila):
+                    pagina.write(filas, j, float(valor) if estilos[j] is not None and valor is not None else valor, estilos[j])
+        conn.rollback()
+    if filas:
+        pagina.autofilter(0, 0, filas, len(columnas) - 1)
+    pagina.freeze_panes(1, 0)
+    libro.close()
+    destino.seek(0)
+    return destino, filas
@@ -0,0 +1,98 @@
+# importador.py
+"""Importación masiva de datos maestros (clientes y proveedores).
+
+Las filas se normalizan en bloque con pandas, se envían por `COPY` a una tabla
+temporal y se fusionan con `entidades` en un único UPSERT, en vez de un
+INSERT por fila.
+"""
+import io
+import pandas as pd
+import database
+
+RIF_VALIDO = r'^[VJGPE]\d{7,10}$'
+DIRECCION_POR_DEFECTO = "Dirección no especificada"
+TAMANO_LOTE = 5000
+
+# Un RIF que llega como CLIENTE y ya era PROVEEDOR (o viceversa) pasa a AMBOS; AMBOS nunca se degrada
+SQL_FUSION = """
+    WITH origen AS (
+        SELECT DISTINCT ON (rif) rif, nombre, direccion
+        FROM stg_entidades ORDER BY rif, seq DESC
+    ), fusion AS (
+        INSERT INTO entidades (rif, nombre, direccion, tipo_persona, tipo_contribuyente, categoria)
+        SELECT rif, nombre, direccion, 'Jurídica Domiciliada', 'Ordinario', %(categoria)s FROM origen
+        ON CONFLICT (rif) DO UPDATE SET
+            nombre = EXCLUDED.nombre,
+            direccion = EXCLUDED.direccion,
+            categoria = CASE
+                WHEN entidades.categoria IS NULL THEN EXCLUDED.categoria
+                WHEN entidades.categoria IN (EXCLUDED.categoria, 'AMBOS') THEN entidades.categoria
+                ELSE 'AMBOS' END
+        RETURNING (xmax = 0) AS nueva
+    )
+    SELECT COUNT(*) FILTER (WHERE nueva), COUNT(*) FILTER (WHERE NOT nueva) FROM fusion
+"""
+
+def normalizar_maestro(df):
+    """Limpia un bloque de filas en forma vectorizada.
+
+    Retorna (DataFrame con columnas rif/nombre/direccion, filas rechazadas, duplicados internos).
+    """
+    df = df.rename(columns=lambda col: str(col).strip().upper())
+    vacio = pd.Series(pd.NA, index=df.index, dtype="string")
+    rif = df['RIF'].astype("string") if 'RIF' in df.columns else vacio
+    nombre = df['NOMBRE'].astype("string") if 'NOMBRE' in df.columns else vacio
+    direccion = df['DIRECCION'].astype("string") if 'DIRECCION' in df.columns else vacio
+
+    limpio = pd.DataFrame({
+        "rif": rif.str.upper().str.replace(r'[\s\-\.]', '', regex=True),
+        "nombre": nombre.str.strip(),
+        "direccion": direccion.str.strip().replace("", pd.NA).fillna(DIRECCION_POR_DEFECTO),
+    })
+    validas = limpio['rif'].str.match(RIF_VALIDO).fillna(False) & limpio['nombre'].fillna("").str.len().gt(0)
+    limpio = limpio[validas]
+    sin_duplicados = limpio.drop_duplicates(subset="rif", keep="last")
+    return sin_duplicados, int((~validas).sum()), len(limpio) - len(sin_duplicados)
+
+def en_lotes(df, tamano=TAMANO_LOTE):
+    """Parte un DataFrame ya cargado en bloques; para archivos usar `lector_archivos.ArchivoCarga.lotes`."""
+    for inicio in range(0, len(df), tamano):
+        yield df.iloc[inicio:inicio + tamano]
+
+def importar_entidades(lotes, categoria, progreso=None, total=None):
+    """Importa clientes o proveedores desde un iterable de DataFrames.
+
+    `categoria` es 'CLIENTE' o 'PROVEEDOR'. `progreso(procesadas, total)` se invoca
+    tras cada lote. Todo ocurre en una sola transacción.
+    """
+    resumen = {"leidas": 0, "insertadas": 0, "actualizadas": 0, "rechazadas": 0, "duplicadas": 0}
+    preparadas = 0
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            c.execute("""CREATE TEMP TABLE stg_entidades (
+                seq BIGINT, rif TEXT, nombre TEXT, direccion TEXT) ON COMMIT DROP""")
+            for lote in lotes:
+                limpio, rechazadas, duplicadas = normalizar_maestro(lote)
+                resumen["leidas"] += len(lote)
+                resumen["rechazadas"] += rechazadas
+                resumen["duplicadas"] += duplicadas
+
+                # seq conserva el orden del archivo: ante RIF repetidos gana la última aparición
+                limpio.insert(0, "seq", range(preparadas, preparadas + len(limpio)))
+                preparadas += len(limpio)
+                buffer = io.StringIO()
+                limpio.to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                c.copy_expert("COPY stg_entidades (seq, rif, nombre, direccion) FROM STDIN WITH (FORMAT csv)", buffer)
+                if progreso:
+                    progreso(resumen["leidas"], total)
+
+            c.execute(SQL_FUSION, {"categoria": categoria})
+            insertadas, actualizadas = c.fetchone()
+        conn.commit()
+
+    resumen["insertadas"] = insertadas
+    resumen["actualizadas"] = actualizadas
+    # Duplicados repartidos entre lotes distintos que solo se detectan al fusionar
+    resumen["duplicadas"] += preparadas - insertadas - actualizadas
+    return resumen
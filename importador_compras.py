@@ -0,0 +1,210 @@
+# importador_compras.py
+"""Carga masiva de facturas y notas de crédito de compra.
+
+El archivo se valida completo antes de escribir: los RIF se contrastan con
+`entidades` en una sola consulta, los montos se calculan en bloque con pandas
+y cada fila con problemas queda en el reporte de errores. Lo válido se escribe
+en una transacción: correlativos reservados en bloque, `COPY` a una tabla
+temporal, dos INSERT ... SELECT (cabeceras de asiento y compras) y las líneas
+de todos los asientos con `contabilizacion.registrar`.
+"""
+import io
+import numpy as np
+import pandas as pd
+import cache_datos
+import contabilizacion
+import correlativos
+import database
+import impuestos
+import periodos
+from importador import RIF_VALIDO
+
+TODO_O_NADA = "todo_o_nada"
+OMITIR_INVALIDAS = "omitir_invalidas"
+
+# Nombre canónico -> encabezados aceptados, para lector_archivos.ArchivoCarga
+COLUMNAS_COMPRAS = {
+    "FECHA": ["FECHA", "FECHA FACTURA", "FECHA DOCUMENTO", "FECHA EMISION"],
+    "RIF": ["RIF", "R.I.F.", "R.I.F", "RIF PROVEEDOR", "RIF/CI"],
+    "TIPO": ["TIPO", "TIPO DOCUMENTO", "TIPO DOC"],
+    "NUM_FACTURA": ["NUM_FACTURA", "FACTURA", "NRO FACTURA", "NUMERO FACTURA", "NUMERO DE FACTURA", "NRO DOCUMENTO", "DOCUMENTO"],
+    "NUM_CONTROL": ["NUM_CONTROL", "CONTROL", "NRO CONTROL", "NUMERO DE CONTROL"],
+    "BASE": ["BASE", "BASE IMPONIBLE"],
+    "EXENTO": ["EXENTO", "MONTO EXENTO"],
+    "IVA": ["IVA", "MONTO IVA", "IVA MONTO"],
+    "RET_IVA": ["RET_IVA", "RETENCION IVA", "IVA RETENIDO"],
+    "RET_ISLR": ["RET_ISLR", "RETENCION ISLR", "ISLR RETENIDO"],
+    "SUBTIPO": ["SUBTIPO", "CLASIFICACION", "CLASIFICACION GASTO"],
+}
+REQUERIDAS = ("FECHA", "RIF", "NUM_FACTURA", "BASE")
+MONTOS = ("BASE", "EXENTO", "IVA", "RET_IVA", "RET_ISLR")
+CALCULABLES = ("IVA", "RET_IVA", "RET_ISLR")
+
+SQL_STAGING = """CREATE TEMP TABLE stg_compras (
+    seq INTEGER, num_asiento TEXT, fecha DATE, rif TEXT, num_factura TEXT, num_control TEXT,
+    tipo TEXT, base NUMERIC(14,2), exento NUMERIC(14,2), iva NUMERIC(14,2), ret_iva NUMERIC(14,2),
+    ret_islr NUMERIC(14,2), total NUMERIC(14,2), saldo NUMERIC(14,2), subtipo TEXT, concepto TEXT) ON COMMIT DROP"""
+
+SQL_INSERTAR = """
+    WITH cab AS (
+        INSERT INTO asientos_cabecera (num_asiento, fecha, concepto, origen, creado_por)
+        SELECT num_asiento, fecha, concepto, 'CP', %(usuario)s FROM stg_compras ORDER BY seq
+        RETURNING id, num_asiento
+    )
+    INSERT INTO compras (fecha, rif_proveedor, num_factura, num_control, tipo_documento,
+                         base_imponible, monto_exento, iva_monto, iva_retenido, islr_retenido, total_factura,
+                         saldo_pendiente, subtipo, asiento_id, creado_por)
+    SELECT s.fecha, s.rif, s.num_factura, s.num_control, s.tipo, s.base, s.exento, s.iva, s.ret_iva, s.ret_islr,
+           s.total, s.saldo, s.subtipo, cab.id, %(usuario)s
+    FROM stg_compras s JOIN cab USING (num_asiento)
+"""
+
+def leer(lotes):
+    """Une los bloques del lector en un DataFrame con todas las columnas canónicas."""
+    partes = list(lotes)
+    df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+    for col in COLUMNAS_COMPRAS:
+        if col not in df.columns:
+            df[col] = pd.Series(pd.NA, index=df.index, dtype="string")
+    df.insert(0, "registro", range(1, len(df) + 1))
+    return df
+
+def normalizar(df, miles_con_punto=False):
+    """Tipos y montos calculados en bloque. Retorna (DataFrame, Serie de listas de errores por fila).
+
+    `miles_con_punto` lee 1.234 como mil doscientos treinta y cuatro; solo vale para archivos de
+    texto (CSV), porque las celdas numéricas de Excel llegan como `str(float)` y 19.752 es un decimal.
+    """
+    errores = pd.Series([[] for _ in range(len(df))], index=df.index, dtype=object)
+
+    def marcar(mascara, mensaje):
+        for i in df.index[mascara.fillna(False).to_numpy(dtype=bool)]:
+            errores.at[i].append(mensaje)
+
+    out = pd.DataFrame({"registro": df["registro"]})
+    # ISO (celdas de fecha de Excel) primero; el resto se lee como día/mes/año
+    iso = pd.to_datetime(df["FECHA"], errors="coerce", format="ISO8601")
+    out["fecha"] = iso.fillna(pd.to_datetime(df["FECHA"], errors="coerce", dayfirst=True, format="mixed")).dt.date
+    marcar(out["fecha"].isna(), "Fecha inválida")
+    out["rif"] = df["RIF"].str.upper().str.replace(r'[\s\-\.]', '', regex=True)
+    marcar(~out["rif"].str.match(RIF_VALIDO).fillna(False), "RIF inválido")
+    out["tipo"] = df["TIPO"].str.upper().str.strip().fillna("FAC")
+    marcar(~out["tipo"].isin(["FAC", "NC"]), "Tipo debe ser FAC o NC")
+    out["num_factura"] = df["NUM_FACTURA"].str.strip()
+    marcar(out["num_factura"].isna() | out["num_factura"].eq(""), "Falta el número de documento")
+    out["num_control"] = df["NUM_CONTROL"].str.strip()
+    out["subtipo"] = df["SUBTIPO"].str.strip()
+
+    for col in MONTOS:
+        # Acepta 1234.56 y el formato local 1.234,56
+        texto = df[col].str.strip()
+        if miles_con_punto:
+            # Sin coma decimal, 1.234 y 1.234.567 son miles
+            miles = texto.str.fullmatch(r"\d{1,3}(\.\d{3})+").fillna(False).astype(bool)
+            texto = texto.mask(miles, texto.str.replace(".", "", regex=False))
+        texto = texto.str.replace(r"\.(?=.*,)", "", regex=True).str.replace(",", ".", regex=False)
+        valor = pd.to_numeric(texto, errors="coerce").astype("Float64")
+        marcar(df[col].notna() & valor.isna(), f"{col} no es un número")
+        marcar(valor < 0, f"{col} negativo")
+        # IVA y retenciones vacíos quedan en NaN: los calcula el motor de impuestos
+        vacio = np.nan if col in CALCULABLES else 0.0
+        out[col.lower()] = valor.astype("float64").fillna(vacio).round(2)
+
+    clave = out["rif"] + "|" + out["num_factura"].fillna("") + "|" + out["tipo"]
+    marcar(clave.duplicated(keep=False) & out["num_factura"].notna(), "Documento repetido en el archivo")
+    return out, errores
+
+def _validar_contra_base(conn, df, errores):
+    """Proveedores existentes, documentos ya registrados y fechas en períodos cerrados."""
+    rifs = df["rif"].dropna().unique().tolist()
+    with conn.cursor() as c:
+        c.execute("SELECT rif, nombre FROM entidades WHERE rif = ANY(%s) AND categoria IN ('PROVEEDOR', 'AMBOS')", (rifs,))
+        nombres = dict(c.fetchall())
+        candidatos = df[df["rif"].isin(list(nombres))]
+        c.execute("""SELECT rif_proveedor, num_factura, tipo_documento FROM compras
+                     WHERE (rif_proveedor, num_factura, tipo_documento) IN (SELECT * FROM unnest(%s::text[], %s::text[], %s::text[]))""",
+                  (candidatos["rif"].tolist(), candidatos["num_factura"].fillna("").tolist(), candidatos["tipo"].tolist()))
+        existentes = set(c.fetchall())
+    df["proveedor"] = df["rif"].map(nombres)
+    for i in df.index[df["rif"].notna() & df["proveedor"].isna()]:
+        errores.at[i].append("Proveedor no registrado en Entidades")
+    for i in df.index[[(r, n, t) in existentes for r, n, t in zip(df["rif"], df["num_factura"], df["tipo"])]]:
+        errores.at[i].append("Documento ya registrado")
+
+    # El candado de períodos rechazaría el lote completo; aquí se descarta solo la fila
+    periodo = df["fecha"].map(lambda f: periodos.nombre(f.month, f.year) if pd.notna(f) else None)
+    for i in df.index[periodo.isin(periodos.cerrados())]:
+        errores.at[i].append("Período cerrado")
+
+    subtipos = set(cache_datos.subtipos_compra()["nombre"])
+    for i in df.index[df["subtipo"].notna() & ~df["subtipo"].isin(subtipos)]:
+        errores.at[i].append("Subtipo desconocido")
+
+def calcular_montos(df, conn=None):
+    """Completa IVA y retenciones que no trae el archivo (tasas vigentes y ficha del proveedor) y calcula total y saldo."""
+    fichas = impuestos.retenciones_entidades(df["rif"].dropna().unique(), conn)
+    pcts = fichas.reindex(df["rif"])[["pct_ret_iva", "pct_ret_islr", "sustraendo"]].set_axis(df.index)
+    entrada = pd.concat([df[["fecha", "base", "exento", "iva"]], pcts], axis=1)
+    calc = impuestos.calcular_lote(entrada)
+    df["iva"] = calc["iva"]
+    df["ret_iva"] = df["ret_iva"].fillna(calc["ret_iva"])
+    df["ret_islr"] = df["ret_islr"].fillna(calc["ret_islr"])
+    df["total"] = (df["base"] + df["exento"] + df["iva"] - df["ret_iva"] - df["ret_islr"]).round(2)
+    df["saldo"] = df["total"].where(df["tipo"].eq("FAC"), -df["total"])
+    return df
+
+def reporte_errores(df, errores):
+    """Una fila por registro con problemas: número de registro, documento y motivos."""
+    con_error = errores.str.len() > 0
+    return pd.DataFrame({
+        "registro": df.loc[con_error, "registro"],
+        "rif": df.loc[con_error, "rif"],
+        "num_factura": df.loc[con_error, "num_factura"],
+        "errores": errores[con_error].str.join("; "),
+    }).reset_index(drop=True)
+
+def importar_compras(lotes, usuario, politica=TODO_O_NADA, miles_con_punto=False):
+    """Valida e importa un archivo de compras. Retorna (resumen, DataFrame de errores).
+
+    Con TODO_O_NADA no se escribe nada si hay al menos un error; con OMITIR_INVALIDAS
+    se registran las filas válidas y el resto queda en el reporte. `miles_con_punto`
+    va activo para CSV (ver `normalizar`).
+    """
+    df, errores = normalizar(leer(lotes), miles_con_punto)
+    resumen = {"leidas": len(df), "validas": 0, "invalidas": 0, "registradas": 0}
+    if df.empty:
+        return resumen, reporte_errores(df, errores)
+
+    with database.obtener_conexion() as conn:
+        _validar_contra_base(conn, df, errores)
+        validas = errores.str.len() == 0
+        resumen["validas"], resumen["invalidas"] = int(validas.sum()), int((~validas).sum())
+        reporte = reporte_errores(df, errores)
+        if (politica == TODO_O_NADA and not validas.all()) or not validas.any():
+            conn.rollback()
+            return resumen, reporte
+
+        datos = calcular_montos(df[validas].sort_values(["fecha", "registro"]).copy(), conn)
+        datos["concepto"] = datos["tipo"] + " " + datos["num_factura"] + " - " + datos["proveedor"]
+        # Correlativos en bloque, uno por año fiscal presente en el archivo
+        datos["num_asiento"] = None
+        for ano, grupo in datos.groupby(datos["fecha"].map(lambda f: f.year)):
+            datos.loc[grupo.index, "num_asiento"] = correlativos.reservar_bloque("CP", ano, len(grupo), conn)
+        # Las cabeceras se insertan en el mismo orden en que se asignaron los correlativos
+        datos["seq"] = range(len(datos))
+
+        columnas = ["seq", "num_asiento", "fecha", "rif", "num_factura", "num_control", "tipo", "base",
+                    "exento", "iva", "ret_iva", "ret_islr", "total", "saldo", "subtipo", "concepto"]
+        buffer = io.StringIO()
+        datos[columnas].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        with conn.cursor() as c:
+            c.execute(SQL_STAGING)
+            c.copy_expert("COPY stg_compras FROM STDIN WITH (FORMAT csv)", buffer)
+            c.execute(SQL_INSERTAR, {"usuario": usuario})
+            resumen["registradas"] = c.rowcount
+            c.execute("SELECT num_asiento, id FROM asientos_cabecera WHERE num_asiento = ANY(%s)", (datos["num_asiento"].tolist(),))
+            datos["asiento_id"] = datos["num_asiento"].map(dict(c.fetchall()))
+        contabilizacion.registrar(conn, contabilizacion.lineas_lote(datos))
+        conn.commit()
+    return resumen, reporte
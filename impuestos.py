@@ -0,0 +1,133 @@
+# impuestos.py
+"""Motor de impuestos: IVA, retención de IVA y retención de ISLR con sustraendo.
+
+Las tasas, la Unidad Tributaria y el factor sustraendo vienen de
+`parametros_fiscales` (una fila por fecha de vigencia, migración 10). La tabla
+se lee por la caché de referencia y cada fecha consultada se resuelve una sola
+vez mientras la tabla no cambie; el lote resuelve todas sus fechas con una
+búsqueda binaria. Las mismas reglas sirven para un documento
+(`calcular_documento`) y para un DataFrame completo (`calcular_lote`).
+
+Reglas:
+  IVA           = base × tasa_iva
+  Retención IVA = IVA × % de retención del proveedor (0, 75 o 100)
+  Retención ISLR= base × % − sustraendo, nunca negativa
+  Sustraendo    = UT × factor_sustraendo × %  (solo personas naturales residentes)
+"""
+import threading
+from collections import namedtuple
+from datetime import date
+import numpy as np
+import pandas as pd
+import cache_datos
+import database
+
+Parametros = namedtuple("Parametros", "vigente_desde tasa_iva ut_valor factor_sustraendo")
+POR_DEFECTO = Parametros(date(2000, 1, 1), 0.16, 0.0, 83.3334)
+TIPOS_CON_SUSTRAENDO = ("Natural Residente",)
+
+def tabla_parametros():
+    """Historial de parámetros ordenado por vigencia (compartido: solo lectura)."""
+    return cache_datos.consultar(("parametros_fiscales",), """
+        SELECT vigente_desde, tasa_iva::float, ut_valor::float, factor_sustraendo::float
+        FROM parametros_fiscales ORDER BY vigente_desde""")
+
+# Parámetros ya resueltos por fecha; se vacía cuando la caché entrega una tabla nueva
+_memo = {"tabla": None, "fechas": {}}
+_lock = threading.Lock()
+
+def parametros(fecha=None):
+    """Parámetros vigentes en `fecha` (hoy por defecto)."""
+    fecha = fecha or date.today()
+    tabla = tabla_parametros()
+    with _lock:
+        if _memo["tabla"] is not tabla:
+            _memo["tabla"], _memo["fechas"] = tabla, {}
+        vigentes = _memo["fechas"].get(fecha)
+    if vigentes is None:
+        previas = tabla[tabla["vigente_desde"] <= fecha]
+        if previas.empty:
+            vigentes = POR_DEFECTO
+        else:
+            fila = previas.iloc[-1]
+            vigentes = Parametros(fila["vigente_desde"], float(fila["tasa_iva"]), float(fila["ut_valor"]),
+                                  float(fila["factor_sustraendo"]))
+        with _lock:
+            if _memo["tabla"] is tabla:
+                _memo["fechas"][fecha] = vigentes
+    return vigentes
+
+def aplica_sustraendo(tipo_persona):
+    return tipo_persona in TIPOS_CON_SUSTRAENDO
+
+def calcular_documento(base, exento=0.0, pct_ret_iva=0.0, pct_ret_islr=0.0, sustraendo=False, fecha=None, iva=None):
+    """Impuestos de un documento. `iva` se respeta si viene dado (p. ej. el de la factura física).
+
+    Retorna dict con iva, ret_iva, ret_islr, sustraendo y total (neto a pagar).
+    """
+    p = parametros(fecha)
+    iva = round(base * p.tasa_iva, 2) if iva is None else round(iva, 2)
+    ret_iva = round(iva * pct_ret_iva / 100, 2)
+    monto_sustraendo = round(p.ut_valor * p.factor_sustraendo * pct_ret_islr / 100, 2) if sustraendo else 0.0
+    ret_islr = max(round(base * pct_ret_islr / 100 - monto_sustraendo, 2), 0.0)
+    total = round(base + exento + iva - ret_iva - ret_islr, 2)
+    return {"iva": iva, "ret_iva": ret_iva, "ret_islr": ret_islr, "sustraendo": monto_sustraendo, "total": total}
+
+def calcular_lote(df):
+    """Versión vectorizada de `calcular_documento` sobre un DataFrame.
+
+    Columnas esperadas: fecha, base; opcionales: exento, pct_ret_iva, pct_ret_islr,
+    sustraendo (bool) e iva (NaN = calcular). Retorna un DataFrame con el mismo índice
+    y columnas iva, ret_iva, ret_islr, sustraendo, total.
+    """
+    cero = pd.Series(0.0, index=df.index)
+    base = df["base"].astype(float)
+    exento = df["exento"].astype(float) if "exento" in df else cero
+    pct_iva = df["pct_ret_iva"].astype(float).fillna(0) if "pct_ret_iva" in df else cero
+    pct_islr = df["pct_ret_islr"].astype(float).fillna(0) if "pct_ret_islr" in df else cero
+    con_sustraendo = df["sustraendo"].fillna(False).astype(bool) if "sustraendo" in df else cero.astype(bool)
+
+    # Parámetros vigentes de cada documento: búsqueda binaria sobre las fechas de vigencia
+    tabla = tabla_parametros()
+    if tabla.empty:
+        tabla = pd.DataFrame([POR_DEFECTO], columns=Parametros._fields)
+    vigencias = pd.to_datetime(tabla["vigente_desde"]).to_numpy(dtype="datetime64[ns]")
+    fechas = pd.to_datetime(df["fecha"]).to_numpy(dtype="datetime64[ns]")
+    posicion = np.clip(np.searchsorted(vigencias, fechas, side="right") - 1, 0, None)
+    tasa_iva = tabla["tasa_iva"].to_numpy(dtype=float)[posicion]
+    ut = tabla["ut_valor"].to_numpy(dtype=float)[posicion]
+    factor = tabla["factor_sustraendo"].to_numpy(dtype=float)[posicion]
+
+    iva = (base * tasa_iva).round(2)
+    if "iva" in df:
+        iva = df["iva"].astype(float).round(2).fillna(iva)
+    ret_iva = (iva * pct_iva / 100).round(2)
+    sustraendo = (ut * factor * pct_islr / 100).round(2).where(con_sustraendo, 0.0)
+    ret_islr = (base * pct_islr / 100 - sustraendo).round(2).clip(lower=0)
+    total = (base + exento + iva - ret_iva - ret_islr).round(2)
+    return pd.DataFrame({"iva": iva, "ret_iva": ret_iva, "ret_islr": ret_islr, "sustraendo": sustraendo, "total": total})
+
+def ficha_retencion(rif):
+    """(% retención IVA, % retención ISLR, aplica sustraendo) de un RIF, por la caché de referencia.
+
+    Pensada para formularios que se repintan en cada rerun; un RIF inexistente retorna ceros.
+    """
+    df = cache_datos.consultar(("entidades",), """
+        SELECT retencion_iva_pct::float AS pct_ret_iva, retencion_islr_pct::float AS pct_ret_islr, tipo_persona
+        FROM entidades WHERE rif = %s""", (rif,))
+    if df.empty:
+        return 0.0, 0.0, False
+    fila = df.iloc[0]
+    pcts = [0.0 if pd.isna(fila[col]) else float(fila[col]) for col in ("pct_ret_iva", "pct_ret_islr")]
+    return pcts[0], pcts[1], aplica_sustraendo(fila["tipo_persona"])
+
+def retenciones_entidades(rifs, conn=None):
+    """% de retención y tipo de persona de cada RIF, en una consulta. Índice: rif."""
+    sql = """SELECT rif, retencion_iva_pct::float AS pct_ret_iva, retencion_islr_pct::float AS pct_ret_islr, tipo_persona
+             FROM entidades WHERE rif = ANY(%s)"""
+    if conn is not None:
+        df = pd.read_sql(sql, conn, params=(list(rifs),))
+    else:
+        df = database.consultar_df(sql, (list(rifs),))
+    df["sustraendo"] = df["tipo_persona"].map(aplica_sustraendo)
+    return df.set_index("rif")
@@ -0,0 +1,98 @@
+# indicadores.py
+"""Indicadores del Dashboard de finanzas.
+
+Nada aquí lee `compras`: los montos salen de `resumen_compras` (período x
+proveedor), que los triggers de la migración 14 acumulan en la misma
+transacción que inserta, modifica o borra un documento, y el gasto por centro de
+costo sale de `saldos_cuenta`. Las consultas recorren a lo sumo meses x
+proveedores filas, sin importar cuántas facturas haya.
+"""
+from datetime import date
+import contabilizacion
+import database
+import periodos
+
+SQL_MENSUAL = """
+    SELECT periodo, SUM(documentos) AS documentos, SUM(base_imponible + monto_exento) AS compras,
+           SUM(iva_monto) AS iva_credito, SUM(iva_retenido) AS ret_iva, SUM(islr_retenido) AS ret_islr,
+           SUM(total_factura) AS total
+    FROM resumen_compras
+    WHERE periodo >= %(desde)s AND periodo <= %(hasta)s
+    GROUP BY periodo ORDER BY periodo
+"""
+
+SQL_TOP_PROVEEDORES = """
+    SELECT r.rif_proveedor AS rif, COALESCE(e.nombre, r.rif_proveedor) AS nombre,
+           SUM(r.base_imponible + r.monto_exento) AS compras, SUM(r.documentos) AS documentos
+    FROM resumen_compras r LEFT JOIN entidades e ON e.rif = r.rif_proveedor
+    WHERE r.periodo >= %(desde)s AND r.periodo <= %(hasta)s
+    GROUP BY 1, 2 ORDER BY compras DESC LIMIT %(limite)s
+"""
+
+SQL_POR_PAGAR = """
+    SELECT r.rif_proveedor AS rif, COALESCE(e.nombre, r.rif_proveedor) AS nombre, SUM(r.saldo_pendiente) AS saldo
+    FROM resumen_compras r LEFT JOIN entidades e ON e.rif = r.rif_proveedor
+    GROUP BY 1, 2 HAVING SUM(r.saldo_pendiente) <> 0
+    ORDER BY saldo DESC
+"""
+
+SQL_GASTO_CENTROS = """
+    SELECT s.periodo, COALESCE(cc.nombre, 'Sin centro') AS centro, SUM(s.debe - s.haber) AS gasto
+    FROM saldos_cuenta s LEFT JOIN centros_costo cc ON cc.id = s.centro_costo_id
+    WHERE s.periodo >= %(desde)s AND s.periodo <= %(hasta)s AND s.cuenta_codigo = ANY(%(cuentas)s)
+    GROUP BY 1, 2 ORDER BY 1, 2
+"""
+
+SQL_RECONSTRUIR = """
+    DELETE FROM resumen_compras;
+    INSERT INTO resumen_compras (periodo, rif_proveedor, documentos, base_imponible, monto_exento,
+                                 iva_monto, iva_retenido, islr_retenido, total_factura, saldo_pendiente)
+    SELECT to_char(fecha, 'YYYY-MM'), COALESCE(rif_proveedor, ''), COUNT(*),
+           SUM(s * base_imponible), SUM(s * monto_exento), SUM(s * iva_monto), SUM(s * iva_retenido),
+           SUM(s * islr_retenido), SUM(s * total_factura), SUM(saldo_pendiente)
+    FROM (SELECT *, CASE WHEN tipo_documento = 'NC' THEN -1 ELSE 1 END AS s FROM compras WHERE fecha IS NOT NULL) c
+    GROUP BY 1, 2;
+"""
+
+def rango_meses(meses, hasta=None):
+    """Períodos (desde, hasta) que cubren los últimos `meses` meses hasta `hasta` (hoy por defecto)."""
+    hasta = hasta or date.today()
+    total = hasta.year * 12 + hasta.month - meses
+    return periodos.nombre(total % 12 + 1, total // 12), periodos.nombre(hasta.month, hasta.year)
+
+def mensual(desde, hasta):
+    """Compras, IVA crédito y retenciones por período (montos netos de NC)."""
+    return database.consultar_df(SQL_MENSUAL, {"desde": desde, "hasta": hasta})
+
+def top_proveedores(desde, hasta, limite=10):
+    return database.consultar_df(SQL_TOP_PROVEEDORES, {"desde": desde, "hasta": hasta, "limite": limite})
+
+def por_pagar():
+    """Saldo abierto por proveedor, del mayor al menor."""
+    return database.consultar_df(SQL_POR_PAGAR)
+
+def gasto_centros(desde, hasta):
+    """Gasto neto (debe - haber) de las cuentas de gasto por período y centro de costo."""
+    cuentas = set(contabilizacion.cuentas_gasto().values())
+    cuentas.add(contabilizacion.cuentas().get("GASTO"))
+    return database.consultar_df(SQL_GASTO_CENTROS, {"desde": desde, "hasta": hasta,
+                                                     "cuentas": [c for c in cuentas if c]})
+
+def reconstruir():
+    """Recalcula `resumen_compras` desde `compras` (verificación o reparación programada).
+
+    Bloquea las escrituras en `compras` mientras dura; las lecturas siguen libres.
+    """
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            c.execute("LOCK TABLE compras IN SHARE MODE")
+            c.execute(SQL_RECONSTRUIR)
+        conn.commit()
+
+if __name__ == "__main__":
+    import sys
+    if "--reconstruir" in sys.argv:
+        reconstruir()
+        print("resumen_compras recalculado.")
+    else:
+        print(__doc__)
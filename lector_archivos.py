@@ -0,0 +1,152 @@
+# lector_archivos.py
+"""Lectura en streaming de archivos Excel/CSV para cargas masivas.
+
+La cabecera se busca solo en las primeras filas y luego el archivo se recorre
+una única vez entregando bloques de tamaño fijo, así la memoria usada no
+depende del tamaño del archivo.
+"""
+import csv
+import unicodedata
+import pandas as pd
+from openpyxl import load_workbook
+
+FILAS_BUSQUEDA = 30
+TAMANO_LOTE = 5000
+
+# Nombre canónico -> encabezados aceptados (normalizados: mayúsculas, sin acentos)
+COLUMNAS_MAESTRO = {
+    "RIF": ["RIF", "R.I.F.", "R.I.F", "RIF/CI", "CI/RIF", "RIF/CEDULA", "CEDULA/RIF", "NRO RIF", "NUMERO DE RIF"],
+    "NOMBRE": ["NOMBRE", "RAZON SOCIAL", "NOMBRE O RAZON SOCIAL", "NOMBRE/RAZON SOCIAL", "DENOMINACION", "CLIENTE", "PROVEEDOR"],
+    "DIRECCION": ["DIRECCION", "DIRECCION FISCAL", "DOMICILIO", "DOMICILIO FISCAL"],
+}
+
+def normalizar_encabezado(valor):
+    if valor is None:
+        return ""
+    texto = unicodedata.normalize("NFKD", str(valor)).encode("ascii", "ignore").decode()
+    return " ".join(texto.upper().split())
+
+def a_texto(valor):
+    """Convierte una celda a texto sin arrastrar el '.0' de los números leídos como float."""
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    texto = str(valor).strip()
+    return texto or None
+
+def detectar_cabecera(filas, columnas, requeridas):
+    """Busca la fila de encabezados entre `filas`.
+
+    Retorna (índice de la fila, {posición: nombre canónico}) o None si no aparecen las requeridas.
+    """
+    sinonimos = {normalizar_encabezado(s): canon for canon, lista in columnas.items() for s in lista}
+    for idx, fila in enumerate(filas):
+        mapa = {}
+        for pos, celda in enumerate(fila):
+            canon = sinonimos.get(normalizar_encabezado(celda))
+            if canon and canon not in mapa.values():
+                mapa[pos] = canon
+        if all(r in mapa.values() for r in requeridas):
+            return idx, mapa
+    return None
+
+class ArchivoCarga:
+    """Archivo subido con la cabecera ya ubicada; `lotes()` lo recorre en una sola pasada."""
+
+    def __init__(self, archivo, nombre, columnas=COLUMNAS_MAESTRO, requeridas=("RIF", "NOMBRE"),
+                 filas_busqueda=FILAS_BUSQUEDA):
+        self.archivo = archivo
+        self.es_csv = nombre.lower().endswith(".csv")
+        self.columnas = columnas
+        self.fila_cabecera = None
+        self.mapa = {}
+        self.total_estimado = None
+        self._separador = ","
+        self._codificacion = "utf-8-sig"
+        if self.es_csv:
+            primeras = self._primeras_filas_csv(filas_busqueda)
+        else:
+            primeras = self._primeras_filas_excel(filas_busqueda)
+        hallada = detectar_cabecera(primeras, columnas, requeridas)
+        if hallada:
+            self.fila_cabecera, self.mapa = hallada
+
+    @property
+    def valido(self):
+        return self.fila_cabecera is not None
+
+    def _primeras_filas_excel(self, n):
+        self.archivo.seek(0)
+        libro = load_workbook(self.archivo, read_only=True, data_only=True)
+        try:
+            hoja = libro.active
+            # max_row sale de los metadatos de la hoja; sirve como estimado para el progreso
+            if hoja.max_row:
+                self.total_estimado = hoja.max_row
+            return [fila for _, fila in zip(range(n), hoja.iter_rows(values_only=True))]
+        finally:
+            libro.close()
+
+    def _primeras_filas_csv(self, n):
+        self.archivo.seek(0)
+        muestra = self.archivo.read(64 * 1024)
+        if isinstance(muestra, bytes):
+            try:
+                muestra = muestra.decode("utf-8-sig")
+            except UnicodeDecodeError:
+                self._codificacion = "latin-1"
+                muestra = muestra.decode("latin-1")
+        try:
+            self._separador = csv.Sniffer().sniff(muestra, delimiters=",;\t|").delimiter
+        except csv.Error:
+            pass
+        lineas = muestra.splitlines()[:n]
+        return list(csv.reader(lineas, delimiter=self._separador))
+
+    def lotes(self, tamano=TAMANO_LOTE):
+        """Genera DataFrames de hasta `tamano` filas con columnas canónicas y tipo texto."""
+        if not self.valido:
+            return
+        posiciones = sorted(self.mapa)
+        nombres = [self.mapa[p] for p in posiciones]
+        if self.es_csv:
+            yield from self._lotes_csv(posiciones, nombres, tamano)
+        else:
+            yield from self._lotes_excel(posiciones, nombres, tamano)
+
+    def _lotes_excel(self, posiciones, nombres, tamano):
+        self.archivo.seek(0)
+        libro = load_workbook(self.archivo, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(min_row=self.fila_cabecera + 2, values_only=True)
+            lote = []
+            for fila in filas:
+                valores = [a_texto(fila[p]) if p < len(fila) else None for p in posiciones]
+                if any(v is not None for v in valores):
+                    lote.append(valores)
+                if len(lote) >= tamano:
+                    yield pd.DataFrame(lote, columns=nombres, dtype="string")
+                    lote = []
+            if lote:
+                yield pd.DataFrame(lote, columns=nombres, dtype="string")
+        finally:
+            libro.close()
+
+    def _lotes_csv(self, posiciones, nombres, tamano):
+        self.archivo.seek(0)
+        lector = pd.read_csv(self.archivo, sep=self._separador, header=None, skiprows=self.fila_cabecera + 1,
+                             usecols=posiciones, dtype="string", chunksize=tamano, encoding=self._codificacion,
+                             skip_blank_lines=True)
+        for lote in lector:
+            lote = lote[posiciones]
+            lote.columns = nombres
+            yield lote.apply(lambda col: col.str.strip()).dropna(how="all")
+
+    def vista_previa(self, n=3):
+        """Primeras `n` filas de datos, sin recorrer el resto del archivo."""
+        lotes = self.lotes(tamano=n)
+        try:
+            return next(lotes, pd.DataFrame(columns=list(self.mapa.values())))
+        finally:
+            lotes.close()
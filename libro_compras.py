@@ -0,0 +1,208 @@
+# libro_compras.py
+"""Consultas del Libro de Compras (reporte fiscal SENIAT).
+
+Los filtros de período usan rangos de fecha (`fecha >= desde AND fecha < hasta`)
+para aprovechar el índice `idx_compras_fecha`; nunca EXTRACT sobre la columna.
+Los meses cerrados se leen de la instantánea `snapshot_libro_compras`.
+`exportar_xlsx` escribe el libro legal de uno o varios meses en streaming.
+"""
+from datetime import date
+import xlsxwriter
+import configuracion
+import database
+import exportacion
+import impuestos
+import periodos
+
+SQL_DETALLE = """
+    SELECT c.id, c.fecha, e.rif, e.nombre, c.num_factura, c.num_control, c.tipo_documento,
+           c.base_imponible, c.iva_monto, c.iva_retenido, c.total_factura, c.saldo_pendiente
+    FROM compras c JOIN entidades e ON c.rif_proveedor = e.rif
+    WHERE c.fecha >= %(desde)s AND c.fecha < %(hasta)s {despues_de}
+    ORDER BY c.fecha, c.id
+"""
+
+SQL_TOTALES = """
+    SELECT COUNT(*) AS documentos,
+           COALESCE(SUM(base_imponible), 0) AS base_imponible,
+           COALESCE(SUM(iva_monto), 0) AS iva_monto,
+           COALESCE(SUM(iva_retenido), 0) AS iva_retenido,
+           COALESCE(SUM(total_factura), 0) AS total_factura
+    FROM compras
+    WHERE fecha >= %(desde)s AND fecha < %(hasta)s
+"""
+
+SQL_DETALLE_CIERRE = """
+    SELECT c.compra_id AS id, c.fecha, c.rif, c.nombre, c.num_factura, c.num_control, c.tipo_documento,
+           c.base_imponible, c.iva_monto, c.iva_retenido, c.total_factura, c.saldo_pendiente
+    FROM snapshot_libro_compras c
+    WHERE c.periodo = %(periodo)s {despues_de}
+    ORDER BY c.fecha, c.compra_id
+"""
+
+SQL_TOTALES_CIERRE = """
+    SELECT COUNT(*) AS documentos,
+           COALESCE(SUM(base_imponible), 0) AS base_imponible,
+           COALESCE(SUM(iva_monto), 0) AS iva_monto,
+           COALESCE(SUM(iva_retenido), 0) AS iva_retenido,
+           COALESCE(SUM(total_factura), 0) AS total_factura
+    FROM snapshot_libro_compras
+    WHERE periodo = %(periodo)s
+"""
+
+SQL_EXPORTAR = """
+    SELECT c.fecha, e.rif, e.nombre, c.tipo_documento, c.num_factura, c.num_control,
+           c.base_imponible, c.monto_exento, c.iva_monto, c.iva_retenido
+    FROM compras c JOIN entidades e ON c.rif_proveedor = e.rif
+    WHERE c.fecha >= %(desde)s AND c.fecha < %(hasta)s
+    ORDER BY c.fecha, c.id
+"""
+
+SQL_EXPORTAR_CIERRE = """
+    SELECT fecha, rif, nombre, tipo_documento, num_factura, num_control,
+           base_imponible, monto_exento, iva_monto, iva_retenido
+    FROM snapshot_libro_compras
+    WHERE periodo = %(periodo)s
+    ORDER BY fecha, compra_id
+"""
+
+# Formato legal SENIAT; los montos se suman en los subtotales
+COLUMNAS_LEGALES = [
+    ("N° Oper.", 7), ("Fecha del Documento", 11), ("RIF", 13), ("Nombre o Razón Social", 38),
+    ("Tipo Doc.", 6), ("N° Comprobante de Retención", 16), ("N° Factura", 14), ("N° Control", 14),
+    ("N° Nota de Crédito", 14), ("Tipo de Transacción", 11), ("N° Factura Afectada", 14),
+    ("Total Compras Incluyendo IVA", 16), ("Compras sin Derecho a Crédito IVA", 16), ("Base Imponible", 16),
+    ("% Alícuota", 8), ("Impuesto IVA", 14), ("IVA Retenido", 14),
+]
+COLUMNAS_MONTO = (11, 12, 13, 15, 16)
+FILA_ENCABEZADO = 5
+
+def rango_mes(mes, ano):
+    """Primer día del mes y primer día del mes siguiente."""
+    desde = date(ano, mes, 1)
+    hasta = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    return desde, hasta
+
+def pagina(mes, ano, despues_de=None, tamano=100):
+    """Página del libro ordenada por (fecha, id). `despues_de` es la llave (fecha, id) de la última fila vista."""
+    desde, hasta = rango_mes(mes, ano)
+    periodo = periodos.nombre(mes, ano)
+    params = {"desde": desde, "hasta": hasta, "periodo": periodo}
+    cerrado = periodos.esta_cerrado(periodo)
+    filtro = ""
+    if despues_de is not None:
+        filtro = "AND (c.fecha, {id}) > (%(fecha)s, %(id)s)".format(id="c.compra_id" if cerrado else "c.id")
+        params.update({"fecha": despues_de[0], "id": despues_de[1]})
+    sql = SQL_DETALLE_CIERRE if cerrado else SQL_DETALLE
+    return database.consultar_pagina(sql.format(despues_de=filtro), params, tamano)
+
+def totales(mes, ano):
+    """Totales del mes calculados en la base: documentos, base, IVA, IVA retenido y total."""
+    desde, hasta = rango_mes(mes, ano)
+    periodo = periodos.nombre(mes, ano)
+    sql = SQL_TOTALES_CIERRE if periodos.esta_cerrado(periodo) else SQL_TOTALES
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            c.execute(sql, {"desde": desde, "hasta": hasta, "periodo": periodo})
+            fila = c.fetchone()
+            columnas = [d[0] for d in c.description]
+    return {col: (float(valor) if col != "documentos" else valor) for col, valor in zip(columnas, fila)}
+
+def meses_entre(desde, hasta):
+    """Períodos AAAA-MM de `desde` a `hasta`, ambos incluidos."""
+    inicio = int(desde[:4]) * 12 + int(desde[5:7]) - 1
+    fin = int(hasta[:4]) * 12 + int(hasta[5:7]) - 1
+    return [periodos.nombre(n % 12 + 1, n // 12) for n in range(inicio, fin + 1)]
+
+def _columna(j):
+    return xlsxwriter.utility.xl_col_to_name(j)
+
+def exportar_xlsx(desde, hasta, destino=None):
+    """Libro de Compras legal de los períodos `desde`..`hasta` (AAAA-MM) en una hoja XLSX.
+
+    Las filas llegan por bloques desde un cursor del servidor y xlsxwriter en modo
+    `constant_memory` las vuelca al disco, así la memoria de la generación no depende
+    de cuántas facturas tenga el mes (para servirlo, `exportacion.para_descarga` sí
+    lee el archivo completo). Cada mes cierra con un subtotal y el rango con el total general
+    (fórmulas SUBTOTAL con su valor ya calculado). Retorna (destino rebobinado, documentos).
+    """
+    destino = destino if destino is not None else exportacion.archivo_temporal()
+    meses = meses_entre(desde, hasta)
+    empresa = configuracion.obtener()
+    libro = xlsxwriter.Workbook(destino, {"constant_memory": True, "remove_timezone": True})
+    hoja = libro.add_worksheet("Libro de Compras")
+    titulo = libro.add_format({"bold": True, "font_size": 13})
+    negrita = libro.add_format({"bold": True})
+    cabecera = libro.add_format({"bold": True, "text_wrap": True, "valign": "vcenter", "align": "center",
+                                 "border": 1, "bg_color": "#D9E1F2"})
+    fecha = libro.add_format({"num_format": "dd/mm/yyyy"})
+    monto = libro.add_format({"num_format": "#,##0.00;-#,##0.00"})
+    porcentaje = libro.add_format({"num_format": "0.00"})
+    total = libro.add_format({"bold": True, "num_format": "#,##0.00;-#,##0.00", "top": 1})
+    total_texto = libro.add_format({"bold": True, "top": 1})
+
+    for j, (_, ancho) in enumerate(COLUMNAS_LEGALES):
+        hoja.set_column(j, j, ancho)
+    hoja.write(0, 0, empresa.nombre_empresa, titulo)
+    hoja.write(1, 0, f"RIF: {empresa.rif_empresa}", negrita)
+    hoja.write(2, 0, "LIBRO DE COMPRAS", titulo)
+    hoja.write(3, 0, f"Período: {desde}" if desde == hasta else f"Período: {desde} a {hasta}")
+    hoja.set_row(FILA_ENCABEZADO, 45)
+    hoja.write_row(FILA_ENCABEZADO, 0, [nombre for nombre, _ in COLUMNAS_LEGALES], cabecera)
+
+    fila = FILA_ENCABEZADO
+    operacion = 0
+    generales = dict.fromkeys(COLUMNAS_MONTO, 0.0)
+    tasas = {}
+    with database.obtener_conexion() as conn:
+        for periodo in meses:
+            inicio_mes = fila + 1
+            sumas = dict.fromkeys(COLUMNAS_MONTO, 0.0)
+            if periodos.esta_cerrado(periodo):
+                sql, params = SQL_EXPORTAR_CIERRE, {"periodo": periodo}
+            else:
+                desde_mes, hasta_mes = periodos.rango(periodo)
+                sql, params = SQL_EXPORTAR, {"desde": desde_mes, "hasta": hasta_mes}
+            for _, bloque in exportacion.bloques(conn, sql, params):
+                for f_doc, rif, nombre, tipo, factura, control, base, exento, iva, retenido in bloque:
+                    fila += 1
+                    operacion += 1
+                    signo = -1 if tipo == "NC" else 1
+                    base, exento, iva, retenido = (signo * float(v or 0) for v in (base, exento, iva, retenido))
+                    if f_doc not in tasas:
+                        tasas[f_doc] = impuestos.parametros(f_doc).tasa_iva * 100
+                    valores = {11: base + exento + iva, 12: exento, 13: base, 15: iva, 16: retenido}
+                    hoja.write_number(fila, 0, operacion)
+                    if f_doc:
+                        hoja.write_datetime(fila, 1, f_doc, fecha)
+                    hoja.write_row(fila, 2, [rif, nombre, tipo, None, None if tipo == "NC" else factura, control,
+                                             factura if tipo == "NC" else None, "01-REG", None])
+                    for j, valor in valores.items():
+                        hoja.write_number(fila, j, round(valor, 2), monto)
+                        sumas[j] += valor
+                    hoja.write_number(fila, 14, tasas[f_doc] if base else 0, porcentaje)
+            fila += 1
+            hoja.write(fila, 3, f"Total {periodo}", total_texto)
+            for j in COLUMNAS_MONTO:
+                if fila == inicio_mes:
+                    hoja.write_number(fila, j, 0, total)
+                else:
+                    rango = f"{_columna(j)}{inicio_mes + 1}:{_columna(j)}{fila}"
+                    hoja.write_formula(fila, j, f"=SUBTOTAL(9,{rango})", total, round(sumas[j], 2))
+                generales[j] += sumas[j]
+        conn.rollback()
+
+    if len(meses) > 1:
+        fila += 1
+        hoja.write(fila, 3, "TOTAL GENERAL", total_texto)
+        for j in COLUMNAS_MONTO:
+            rango = f"{_columna(j)}{FILA_ENCABEZADO + 2}:{_columna(j)}{fila}"
+            hoja.write_formula(fila, j, f"=SUBTOTAL(9,{rango})", total, round(generales[j], 2))
+    hoja.freeze_panes(FILA_ENCABEZADO + 1, 0)
+    hoja.repeat_rows(FILA_ENCABEZADO)
+    hoja.set_landscape()
+    hoja.set_paper(5)  # Oficio
+    hoja.fit_to_pages(1, 0)
+    libro.close()
+    destino.seek(0)
+    return destino, operacion
@@ -0,0 +1,91 @@
+# listado_entidades.py
+"""Listado paginado de clientes y proveedores.
+
+Solo se piden las columnas que se muestran. El orden y los filtros corren en
+el servidor y la paginación es por llave (columna de orden, rif), apoyada en
+`idx_entidades_nombre_rif` y `idx_entidades_categoria_nombre` (migración 9).
+El conteo es aproximado cuando no hay filtros y acotado cuando los hay.
+"""
+import database
+
+COLUMNAS = ("rif", "nombre", "categoria", "tipo_persona", "tipo_contribuyente",
+            "retencion_islr_pct", "retencion_iva_pct")
+ORDENES = {"Nombre": "nombre", "RIF": "rif"}
+TOPE_CONTEO = 10000
+
+SQL_LISTADO = """
+    SELECT {columnas}
+    FROM entidades e
+    WHERE TRUE {filtros}
+    ORDER BY {orden}
+"""
+
+def _escapar_like(texto):
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _filtros(categoria=None, tipo_contribuyente=None, texto=None):
+    """Condiciones SQL y parámetros para los filtros indicados (los vacíos se omiten)."""
+    condiciones, params = [], {}
+    if categoria:
+        condiciones.append("e.categoria = %(categoria)s")
+        params["categoria"] = categoria
+    if tipo_contribuyente:
+        condiciones.append("e.tipo_contribuyente = %(tipo_contribuyente)s")
+        params["tipo_contribuyente"] = tipo_contribuyente
+    texto = (texto or "").strip()
+    if texto:
+        # Prefijo de RIF (text_pattern_ops) o nombre parcial (GIN trigram de la migración 8)
+        condiciones.append("(e.rif LIKE %(prefijo)s OR e.nombre ILIKE %(contiene)s)")
+        params["prefijo"] = _escapar_like(texto.upper().replace("-", "").replace(" ", "")) + "%"
+        params["contiene"] = "%" + _escapar_like(texto) + "%"
+    return condiciones, params
+
+def _orden(orden, descendente):
+    columna = ORDENES.get(orden, "nombre")
+    sentido = "DESC" if descendente else "ASC"
+    return columna, f"e.{columna} {sentido}" + (f", e.rif {sentido}" if columna != "rif" else "")
+
+def _consulta(categoria, tipo_contribuyente, texto, orden, descendente, despues_de=None):
+    condiciones, params = _filtros(categoria, tipo_contribuyente, texto)
+    columna, orden_sql = _orden(orden, descendente)
+    if despues_de is not None:
+        comparador = "<" if descendente else ">"
+        if columna == "rif":
+            condiciones.append(f"e.rif {comparador} %(rif_llave)s")
+        else:
+            condiciones.append(f"(e.{columna}, e.rif) {comparador} (%(valor_llave)s, %(rif_llave)s)")
+            params["valor_llave"] = despues_de[0]
+        params["rif_llave"] = despues_de[1]
+    filtros = "".join(f" AND {cond}" for cond in condiciones)
+    sql = SQL_LISTADO.format(columnas=", ".join(f"e.{c}" for c in COLUMNAS), filtros=filtros, orden=orden_sql)
+    return sql, params
+
+def pagina(categoria=None, tipo_contribuyente=None, texto=None, orden="Nombre", descendente=False,
+           despues_de=None, tamano=100):
+    """Página del listado. `despues_de` es la llave (valor de la columna de orden, rif) de la última fila vista."""
+    sql, params = _consulta(categoria, tipo_contribuyente, texto, orden, descendente, despues_de)
+    return database.consultar_pagina(sql, params, tamano)
+
+def llave(df, orden="Nombre"):
+    """Llave de la última fila de una página, para pedir la siguiente."""
+    if df.empty:
+        return None
+    ultima = df.iloc[-1]
+    return (ultima[ORDENES.get(orden, "nombre")], ultima["rif"])
+
+def consulta_exportacion(categoria=None, tipo_contribuyente=None, texto=None, orden="Nombre", descendente=False):
+    """(sql, params) del conjunto filtrado completo, para `exportacion`."""
+    return _consulta(categoria, tipo_contribuyente, texto, orden, descendente)
+
+def contar(categoria=None, tipo_contribuyente=None, texto=None):
+    """(cantidad, exacta). Sin filtros usa la estimación del planificador; con filtros cuenta hasta TOPE_CONTEO."""
+    condiciones, params = _filtros(categoria, tipo_contribuyente, texto)
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            if not condiciones:
+                c.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'entidades'::regclass")
+                return c.fetchone()[0], False
+            filtros = " AND ".join(condiciones)
+            c.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM entidades e WHERE {filtros} LIMIT {TOPE_CONTEO + 1}) t", params)
+            total = c.fetchone()[0]
+    return min(total, TOPE_CONTEO), total <= TOPE_CONTEO
@@ -0,0 +1,550 @@
+# migraciones.py
+"""Migraciones versionadas del esquema.
+
+Cada paso se aplica una sola vez, en orden, y queda registrado en `schema_version`
+con su checksum. Las cargas normales de página no ejecutan DDL: basta con una
+consulta de versión por proceso (ver `asegurar_esquema`).
+
+Uso administrativo:  python migraciones.py [--estado]
+"""
+import hashlib
+import sys
+import streamlit as st
+import database
+
+# Llave para pg_advisory_xact_lock: evita que dos procesos migren a la vez
+LLAVE_BLOQUEO = 7300101
+
+# (versión, descripción, SQL). Nunca modificar un paso ya publicado: agregar uno nuevo.
+MIGRACIONES = [
+    (1, "Esquema base", """
+        CREATE TABLE IF NOT EXISTS usuarios (id SERIAL PRIMARY KEY, username TEXT UNIQUE, password TEXT, rol TEXT, usuario TEXT, clave TEXT);
+        ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS username TEXT UNIQUE;
+        ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS password TEXT;
+        ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS clave TEXT;
+        ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS rol TEXT;
+
+        CREATE TABLE IF NOT EXISTS periodos_fiscales (id SERIAL PRIMARY KEY, periodo TEXT UNIQUE, estatus TEXT DEFAULT 'Abierto');
+        CREATE TABLE IF NOT EXISTS asientos_cabecera (id SERIAL PRIMARY KEY, num_asiento TEXT UNIQUE, fecha DATE, concepto TEXT, origen TEXT, creado_por TEXT);
+        CREATE TABLE IF NOT EXISTS asientos_detalle (
+            id SERIAL PRIMARY KEY, asiento_id INTEGER REFERENCES asientos_cabecera(id),
+            cuenta_codigo TEXT, descripcion TEXT, debe NUMERIC(14,2) DEFAULT 0, haber NUMERIC(14,2) DEFAULT 0);
+
+        CREATE TABLE IF NOT EXISTS configuracion (
+            id INTEGER PRIMARY KEY DEFAULT 1, nombre_empresa TEXT, rif_empresa TEXT,
+            direccion_empresa TEXT, tipo_contribuyente TEXT, ut_valor NUMERIC(12,2), factor_sustraendo NUMERIC(12,4));
+        ALTER TABLE configuracion ADD COLUMN IF NOT EXISTS tipo_contribuyente TEXT;
+        ALTER TABLE configuracion ADD COLUMN IF NOT EXISTS ut_valor NUMERIC(12,2);
+        ALTER TABLE configuracion ADD COLUMN IF NOT EXISTS factor_sustraendo NUMERIC(12,4);
+
+        CREATE TABLE IF NOT EXISTS entidades (
+            rif TEXT PRIMARY KEY, nombre TEXT, direccion TEXT, tipo_persona TEXT, tipo_contribuyente TEXT,
+            categoria TEXT, retencion_islr_pct NUMERIC(6,2) DEFAULT 0, retencion_iva_pct NUMERIC(6,2) DEFAULT 0);
+        CREATE TABLE IF NOT EXISTS centros_costo (id SERIAL PRIMARY KEY, codigo TEXT UNIQUE, nombre TEXT);
+        CREATE TABLE IF NOT EXISTS compra_subtipos (id SERIAL PRIMARY KEY, nombre TEXT UNIQUE, cuenta_codigo TEXT);
+        CREATE TABLE IF NOT EXISTS articulos (id SERIAL PRIMARY KEY, descripcion TEXT, precio_sugerido NUMERIC(14,2));
+        CREATE TABLE IF NOT EXISTS compras (
+            id SERIAL PRIMARY KEY, fecha DATE, rif_proveedor TEXT, num_factura TEXT, num_control TEXT, tipo_documento TEXT,
+            base_imponible NUMERIC(14,2) DEFAULT 0, monto_exento NUMERIC(14,2) DEFAULT 0, iva_monto NUMERIC(14,2) DEFAULT 0,
+            iva_retenido NUMERIC(14,2) DEFAULT 0, islr_retenido NUMERIC(14,2) DEFAULT 0, total_factura NUMERIC(14,2) DEFAULT 0,
+            saldo_pendiente NUMERIC(14,2) DEFAULT 0, subtipo TEXT, asiento_id INTEGER, creado_por TEXT);
+        CREATE TABLE IF NOT EXISTS logs_actividad (
+            id SERIAL PRIMARY KEY, fecha_hora TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            usuario TEXT, accion TEXT, tabla_afectada TEXT, detalle TEXT);
+
+        -- Inicializaciones por defecto
+        INSERT INTO usuarios (username, usuario, password, rol) VALUES ('admin', 'admin', 'admin123', 'admin') ON CONFLICT DO NOTHING;
+        INSERT INTO configuracion (id, nombre_empresa) VALUES (1, 'ADONAI GROUP') ON CONFLICT (id) DO NOTHING;
+    """),
+    (2, "Avisos de cambio para la caché de datos de referencia", """
+        CREATE OR REPLACE FUNCTION notificar_cambio_datos() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('cambios_datos', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_cambios_entidades ON entidades;
+        CREATE TRIGGER trg_cambios_entidades AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON entidades
+            FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_datos();
+        DROP TRIGGER IF EXISTS trg_cambios_compra_subtipos ON compra_subtipos;
+        CREATE TRIGGER trg_cambios_compra_subtipos AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON compra_subtipos
+            FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_datos();
+        DROP TRIGGER IF EXISTS trg_cambios_centros_costo ON centros_costo;
+        CREATE TRIGGER trg_cambios_centros_costo AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON centros_costo
+            FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_datos();
+        DROP TRIGGER IF EXISTS trg_cambios_articulos ON articulos;
+        CREATE TRIGGER trg_cambios_articulos AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON articulos
+            FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_datos();
+    """),
+    (3, "Índices del Libro de Compras", """
+        CREATE INDEX IF NOT EXISTS idx_compras_fecha ON compras (fecha, id);
+        CREATE INDEX IF NOT EXISTS idx_compras_rif_proveedor ON compras (rif_proveedor);
+    """),
+    (4, "Diario General: totales en la cabecera e índices de paginación", """
+        ALTER TABLE asientos_cabecera ADD COLUMN IF NOT EXISTS total_debe NUMERIC(14,2) NOT NULL DEFAULT 0;
+        ALTER TABLE asientos_cabecera ADD COLUMN IF NOT EXISTS total_haber NUMERIC(14,2) NOT NULL DEFAULT 0;
+
+        UPDATE asientos_cabecera a SET total_debe = t.debe, total_haber = t.haber
+        FROM (SELECT asiento_id, COALESCE(SUM(debe), 0) AS debe, COALESCE(SUM(haber), 0) AS haber
+              FROM asientos_detalle GROUP BY asiento_id) t
+        WHERE a.id = t.asiento_id;
+
+        -- Mantiene los totales con cada línea escrita, sin volver a sumar el detalle
+        CREATE OR REPLACE FUNCTION actualizar_totales_asiento() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE asientos_cabecera
+                SET total_debe = total_debe - COALESCE(OLD.debe, 0), total_haber = total_haber - COALESCE(OLD.haber, 0)
+                WHERE id = OLD.asiento_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE asientos_cabecera
+                SET total_debe = total_debe + COALESCE(NEW.debe, 0), total_haber = total_haber + COALESCE(NEW.haber, 0)
+                WHERE id = NEW.asiento_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_totales_asiento ON asientos_detalle;
+        CREATE TRIGGER trg_totales_asiento AFTER INSERT OR UPDATE OF asiento_id, debe, haber OR DELETE ON asientos_detalle
+            FOR EACH ROW EXECUTE FUNCTION actualizar_totales_asiento();
+
+        CREATE INDEX IF NOT EXISTS idx_asientos_fecha ON asientos_cabecera (fecha, id);
+        CREATE INDEX IF NOT EXISTS idx_asientos_origen_fecha ON asientos_cabecera (origen, fecha, id);
+        CREATE INDEX IF NOT EXISTS idx_asientos_num_asiento ON asientos_cabecera (num_asiento text_pattern_ops);
+        CREATE INDEX IF NOT EXISTS idx_asientos_detalle_asiento ON asientos_detalle (asiento_id);
+    """),
+    (5, "Registro de secuencias de correlativos por origen y año", """
+        CREATE TABLE IF NOT EXISTS correlativos (
+            origen TEXT NOT NULL, ano INTEGER NOT NULL, secuencia TEXT NOT NULL UNIQUE,
+            creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (origen, ano));
+    """),
+    (6, "logs_actividad particionada por mes", """
+        ALTER TABLE logs_actividad RENAME TO logs_actividad_previo;
+        ALTER SEQUENCE IF EXISTS logs_actividad_id_seq RENAME TO logs_actividad_previo_id_seq;
+
+        CREATE TABLE logs_actividad (
+            id BIGSERIAL, fecha_hora TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            usuario TEXT, accion TEXT, tabla_afectada TEXT, detalle TEXT
+        ) PARTITION BY RANGE (fecha_hora);
+        CREATE TABLE logs_actividad_default PARTITION OF logs_actividad DEFAULT;
+
+        CREATE INDEX idx_logs_fecha ON logs_actividad (fecha_hora, id);
+        CREATE INDEX idx_logs_usuario_fecha ON logs_actividad (usuario, fecha_hora, id);
+        CREATE INDEX idx_logs_tabla_fecha ON logs_actividad (tabla_afectada, fecha_hora, id);
+
+        -- Crea la partición del mes; si la DEFAULT ya recibió filas de ese mes, las mueve
+        CREATE OR REPLACE FUNCTION crear_particion_logs(mes DATE) RETURNS TEXT AS $$
+        DECLARE
+            inicio TIMESTAMP := date_trunc('month', mes);
+            fin TIMESTAMP := date_trunc('month', mes) + INTERVAL '1 month';
+            nombre TEXT := 'logs_actividad_' || to_char(mes, 'YYYY_MM');
+        BEGIN
+            IF to_regclass(nombre) IS NULL THEN
+                EXECUTE format('CREATE TABLE %I (LIKE logs_actividad INCLUDING DEFAULTS)', nombre);
+                EXECUTE format('WITH movidas AS (DELETE FROM logs_actividad_default WHERE fecha_hora >= %L AND fecha_hora < %L RETURNING *) '
+                               'INSERT INTO %I SELECT * FROM movidas', inicio, fin, nombre);
+                EXECUTE format('ALTER TABLE logs_actividad ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', nombre, inicio, fin);
+            END IF;
+            RETURN nombre;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        SELECT crear_particion_logs(m::date)
+        FROM generate_series(
+            date_trunc('month', LEAST(COALESCE((SELECT MIN(fecha_hora) FROM logs_actividad_previo), now()), now())),
+            date_trunc('month', now()) + INTERVAL '2 month', INTERVAL '1 month') AS m;
+
+        INSERT INTO logs_actividad (id, fecha_hora, usuario, accion, tabla_afectada, detalle)
+        SELECT id, COALESCE(fecha_hora, CURRENT_TIMESTAMP), usuario, accion, tabla_afectada, detalle FROM logs_actividad_previo;
+        SELECT setval(pg_get_serial_sequence('logs_actividad', 'id'), COALESCE((SELECT MAX(id) FROM logs_actividad), 0) + 1, false);
+        DROP TABLE logs_actividad_previo;
+    """),
+    (7, "Cotizaciones guardadas con sus líneas", """
+        CREATE TABLE IF NOT EXISTS cotizaciones (
+            id SERIAL PRIMARY KEY, numero TEXT NOT NULL UNIQUE, fecha DATE NOT NULL, rif_cliente TEXT,
+            subtotal NUMERIC(14,2) DEFAULT 0, iva NUMERIC(14,2) DEFAULT 0, total NUMERIC(14,2) DEFAULT 0,
+            creado_por TEXT, creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE IF NOT EXISTS cotizacion_items (
+            id SERIAL PRIMARY KEY, cotizacion_id INTEGER NOT NULL REFERENCES cotizaciones(id) ON DELETE CASCADE,
+            linea INTEGER NOT NULL, descripcion TEXT, cantidad NUMERIC(14,2) DEFAULT 0,
+            precio NUMERIC(14,2) DEFAULT 0, total NUMERIC(14,2) DEFAULT 0, UNIQUE (cotizacion_id, linea));
+
+        CREATE INDEX IF NOT EXISTS idx_cotizaciones_fecha ON cotizaciones (fecha, id);
+        CREATE INDEX IF NOT EXISTS idx_cotizaciones_cliente_fecha ON cotizaciones (rif_cliente, fecha, id);
+        CREATE INDEX IF NOT EXISTS idx_cotizaciones_numero ON cotizaciones (numero text_pattern_ops);
+    """),
+    (8, "Búsqueda de entidades por RIF y nombre aproximado", """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_entidades_nombre_trgm ON entidades USING gin (nombre gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_entidades_rif_patron ON entidades (rif text_pattern_ops);
+    """),
+    (9, "Índices del listado paginado de entidades", """
+        CREATE INDEX IF NOT EXISTS idx_entidades_nombre_rif ON entidades (nombre, rif);
+        CREATE INDEX IF NOT EXISTS idx_entidades_categoria_nombre ON entidades (categoria, nombre, rif);
+    """),
+    (10, "Parámetros fiscales con fecha de vigencia", """
+        CREATE TABLE IF NOT EXISTS parametros_fiscales (
+            vigente_desde DATE PRIMARY KEY, tasa_iva NUMERIC(6,4) NOT NULL DEFAULT 0.16,
+            ut_valor NUMERIC(12,2) NOT NULL DEFAULT 0, factor_sustraendo NUMERIC(12,4) NOT NULL DEFAULT 83.3334);
+        INSERT INTO parametros_fiscales (vigente_desde, ut_valor, factor_sustraendo)
+        SELECT DATE '2000-01-01', COALESCE(ut_valor, 0), COALESCE(factor_sustraendo, 83.3334) FROM configuracion WHERE id = 1
+        ON CONFLICT (vigente_desde) DO NOTHING;
+
+        DROP TRIGGER IF EXISTS trg_cambios_parametros_fiscales ON parametros_fiscales;
+        CREATE TRIGGER trg_cambios_parametros_fiscales AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON parametros_fiscales
+            FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_datos();
+    """),
+    (11, "Avisos de cambio de la configuración de la empresa", """
+        DROP TRIGGER IF EXISTS trg_cambios_configuracion ON configuracion;
+        CREATE TRIGGER trg_cambios_configuracion AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON configuracion
+            FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_datos();
+    """),
+    (12, "Contabilización automática y saldos por cuenta", """
+        ALTER TABLE asientos_detalle ADD COLUMN IF NOT EXISTS centro_costo_id INTEGER NOT NULL DEFAULT 0;
+
+        CREATE TABLE IF NOT EXISTS cuentas_contabilizacion (concepto TEXT PRIMARY KEY, cuenta_codigo TEXT NOT NULL, descripcion TEXT);
+        INSERT INTO cuentas_contabilizacion (concepto, cuenta_codigo, descripcion) VALUES
+            ('GASTO', '6.1.01.01', 'Gasto sin subtipo asignado'),
+            ('IVA_CREDITO', '1.1.04.01', 'IVA crédito fiscal'),
+            ('RET_IVA', '2.1.03.01', 'Retenciones de IVA por pagar'),
+            ('RET_ISLR', '2.1.03.02', 'Retenciones de ISLR por pagar'),
+            ('PROVEEDORES', '2.1.01.01', 'Cuentas por pagar proveedores')
+        ON CONFLICT (concepto) DO NOTHING;
+        DROP TRIGGER IF EXISTS trg_cambios_cuentas_contabilizacion ON cuentas_contabilizacion;
+        CREATE TRIGGER trg_cambios_cuentas_contabilizacion AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON cuentas_contabilizacion
+            FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_datos();
+
+        CREATE TABLE IF NOT EXISTS saldos_cuenta (
+            cuenta_codigo TEXT NOT NULL, centro_costo_id INTEGER NOT NULL DEFAULT 0, periodo TEXT NOT NULL,
+            debe NUMERIC(16,2) NOT NULL DEFAULT 0, haber NUMERIC(16,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (cuenta_codigo, centro_costo_id, periodo));
+        CREATE INDEX IF NOT EXISTS idx_saldos_cuenta_periodo ON saldos_cuenta (periodo, cuenta_codigo);
+
+        INSERT INTO saldos_cuenta (cuenta_codigo, centro_costo_id, periodo, debe, haber)
+        SELECT d.cuenta_codigo, d.centro_costo_id, to_char(a.fecha, 'YYYY-MM'), COALESCE(SUM(d.debe), 0), COALESCE(SUM(d.haber), 0)
+        FROM asientos_detalle d JOIN asientos_cabecera a ON a.id = d.asiento_id
+        WHERE d.cuenta_codigo IS NOT NULL AND a.fecha IS NOT NULL
+        GROUP BY d.cuenta_codigo, d.centro_costo_id, to_char(a.fecha, 'YYYY-MM')
+        ON CONFLICT (cuenta_codigo, centro_costo_id, periodo) DO NOTHING;
+    """),
+    (13, "Cierre de períodos fiscales con instantáneas", """
+        -- Períodos en formato AAAA-MM; un período sin fila se considera abierto
+        ALTER TABLE periodos_fiscales ADD COLUMN IF NOT EXISTS cerrado_por TEXT;
+        ALTER TABLE periodos_fiscales ADD COLUMN IF NOT EXISTS cerrado_en TIMESTAMP;
+        DROP TRIGGER IF EXISTS trg_cambios_periodos_fiscales ON periodos_fiscales;
+        CREATE TRIGGER trg_cambios_periodos_fiscales AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON periodos_fiscales
+            FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio_datos();
+
+        CREATE OR REPLACE FUNCTION periodo_cerrado(f DATE) RETURNS BOOLEAN AS $$
+            SELECT f IS NOT NULL AND EXISTS (
+                SELECT 1 FROM periodos_fiscales WHERE periodo = to_char(f, 'YYYY-MM') AND estatus = 'Cerrado');
+        $$ LANGUAGE sql STABLE;
+
+        -- compras: solo el saldo pendiente (pagos) puede cambiar en un período cerrado
+        CREATE OR REPLACE FUNCTION bloquear_compras_cerradas() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND (OLD.fecha, OLD.rif_proveedor, OLD.num_factura, OLD.num_control, OLD.tipo_documento,
+                    OLD.base_imponible, OLD.monto_exento, OLD.iva_monto, OLD.iva_retenido, OLD.islr_retenido,
+                    OLD.total_factura, OLD.asiento_id)
+                IS NOT DISTINCT FROM (NEW.fecha, NEW.rif_proveedor, NEW.num_factura, NEW.num_control, NEW.tipo_documento,
+                    NEW.base_imponible, NEW.monto_exento, NEW.iva_monto, NEW.iva_retenido, NEW.islr_retenido,
+                    NEW.total_factura, NEW.asiento_id) THEN
+                RETURN NEW;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') AND periodo_cerrado(OLD.fecha) THEN
+                RAISE EXCEPTION 'El período % está cerrado', to_char(OLD.fecha, 'YYYY-MM');
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND periodo_cerrado(NEW.fecha) THEN
+                RAISE EXCEPTION 'El período % está cerrado', to_char(NEW.fecha, 'YYYY-MM');
+            END IF;
+            RETURN CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS trg_bloqueo_compras ON compras;
+        CREATE TRIGGER trg_bloqueo_compras BEFORE INSERT OR UPDATE OR DELETE ON compras
+            FOR EACH ROW EXECUTE FUNCTION bloquear_compras_cerradas();
+
+        -- asientos: la cabecera solo acepta el recálculo de totales; el detalle, nada
+        CREATE OR REPLACE FUNCTION bloquear_asientos_cerrados() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND (OLD.num_asiento, OLD.fecha, OLD.concepto, OLD.origen)
+                    IS NOT DISTINCT FROM (NEW.num_asiento, NEW.fecha, NEW.concepto, NEW.origen) THEN
+                RETURN NEW;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') AND periodo_cerrado(OLD.fecha) THEN
+                RAISE EXCEPTION 'El período % está cerrado', to_char(OLD.fecha, 'YYYY-MM');
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND periodo_cerrado(NEW.fecha) THEN
+                RAISE EXCEPTION 'El período % está cerrado', to_char(NEW.fecha, 'YYYY-MM');
+            END IF;
+            RETURN CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS trg_bloqueo_asientos ON asientos_cabecera;
+        CREATE TRIGGER trg_bloqueo_asientos BEFORE INSERT OR UPDATE OR DELETE ON asientos_cabecera
+            FOR EACH ROW EXECUTE FUNCTION bloquear_asientos_cerrados();
+
+        CREATE OR REPLACE FUNCTION bloquear_detalle_cerrado() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND periodo_cerrado((SELECT fecha FROM asientos_cabecera WHERE id = OLD.asiento_id)) THEN
+                RAISE EXCEPTION 'El asiento pertenece a un período cerrado';
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND periodo_cerrado((SELECT fecha FROM asientos_cabecera WHERE id = NEW.asiento_id)) THEN
+                RAISE EXCEPTION 'El asiento pertenece a un período cerrado';
+            END IF;
+            RETURN CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS trg_bloqueo_detalle ON asientos_detalle;
+        CREATE TRIGGER trg_bloqueo_detalle BEFORE INSERT OR UPDATE OR DELETE ON asientos_detalle
+            FOR EACH ROW EXECUTE FUNCTION bloquear_detalle_cerrado();
+
+        CREATE TABLE IF NOT EXISTS snapshot_saldos (
+            periodo TEXT NOT NULL, cuenta_codigo TEXT NOT NULL, centro_costo_id INTEGER NOT NULL,
+            debe NUMERIC(16,2) NOT NULL, haber NUMERIC(16,2) NOT NULL,
+            PRIMARY KEY (periodo, cuenta_codigo, centro_costo_id));
+        CREATE TABLE IF NOT EXISTS snapshot_libro_compras (
+            periodo TEXT NOT NULL, compra_id INTEGER NOT NULL, fecha DATE, rif TEXT, nombre TEXT,
+            num_factura TEXT, num_control TEXT, tipo_documento TEXT, base_imponible NUMERIC(14,2),
+            iva_monto NUMERIC(14,2), iva_retenido NUMERIC(14,2), total_factura NUMERIC(14,2),
+            saldo_pendiente NUMERIC(14,2), PRIMARY KEY (periodo, compra_id));
+        CREATE INDEX IF NOT EXISTS idx_snapshot_libro_fecha ON snapshot_libro_compras (periodo, fecha, compra_id);
+
+        -- Las instantáneas solo cambian dentro de periodos.cerrar() (SET LOCAL adonai.cierre = 'on')
+        CREATE OR REPLACE FUNCTION proteger_instantanea() RETURNS trigger AS $$
+        BEGIN
+            IF COALESCE(current_setting('adonai.cierre', true), '') <> 'on' THEN
+                RAISE EXCEPTION 'Las instantáneas de cierre son inmutables';
+            END IF;
+            RETURN CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS trg_proteger_snapshot_saldos ON snapshot_saldos;
+        CREATE TRIGGER trg_proteger_snapshot_saldos BEFORE INSERT OR UPDATE OR DELETE ON snapshot_saldos
+            FOR EACH ROW EXECUTE FUNCTION proteger_instantanea();
+        DROP TRIGGER IF EXISTS trg_proteger_snapshot_libro ON snapshot_libro_compras;
+        CREATE TRIGGER trg_proteger_snapshot_libro BEFORE INSERT OR UPDATE OR DELETE ON snapshot_libro_compras
+            FOR EACH ROW EXECUTE FUNCTION proteger_instantanea();
+    """),
+    (14, "Resumen de compras por período y proveedor para el dashboard", """
+        CREATE TABLE IF NOT EXISTS resumen_compras (
+            periodo TEXT NOT NULL, rif_proveedor TEXT NOT NULL, documentos INTEGER NOT NULL DEFAULT 0,
+            base_imponible NUMERIC(16,2) NOT NULL DEFAULT 0, monto_exento NUMERIC(16,2) NOT NULL DEFAULT 0,
+            iva_monto NUMERIC(16,2) NOT NULL DEFAULT 0, iva_retenido NUMERIC(16,2) NOT NULL DEFAULT 0,
+            islr_retenido NUMERIC(16,2) NOT NULL DEFAULT 0, total_factura NUMERIC(16,2) NOT NULL DEFAULT 0,
+            saldo_pendiente NUMERIC(16,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (periodo, rif_proveedor));
+
+        -- Acumula por sentencia con tablas de transición: una carga masiva es un solo UPSERT agrupado.
+        -- Los montos llevan signo (la NC resta); saldo_pendiente ya viene con signo desde compras.
+        CREATE OR REPLACE FUNCTION acumular_resumen_compras() RETURNS trigger AS $$
+        DECLARE
+            origen TEXT;
+        BEGIN
+            origen := CASE TG_OP
+                WHEN 'INSERT' THEN 'SELECT n.*, 1 AS k FROM compras_nuevas n'
+                WHEN 'DELETE' THEN 'SELECT v.*, -1 AS k FROM compras_viejas v'
+                ELSE 'SELECT n.*, 1 AS k FROM compras_nuevas n UNION ALL SELECT v.*, -1 FROM compras_viejas v' END;
+            EXECUTE format($sql$
+                INSERT INTO resumen_compras AS r (periodo, rif_proveedor, documentos, base_imponible, monto_exento,
+                                                  iva_monto, iva_retenido, islr_retenido, total_factura, saldo_pendiente)
+                SELECT to_char(m.fecha, 'YYYY-MM'), COALESCE(m.rif_proveedor, ''), SUM(m.k),
+                       SUM(m.k * m.s * m.base_imponible), SUM(m.k * m.s * m.monto_exento), SUM(m.k * m.s * m.iva_monto),
+                       SUM(m.k * m.s * m.iva_retenido), SUM(m.k * m.s * m.islr_retenido),
+                       SUM(m.k * m.s * m.total_factura), SUM(m.k * m.saldo_pendiente)
+                FROM (SELECT t.*, CASE WHEN t.tipo_documento = 'NC' THEN -1 ELSE 1 END AS s FROM (%s) t) m
+                WHERE m.fecha IS NOT NULL
+                GROUP BY 1, 2
+                ON CONFLICT (periodo, rif_proveedor) DO UPDATE SET
+                    documentos = r.documentos + EXCLUDED.documentos,
+                    base_imponible = r.base_imponible + EXCLUDED.base_imponible,
+                    monto_exento = r.monto_exento + EXCLUDED.monto_exento,
+                    iva_monto = r.iva_monto + EXCLUDED.iva_monto,
+                    iva_retenido = r.iva_retenido + EXCLUDED.iva_retenido,
+                    islr_retenido = r.islr_retenido + EXCLUDED.islr_retenido,
+                    total_factura = r.total_factura + EXCLUDED.total_factura,
+                    saldo_pendiente = r.saldo_pendiente + EXCLUDED.saldo_pendiente
+            $sql$, origen);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS trg_resumen_compras_ins ON compras;
+        CREATE TRIGGER trg_resumen_compras_ins AFTER INSERT ON compras
+            REFERENCING NEW TABLE AS compras_nuevas
+            FOR EACH STATEMENT EXECUTE FUNCTION acumular_resumen_compras();
+        DROP TRIGGER IF EXISTS trg_resumen_compras_upd ON compras;
+        CREATE TRIGGER trg_resumen_compras_upd AFTER UPDATE ON compras
+            REFERENCING OLD TABLE AS compras_viejas NEW TABLE AS compras_nuevas
+            FOR EACH STATEMENT EXECUTE FUNCTION acumular_resumen_compras();
+        DROP TRIGGER IF EXISTS trg_resumen_compras_del ON compras;
+        CREATE TRIGGER trg_resumen_compras_del AFTER DELETE ON compras
+            REFERENCING OLD TABLE AS compras_viejas
+            FOR EACH STATEMENT EXECUTE FUNCTION acumular_resumen_compras();
+
+        INSERT INTO resumen_compras (periodo, rif_proveedor, documentos, base_imponible, monto_exento,
+                                     iva_monto, iva_retenido, islr_retenido, total_factura, saldo_pendiente)
+        SELECT to_char(fecha, 'YYYY-MM'), COALESCE(rif_proveedor, ''), COUNT(*),
+               SUM(s * base_imponible), SUM(s * monto_exento), SUM(s * iva_monto), SUM(s * iva_retenido),
+               SUM(s * islr_retenido), SUM(s * total_factura), SUM(saldo_pendiente)
+        FROM (SELECT *, CASE WHEN tipo_documento = 'NC' THEN -1 ELSE 1 END AS s FROM compras WHERE fecha IS NOT NULL) c
+        GROUP BY 1, 2
+        ON CONFLICT (periodo, rif_proveedor) DO NOTHING;
+    """),
+    (15, "Pagos a proveedores y saldos abiertos indexados", """
+        -- Solo los documentos con saldo entran al índice: los pagados no lo engordan.
+        -- INCLUDE permite que la antigüedad de saldos se resuelva solo con el índice.
+        CREATE INDEX IF NOT EXISTS idx_compras_abiertas ON compras (rif_proveedor, fecha, id)
+            INCLUDE (saldo_pendiente) WHERE saldo_pendiente <> 0;
+
+        CREATE TABLE IF NOT EXISTS pagos (
+            id SERIAL PRIMARY KEY, fecha DATE NOT NULL, rif_proveedor TEXT NOT NULL, monto NUMERIC(14,2) NOT NULL,
+            monto_aplicado NUMERIC(14,2) NOT NULL DEFAULT 0, referencia TEXT, asiento_id INTEGER,
+            creado_por TEXT, creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE INDEX IF NOT EXISTS idx_pagos_proveedor_fecha ON pagos (rif_proveedor, fecha DESC, id DESC);
+        CREATE TABLE IF NOT EXISTS pago_aplicaciones (
+            pago_id INTEGER NOT NULL REFERENCES pagos(id), compra_id INTEGER NOT NULL,
+            monto NUMERIC(14,2) NOT NULL, PRIMARY KEY (pago_id, compra_id));
+        CREATE INDEX IF NOT EXISTS idx_pago_aplicaciones_compra ON pago_aplicaciones (compra_id);
+
+        INSERT INTO cuentas_contabilizacion (concepto, cuenta_codigo, descripcion) VALUES
+            ('BANCO', '1.1.02.01', 'Bancos')
+        ON CONFLICT (concepto) DO NOTHING;
+    """),
+    (16, "Monto exento en la instantánea del Libro de Compras", """
+        ALTER TABLE snapshot_libro_compras ADD COLUMN IF NOT EXISTS monto_exento NUMERIC(14,2) NOT NULL DEFAULT 0;
+        -- Los cierres ya hechos toman el exento de compras: el candado impide que cambie en un mes cerrado
+        SET LOCAL adonai.cierre = 'on';
+        UPDATE snapshot_libro_compras s SET monto_exento = c.monto_exento
+        FROM compras c WHERE c.id = s.compra_id AND COALESCE(c.monto_exento, 0) <> 0;
+    """),
+    (17, "Cierre de período serializado contra los registros del mes", """
+        -- FOR SHARE sobre la fila del período choca con el FOR UPDATE de periodos.cerrar():
+        -- un registro que ya pasó la verificación obliga al cierre a esperar su commit, y uno
+        -- que llega durante el cierre espera y ve el período cerrado. Si el mes no tiene fila
+        -- se crea abierta, para que siempre haya algo que bloquear.
+        CREATE OR REPLACE FUNCTION periodo_cerrado(f DATE) RETURNS BOOLEAN AS $$
+        DECLARE
+            p TEXT := to_char(f, 'YYYY-MM');
+            est TEXT;
+        BEGIN
+            IF f IS NULL THEN
+                RETURN FALSE;
+            END IF;
+            SELECT estatus INTO est FROM periodos_fiscales WHERE periodo = p FOR SHARE;
+            IF NOT FOUND THEN
+                INSERT INTO periodos_fiscales (periodo, estatus) VALUES (p, 'Abierto') ON CONFLICT (periodo) DO NOTHING;
+                SELECT estatus INTO est FROM periodos_fiscales WHERE periodo = p FOR SHARE;
+            END IF;
+            RETURN est = 'Cerrado';
+        END;
+        $$ LANGUAGE plpgsql VOLATILE;
+    """),
+]
+
+class ErrorMigracion(Exception):
+    pass
+
+def checksum(sql):
+    """Huella del SQL normalizado (sin espacios sobrantes) para detectar pasos alterados."""
+    normalizado = " ".join(sql.split())
+    return hashlib.sha256(normalizado.encode()).hexdigest()
+
+def version_objetivo():
+    return MIGRACIONES[-1][0]
+
+def _crear_tabla_versiones(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY, descripcion TEXT, checksum TEXT NOT NULL,
+        aplicada_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+
+def version_actual(conn):
+    """Versión aplicada en la base, 0 si el esquema nunca fue migrado."""
+    with conn.cursor() as c:
+        c.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+        if not c.fetchone()[0]:
+            return 0
+        c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return c.fetchone()[0]
+
+def verificar_checksums(conn):
+    """Compara los pasos aplicados con los definidos; retorna las versiones alteradas."""
+    definidas = {v: checksum(sql) for v, _, sql in MIGRACIONES}
+    with conn.cursor() as c:
+        c.execute("SELECT version, checksum FROM schema_version ORDER BY version")
+        aplicadas = c.fetchall()
+    return [v for v, suma in aplicadas if v in definidas and definidas[v] != suma]
+
+def migrar(conn):
+    """Aplica en orden los pasos pendientes, cada uno en su propia transacción.
+
+    Retorna la lista de versiones aplicadas.
+    """
+    with conn.cursor() as c:
+        _crear_tabla_versiones(c)
+    conn.commit()
+
+    alteradas = verificar_checksums(conn)
+    if alteradas:
+        raise ErrorMigracion(f"Migraciones ya aplicadas fueron modificadas: {alteradas}")
+
+    aplicadas = []
+    for version, descripcion, sql in MIGRACIONES:
+        with conn.cursor() as c:
+            c.execute("SELECT pg_advisory_xact_lock(%s)", (LLAVE_BLOQUEO,))
+            # Otro proceso pudo aplicarla mientras esperábamos el bloqueo
+            c.execute("SELECT 1 FROM schema_version WHERE version = %s", (version,))
+            if c.fetchone():
+                conn.commit()
+                continue
+            try:
+                c.execute(sql)
+                c.execute("INSERT INTO schema_version (version, descripcion, checksum) VALUES (%s, %s, %s)",
+                          (version, descripcion, checksum(sql)))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise ErrorMigracion(f"Falló la migración {version} ({descripcion}): {e}") from e
+        aplicadas.append(version)
+    return aplicadas
+
+@st.cache_resource
+def asegurar_esquema():
+    """Se ejecuta una vez por proceso: una consulta de versión y, solo si hace falta, las migraciones."""
+    with database.obtener_conexion() as conn:
+        if version_actual(conn) >= version_objetivo():
+            conn.rollback()
+            return []
+        return migrar(conn)
+
+def estado():
+    """Lista de migraciones definidas con su estado en la base."""
+    with database.obtener_conexion() as conn:
+        if version_actual(conn) == 0:
+            aplicadas = {}
+        else:
+            with conn.cursor() as c:
+                c.execute("SELECT version, checksum, aplicada_en FROM schema_version")
+                aplicadas = {v: (suma, fecha) for v, suma, fecha in c.fetchall()}
+    filas = []
+    for version, descripcion, sql in MIGRACIONES:
+        suma, fecha = aplicadas.get(version, (None, None))
+        if suma is None:
+            situacion = "Pendiente"
+        elif suma != checksum(sql):
+            situacion = "Checksum distinto"
+        else:
+            situacion = "Aplicada"
+        filas.append({"version": version, "descripcion": descripcion, "estado": situacion, "aplicada_en": fecha})
+    return filas
+
+if __name__ == "__main__":
+    if "--estado" in sys.argv:
+        for fila in estado():
+            print(f"{fila['version']:>4}  {fila['estado']:<18} {fila['descripcion']}")
+    else:
+        with database.obtener_conexion() as conn:
+            nuevas = migrar(conn)
+        print(f"Migraciones aplicadas: {nuevas}" if nuevas else "El esquema ya está al día.")
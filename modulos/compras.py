@@ -1,84 +1,209 @@
 import streamlit as st
-import pandas as pd
 import database
+import buscador_entidades
+import cache_datos
+import contabilizacion
+import correlativos
+import exportacion
+import impuestos
+import importador_compras
+import lector_archivos
+import libro_compras
+import paginacion
+import pagos
+import periodos
 from datetime import date
-from io import BytesIO
 
 def modulo_compras():
     st.title("💳 Cuentas por Pagar y Libro de Compras")
-    conf = database.obtener_configuracion_empresa()
     
-    tab1, tab2 = st.tabs(["📝 Registro FAC/NC", "📊 Libro de Compras Legal"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📝 Registro FAC/NC", "📊 Libro de Compras Legal", "📥 Carga Masiva",
+                                            "💵 Pagos", "⏳ Antigüedad de Saldos"])
     
     with tab1:
-        conn = database.conectar()
-        prov_df = pd.read_sql("SELECT rif, nombre FROM entidades", conn)
-        sub_df = pd.read_sql("SELECT nombre, cuenta_codigo FROM compra_subtipos", conn)
-        cc_df = pd.read_sql("SELECT id, nombre FROM centros_costo", conn)
-        conn.close()
+        sub_df = cache_datos.subtipos_compra()
+        cc_df = cache_datos.centros_costo()
 
-        if prov_df.empty:
-            st.warning("⚠️ Registre proveedores en el módulo de Entidades.")
+        # El buscador va fuera del form: necesita un rerun al escribir
+        proveedor = buscador_entidades.selector("Proveedor", buscador_entidades.PROVEEDORES, key="prov_cp")
+        if proveedor is None:
+            st.info("Busque el proveedor por RIF o nombre. Si no existe, regístrelo en el módulo de Entidades.")
         else:
+            prov, rif_p = proveedor["nombre"], proveedor["rif"]
+            pct_iva, pct_islr, sustraendo = impuestos.ficha_retencion(rif_p)
             with st.form("registro_cp", clear_on_submit=True):
                 c1, c2 = st.columns(2)
                 tipo = c1.selectbox("Tipo de Documento", ["FAC", "NC"])
                 f_doc = c1.date_input("Fecha Factura/NC", value=date.today())
-                prov = c1.selectbox("Proveedor", prov_df['nombre'].tolist())
-                rif_p = prov_df[prov_df['nombre'] == prov]['rif'].values[0]
+                c1.text_input("Proveedor", value=f"{prov} ({rif_p})", disabled=True)
                 n_doc = c1.text_input("Número de Documento")
                 n_con = c1.text_input("Número de Control")
                 
                 sub = c2.selectbox("Clasificación Gasto", sub_df['nombre'].tolist())
-                cc = c2.selectbox("Centro de Costo", cc_df['nombre'].tolist() if not cc_df.empty else ["No Definido"])
+                # Se elige por id: el nombre del centro no es único
+                nombres_cc = {int(i): f"{cod} - {nom}" for i, cod, nom in zip(cc_df["id"], cc_df["codigo"], cc_df["nombre"])}
+                cc_id = c2.selectbox("Centro de Costo", list(nombres_cc) or [None],
+                                     format_func=lambda i: nombres_cc.get(i, "No Definido"))
                 base = c2.number_input("Base Imponible", min_value=0.0)
                 exento = c2.number_input("Exento", min_value=0.0)
-                iva = round(base * 0.16, 2)
                 
-                # Retenciones
+                # Retenciones: por defecto las de la ficha del proveedor (motor de impuestos)
                 st.divider()
-                r_iva = c2.number_input("Retención IVA", min_value=0.0)
-                r_islr = c2.number_input("Retención ISLR", min_value=0.0)
-                
-                total = round((base + exento + iva) - r_iva - r_islr, 2)
-                saldo = total if tipo == "FAC" else -total
-                st.markdown(f"### Total: {total} Bs.")
+                automaticas = c2.checkbox("Calcular retenciones según la ficha del proveedor", value=True,
+                                          help=f"Retención IVA {pct_iva:g}% | ISLR {pct_islr:g}%" + (" con sustraendo" if sustraendo else ""))
+                r_iva_manual = c2.number_input("Retención IVA (manual)", min_value=0.0)
+                r_islr_manual = c2.number_input("Retención ISLR (manual)", min_value=0.0)
 
                 if st.form_submit_button("📥 Procesar Documento"):
+                    calc = impuestos.calcular_documento(base, exento, pct_iva, pct_islr, sustraendo, f_doc)
+                    iva = calc["iva"]
+                    r_iva, r_islr = (calc["ret_iva"], calc["ret_islr"]) if automaticas else (r_iva_manual, r_islr_manual)
+                    total = round((base + exento + iva) - r_iva - r_islr, 2)
+                    saldo = total if tipo == "FAC" else -total
                     try:
-                        conn = database.conectar()
-                        c = conn.cursor()
-                        # Generar Asiento CP
-                        num_as = database.obtener_ultimo_correlativo("CP")
-                        c.execute("INSERT INTO asientos_cabecera (num_asiento, fecha, concepto, origen, creado_por) VALUES (%s,%s,%s,%s,%s) RETURNING id",
-                                  (num_as, f_doc, f"{tipo} {n_doc} - {prov}", "CP", st.session_state['usuario_autenticado']))
-                        id_as = c.fetchone()[0]
-                        
-                        # Guardar Compra
-                        c.execute("""INSERT INTO compras (fecha, rif_proveedor, num_factura, num_control, tipo_documento, 
-                                     base_imponible, monto_exento, iva_monto, iva_retenido, islr_retenido, total_factura, 
-                                     saldo_pendiente, subtipo, asiento_id, creado_por) 
-                                     VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)""",
-                                  (f_doc, rif_p, n_doc, n_con, tipo, base, exento, iva, r_iva, r_islr, total, saldo, sub, id_as, st.session_state['usuario_autenticado']))
-                        
-                        conn.commit()
-                        st.success(f"Registrado. Asiento: {num_as}")
+                        with database.obtener_conexion() as conn:
+                            c = conn.cursor()
+                            # Generar Asiento CP
+                            num_as = correlativos.siguiente("CP", f_doc.year, conn)
+                            c.execute("INSERT INTO asientos_cabecera (num_asiento, fecha, concepto, origen, creado_por) VALUES (%s,%s,%s,%s,%s) RETURNING id",
+                                      (num_as, f_doc, f"{tipo} {n_doc} - {prov}", "CP", st.session_state['usuario_autenticado']))
+                            id_as = c.fetchone()[0]
+                            
+                            # Guardar Compra
+                            c.execute("""INSERT INTO compras (fecha, rif_proveedor, num_factura, num_control, tipo_documento, 
+                                         base_imponible, monto_exento, iva_monto, iva_retenido, islr_retenido, total_factura, 
+                                         saldo_pendiente, subtipo, asiento_id, creado_por) 
+                                         VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)""",
+                                      (f_doc, rif_p, n_doc, n_con, tipo, base, exento, iva, r_iva, r_islr, total, saldo, sub, id_as, st.session_state['usuario_autenticado']))
+
+                            # Líneas del asiento y saldos por cuenta, en la misma transacción
+                            contabilizacion.registrar(conn, contabilizacion.lineas_documento(
+                                id_as, tipo, sub, base, exento, iva, r_iva, r_islr, total, cc_id))
+                            
+                            conn.commit()
+                        st.success(f"Registrado. Asiento: {num_as} | Total: {total:,.2f} Bs.")
                         st.rerun()
                     except Exception as e: st.error(f"Error: {e}")
-                    finally: conn.close()
 
     with tab2:
         st.subheader("📊 Reporte Fiscal de Compras")
         col_m, col_a = st.columns(2)
         mes, ano = col_m.selectbox("Mes", range(1,13), index=date.today().month-1), col_a.number_input("Año", value=date.today().year)
         
-        query = """
-            SELECT c.fecha, e.rif, e.nombre, c.num_factura, c.num_control, c.tipo_documento, 
-                   c.base_imponible, c.iva_monto, c.iva_retenido, c.total_factura, c.saldo_pendiente
-            FROM compras c JOIN entidades e ON c.rif_proveedor = e.rif
-            WHERE EXTRACT(MONTH FROM c.fecha) = %s AND EXTRACT(YEAR FROM c.fecha) = %s
-        """
-        conn = database.conectar()
-        df = pd.read_sql(query, conn, params=[int(mes), int(ano)])
-        conn.close()
-        st.dataframe(df, use_container_width=True)
+        tot = libro_compras.totales(int(mes), int(ano))
+        k1, k2, k3, k4, k5 = st.columns(5)
+        k1.metric("Documentos", f"{tot['documentos']:,}")
+        k2.metric("Base Imponible", f"{tot['base_imponible']:,.2f}")
+        k3.metric("IVA", f"{tot['iva_monto']:,.2f}")
+        k4.metric("IVA Retenido", f"{tot['iva_retenido']:,.2f}")
+        k5.metric("Total", f"{tot['total_factura']:,.2f}")
+
+        clave = "pag_libro_compras"
+        df, hay_mas = libro_compras.pagina(int(mes), int(ano), despues_de=paginacion.llave_inicio(clave, (int(mes), int(ano))))
+        st.dataframe(df.drop(columns="id"), use_container_width=True, hide_index=True)
+        ultima = (df["fecha"].iloc[-1], int(df["id"].iloc[-1])) if not df.empty else None
+        paginacion.controles(clave, ultima, hay_mas)
+
+        st.markdown("**Exportar Libro Legal (Excel)**")
+        e1, e2 = st.columns(2)
+        periodo = periodos.nombre(int(mes), int(ano))
+        desde = e1.text_input("Desde (AAAA-MM)", value=periodo, key="lc_desde")
+        hasta = e2.text_input("Hasta (AAAA-MM)", value=periodo, key="lc_hasta")
+        if st.button("⬇️ Preparar Libro de Compras"):
+            try:
+                meses = libro_compras.meses_entre(desde, hasta)
+                if not meses:
+                    st.error("El período inicial es posterior al final.")
+                else:
+                    with st.spinner(f"Generando {len(meses)} mes(es)..."):
+                        archivo, documentos = libro_compras.exportar_xlsx(desde, hasta)
+                    st.download_button(f"Descargar Excel ({documentos:,} documentos)", data=exportacion.para_descarga(archivo),
+                                       file_name=f"libro_compras_{desde}_{hasta}.xlsx",
+                                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            except ValueError:
+                st.error("Use el formato AAAA-MM, por ejemplo 2024-01.")
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+    with tab3:
+        st.subheader("📥 Carga Masiva de Facturas y Notas de Crédito")
+        st.caption("Columnas: FECHA, RIF, NUM_FACTURA, BASE (obligatorias); TIPO, NUM_CONTROL, EXENTO, IVA, RET_IVA, RET_ISLR, SUBTIPO (opcionales). "
+                   "Si no viene el IVA se calcula.")
+        archivo = st.file_uploader("Excel o CSV de compras (.xlsx, .csv)", type=["xlsx", "csv"], key="carga_compras")
+        if archivo is not None:
+            try:
+                carga = lector_archivos.ArchivoCarga(archivo, archivo.name, columnas=importador_compras.COLUMNAS_COMPRAS,
+                                                     requeridas=importador_compras.REQUERIDAS)
+                if not carga.valido:
+                    st.error("No se encontró la fila de encabezados (FECHA, RIF, NUM_FACTURA, BASE).")
+                else:
+                    st.dataframe(carga.vista_previa(), use_container_width=True)
+                    politica = st.radio("Si hay filas con errores", [importador_compras.TODO_O_NADA, importador_compras.OMITIR_INVALIDAS],
+                                        format_func=lambda p: "No registrar nada" if p == importador_compras.TODO_O_NADA else "Registrar solo las válidas",
+                                        horizontal=True)
+                    if st.button("🚀 Validar e Importar"):
+                        with st.spinner("Validando e importando..."):
+                            resumen, errores = importador_compras.importar_compras(carga.lotes(), st.session_state['usuario_autenticado'], politica,
+                                                                                   miles_con_punto=carga.es_csv)
+                        if resumen["registradas"]:
+                            database.registrar_log(st.session_state['usuario_autenticado'], "IMPORTAR", "compras", f"Carga masiva de compras: {resumen}")
+                            st.success(f"🎉 {resumen['registradas']} documentos registrados con sus asientos.")
+                        elif resumen["invalidas"]:
+                            st.warning("No se registró ningún documento.")
+                        st.caption(f"Leídas: {resumen['leidas']} | Válidas: {resumen['validas']} | Con errores: {resumen['invalidas']}")
+                        if not errores.empty:
+                            st.dataframe(errores, use_container_width=True, hide_index=True)
+                            st.download_button("Descargar reporte de errores", data=errores.to_csv(index=False).encode("utf-8-sig"),
+                                               file_name="errores_carga_compras.csv", mime="text/csv")
+            except Exception as e: st.error(f"Error: {e}")
+
+    with tab4:
+        st.subheader("💵 Pago a Proveedores")
+        if "ultimo_pago" in st.session_state:
+            st.success(st.session_state.pop("ultimo_pago"))
+        proveedor = buscador_entidades.selector("Proveedor", buscador_entidades.PROVEEDORES, key="prov_pago")
+        if proveedor is None:
+            st.info("Busque el proveedor a pagar por RIF o nombre.")
+        else:
+            abiertas = pagos.documentos_abiertos(proveedor["rif"])
+            por_pagar = abiertas[abiertas["saldo_pendiente"] > 0]
+            if abiertas.empty:
+                st.success("El proveedor no tiene saldos pendientes.")
+            else:
+                st.dataframe(abiertas.drop(columns="id"), use_container_width=True, hide_index=True)
+            with st.form("form_pago", clear_on_submit=True):
+                p1, p2, p3 = st.columns(3)
+                f_pago = p1.date_input("Fecha del Pago", value=date.today())
+                monto = p2.number_input("Monto", min_value=0.0, value=float(por_pagar["saldo_pendiente"].sum()))
+                referencia = p3.text_input("Referencia (transferencia / cheque)")
+                opciones = {f"{r.num_factura} ({r.fecha:%d/%m/%Y}) - {r.saldo_pendiente:,.2f}": r.id for r in por_pagar.itertuples()}
+                elegidas = st.multiselect("Aplicar solo a (vacío: de la más antigua a la más reciente)", list(opciones))
+                if st.form_submit_button("💵 Registrar Pago"):
+                    usuario = st.session_state['usuario_autenticado']
+                    try:
+                        res = pagos.registrar_pago(proveedor["rif"], monto, f_pago, referencia.strip() or None, usuario,
+                                                   [int(opciones[e]) for e in elegidas] or None)
+                        database.registrar_log(usuario, "PAGAR", "pagos",
+                                               f"Pago {res['pago_id']} a {proveedor['rif']}: {res['aplicado']:,.2f} en {res['documentos']} documentos",
+                                               sincrono=True)
+                        mensaje = f"Pago registrado. Asiento: {res['num_asiento']} | Aplicado: {res['aplicado']:,.2f} en {res['documentos']} documento(s)."
+                        if res["sin_aplicar"]:
+                            mensaje += f" Quedan {res['sin_aplicar']:,.2f} como anticipo sin aplicar."
+                        st.session_state["ultimo_pago"] = mensaje
+                        st.rerun()
+                    except ValueError as e:
+                        st.error(str(e))
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+            with st.expander("Pagos anteriores"):
+                st.dataframe(pagos.historial(proveedor["rif"]), use_container_width=True, hide_index=True)
+
+    with tab5:
+        st.subheader("⏳ Antigüedad de Saldos por Proveedor")
+        corte = st.date_input("Fecha de corte", value=date.today(), key="antiguedad_corte")
+        df_ant = pagos.antiguedad(corte)
+        columnas = st.columns(len(pagos.TRAMOS) + 1)
+        for col, tramo in zip(columnas, pagos.TRAMOS):
+            col.metric(f"{tramo} días", f"{df_ant[tramo].sum():,.2f}")
+        columnas[-1].metric("Total", f"{df_ant['total'].sum():,.2f}", help=f"{len(df_ant)} proveedores con saldo")
+        st.dataframe(df_ant, use_container_width=True, hide_index=True)
@@ -1,96 +1,75 @@
 import streamlit as st
-import database
+import buscador_entidades
+import cache_datos
+import configuracion
+import impuestos
 import pandas as pd
 from datetime import date
 import io
-import random
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Table
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
+import paginacion
+import pdf_cotizaciones
+import registro_cotizaciones
 
-# --- FUNCIÓN DE GENERACIÓN PDF (LIMPIA) ---
+# --- FUNCIÓN DE GENERACIÓN PDF ---
 def generar_pdf_cotizacion(info_empresa, cliente_info, items, nro_cotizacion, fecha):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    story = []
-    
-    # Estilos
-    estilos = getSampleStyleSheet()
-    estilo_normal = ParagraphStyle('Normal', fontSize=10)
-    
-    # Encabezado 
-    story.append(Paragraph(f"<b>{info_empresa['nombre_empresa']}</b>", estilo_titulo))
-    story.append(Paragraph(f"RIF: {info_empresa['rif']}", estilo_normal))
-    story.append(Paragraph(f"Telf: {info_empresa['telefono']}", estilo_normal))
-    story.append(Spacer(1, 12))
-    
-    # Datos de Cotización y Cliente
-    story.append(Paragraph(f"<b>Cotización:</b> {nro_cotizacion} | <b>Fecha:</b> {fecha}", estilo_normal))
-    story.append(Paragraph(f"<b>Cliente:</b> {cliente_info['nombre']} | <b>RIF:</b> {cliente_info['rif']}", estilo_normal))
-    story.append(Spacer(1, 12))
-
-    # Tabla de productos
-    tabla_data = [["Cant", "Descripción", "Precio", "Total"]]
-    subtotal = 0
-    for item in items:
-        subtotal += item['total']
-        tabla_data.append([str(item['cantidad']), item['descripcion'], f"${item['precio']:,.2f}", f"${item['total']:,.2f}"])
-    
-    # Totales con IVA
-    iva = subtotal * 0.16
-    tabla_data.append(["", "", "Subtotal:", f"${subtotal:,.2f}"])
-    tabla_data.append(["", "", "IVA 16%:", f"${iva:,.2f}"])
-    tabla_data.append(["", "", "<b>Total:</b>", f"<b>${subtotal + iva:,.2f}</b>"])
-    
-    t = Table(tabla_data, colWidths=[50, 250, 80, 80])
-    # ... (aplicar diseño de tabla aquí) ...
-    story.append(t)
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+    """PDF de una cotización en el proceso actual, con el motor cacheado de la empresa."""
+    motor = pdf_cotizaciones.obtener_motor(info_empresa)
+    pdf = motor.generar({"numero": nro_cotizacion, "fecha": fecha, "cliente": cliente_info, "items": items,
+                         "tasa_iva": impuestos.parametros(fecha).tasa_iva})
+    return io.BytesIO(pdf)
 
 # --- MÓDULO COMERCIAL ---
 def modulo_crear_cotizaciones():
     st.title("📝 Crear Nueva Cotización")
-    tab1, tab2 = st.tabs(["📄 Nueva Cotización", "📦 Catálogo de Artículos"])
+    tab1, tab2, tab3 = st.tabs(["📄 Nueva Cotización", "📦 Catálogo de Artículos", "🔎 Historial"])
 
-    conn = database.conectar()
-    try:
-        clientes_df = pd.read_sql("SELECT nombre FROM entidades", conn)
-        articulos_df = pd.read_sql("SELECT descripcion, precio_sugerido FROM articulos", conn)
-    finally:
-        conn.close()
+    articulos_df = cache_datos.articulos()
 
     with tab1:
         # Selección de cliente
-        cliente_sel = st.selectbox("Seleccionar Cliente:", options=clientes_df['nombre'].tolist())
-        
-        # Selección de productos (fuera de un form para que la descarga sea estable)
-        filas_items = []
-        for i in range(3):
-            col1, col2, col3 = st.columns(3)
-            art = col1.selectbox(f"Art {i+1}", ["--"] + articulos_df['descripcion'].tolist(), key=f"art_{i}")
-            cant = col2.number_input(f"Cant {i+1}", min_value=0, key=f"c_{i}")
-            prec = col3.number_input(f"Precio {i+1}", min_value=0.0, key=f"p_{i}")
-            if art != "--" and cant > 0:
-                filas_items.append({"descripcion": art, "cantidad": cant, "precio": prec, "total": cant * prec})
+        cliente_info = buscador_entidades.selector("Cliente", buscador_entidades.CLIENTES, key="cliente_cot")
+
+        # Líneas de la cotización: tantas como hagan falta (fuera de un form para que la descarga sea estable)
+        lineas = st.data_editor(
+            pd.DataFrame({"descripcion": pd.Series(dtype="str"), "cantidad": pd.Series(dtype="float"), "precio": pd.Series(dtype="float")}),
+            num_rows="dynamic", use_container_width=True, key="lineas_cotizacion",
+            column_config={
+                "descripcion": st.column_config.SelectboxColumn("Artículo", options=articulos_df['descripcion'].tolist(), required=True),
+                "cantidad": st.column_config.NumberColumn("Cantidad", min_value=0),
+                "precio": st.column_config.NumberColumn("Precio", min_value=0.0, format="%.2f"),
+            })
+        lineas = lineas.dropna(subset=["descripcion"])
+        lineas = lineas[lineas["cantidad"].fillna(0) > 0]
+        # Una celda de precio vacía llega como NaN: se toma el precio sugerido del artículo
+        precios = dict(zip(articulos_df["descripcion"], articulos_df["precio_sugerido"]))
+        sugeridos = pd.to_numeric(lineas["descripcion"].map(precios), errors="coerce")
+        lineas = lineas.assign(precio=lineas["precio"].fillna(sugeridos))
+        sin_precio = lineas.loc[lineas["precio"].isna(), "descripcion"].tolist()
+        filas_items = [{"descripcion": f.descripcion, "cantidad": f.cantidad, "precio": float(f.precio),
+                        "total": round(f.cantidad * f.precio, 2)} for f in lineas.dropna(subset=["precio"]).itertuples()]
 
         # Botón de acción directa
-        if st.button("📥 Generar y Descargar PDF"):
-            if not filas_items:
+        if st.button("📥 Guardar y Descargar PDF"):
+            if cliente_info is None:
+                st.error("Selecciona un cliente.")
+            elif sin_precio:
+                st.error(f"Indica el precio de: {', '.join(sin_precio)}.")
+            elif not filas_items:
                 st.error("Debes agregar al menos un artículo.")
             else:
-                nro = f"CAD-{random.randint(1000, 9999)}"
-                pdf_generado = generar_pdf_cotizacion({"nombre_empresa": "MAQUINARIAS ADONAI"}, cliente_sel, filas_items, nro, date.today())
-                
-                st.success(f"¡Cotización {nro} generada con éxito!")
-                st.download_button(
-                    label="Haga clic aquí para descargar el archivo",
-                    data=pdf_generado,
-                    file_name=f"Cotizacion_{nro}.pdf",
-                    mime="application/pdf"
-                )
+                try:
+                    nro = registro_cotizaciones.guardar(cliente_info['rif'], filas_items, st.session_state['usuario_autenticado'])
+                except Exception as e:
+                    st.error(f"Error: {e}")
+                else:
+                    pdf_generado = generar_pdf_cotizacion(configuracion.obtener().como_dict(), cliente_info, filas_items, nro, date.today())
+                    st.success(f"¡Cotización {nro} guardada con éxito!")
+                    st.download_button(
+                        label="Haga clic aquí para descargar el archivo",
+                        data=pdf_generado,
+                        file_name=pdf_cotizaciones.nombre_archivo(nro),
+                        mime="application/pdf"
+                    )
 
     with tab2:
         # Tu formulario de registro se mantiene igual, este sí funciona bien con st.form
@@ -98,3 +77,39 @@ def modulo_crear_cotizaciones():
             # ... (código de tu formulario de catálogo) ...
             st.write("Catálogo de artículos") # Placeholder
             st.form_submit_button("💾 Guardar")
+
+    with tab3:
+        f1, f2, f3, f4 = st.columns(4)
+        cliente_f = buscador_entidades.selector("Cliente", buscador_entidades.CLIENTES, key="hist_cliente", contenedor=f1)
+        desde = f2.date_input("Desde", value=None, key="hist_desde")
+        hasta = f3.date_input("Hasta", value=None, key="hist_hasta")
+        numero = f4.text_input("Número", key="hist_numero").strip().upper()
+        rif_f = cliente_f["rif"] if cliente_f else None
+        filtros = {"rif_cliente": rif_f, "desde": desde, "hasta": hasta, "numero": numero}
+
+        clave = "pag_cotizaciones"
+        df_q, hay_mas = registro_cotizaciones.buscar(**filtros, despues_de=paginacion.llave_inicio(clave, tuple(filtros.values())))
+        st.dataframe(df_q.drop(columns="id"), use_container_width=True, hide_index=True)
+        ultima = (df_q["fecha"].iloc[-1], int(df_q["id"].iloc[-1])) if not df_q.empty else None
+        paginacion.controles(clave, ultima, hay_mas)
+
+        st.divider()
+        r1, r2 = st.columns(2)
+        nro_sel = r1.selectbox("Regenerar PDF de", df_q["numero"].tolist(), key="hist_regenerar")
+        if nro_sel and r1.button("📄 Regenerar PDF"):
+            guardada = registro_cotizaciones.obtener(nro_sel)
+            r1.download_button("Descargar", data=pdf_cotizaciones.obtener_motor(configuracion.obtener().como_dict()).generar(guardada),
+                               file_name=pdf_cotizaciones.nombre_archivo(nro_sel), mime="application/pdf")
+
+        m1, m2 = r2.columns(2)
+        mes = m1.selectbox("Mes", range(1, 13), index=date.today().month - 1, key="hist_mes")
+        ano = m2.number_input("Año", value=date.today().year, step=1, key="hist_ano")
+        if r2.button("🗜️ Reemitir mes completo (ZIP)"):
+            del_mes = registro_cotizaciones.del_mes(int(mes), int(ano))
+            if not del_mes:
+                r2.info("No hay cotizaciones en ese mes.")
+            else:
+                with st.spinner(f"Generando {len(del_mes)} cotizaciones..."):
+                    zip_mes, paginas = pdf_cotizaciones.generar_lote(configuracion.obtener().como_dict(), del_mes)
+                r2.download_button(f"Descargar ZIP ({len(del_mes)} cotizaciones, {paginas} páginas)", data=zip_mes,
+                                   file_name=f"Cotizaciones_{int(ano)}_{int(mes):02d}.zip", mime="application/zip")
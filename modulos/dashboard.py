@@ -0,0 +1,48 @@
+import streamlit as st
+import plotly.express as px
+import indicadores
+
+def _monto(valor):
+    return f"{valor:,.2f}"
+
+def modulo_dashboard():
+    st.title("📈 Dashboard Finanzas")
+    st.write(f"Bienvenido al sistema, **{st.session_state['usuario_autenticado'].upper()}**")
+
+    meses = st.select_slider("Meses a mostrar", options=[3, 6, 12, 24, 36], value=12)
+    desde, hasta = indicadores.rango_meses(meses)
+    df_mes = indicadores.mensual(desde, hasta)
+    df_pagar = indicadores.por_pagar()
+
+    actual = df_mes[df_mes["periodo"] == hasta]
+    fila = actual.iloc[0] if not actual.empty else None
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric(f"Compras {hasta}", _monto(fila["compras"] if fila is not None else 0))
+    k2.metric("IVA Crédito Fiscal", _monto(fila["iva_credito"] if fila is not None else 0))
+    k3.metric("Retenciones IVA + ISLR", _monto(fila["ret_iva"] + fila["ret_islr"] if fila is not None else 0))
+    k4.metric("Cuentas por Pagar", _monto(df_pagar["saldo"].sum()), help=f"{len(df_pagar)} proveedores con saldo")
+
+    if df_mes.empty:
+        st.info(f"No hay compras registradas entre {desde} y {hasta}.")
+        return
+
+    c1, c2 = st.columns(2)
+    fig = px.bar(df_mes, x="periodo", y=["compras", "iva_credito"], barmode="group", title="Compras e IVA crédito por mes",
+                 labels={"value": "Monto", "periodo": "Período", "variable": ""})
+    c1.plotly_chart(fig, use_container_width=True)
+    fig = px.bar(df_mes, x="periodo", y=["ret_iva", "ret_islr"], title="Retenciones por mes",
+                 labels={"value": "Monto", "periodo": "Período", "variable": ""})
+    c2.plotly_chart(fig, use_container_width=True)
+
+    c3, c4 = st.columns(2)
+    df_top = indicadores.top_proveedores(desde, hasta)
+    fig = px.bar(df_top.iloc[::-1], x="compras", y="nombre", orientation="h", title="Principales proveedores",
+                 labels={"compras": "Compras", "nombre": ""}, hover_data=["rif", "documentos"])
+    c3.plotly_chart(fig, use_container_width=True)
+    df_cc = indicadores.gasto_centros(desde, hasta)
+    fig = px.bar(df_cc, x="periodo", y="gasto", color="centro", title="Gasto por centro de costo",
+                 labels={"gasto": "Gasto", "periodo": "Período", "centro": "Centro"})
+    c4.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("Cuentas por pagar por proveedor")
+    st.dataframe(df_pagar.head(20), use_container_width=True, hide_index=True)
@@ -1,7 +1,10 @@
 import streamlit as st
-import pandas as pd
 import re
 import database
+import cache_datos
+import exportacion
+import listado_entidades
+import paginacion
 
 def modulo_maestro_entidades():
     st.title("👥 Gestión de Clientes y Proveedores")
@@ -33,18 +36,18 @@ def modulo_maestro_entidades():
                     st.error("❌ Nombre muy corto.")
                 else:
                     try:
-                        conn = database.conectar()
-                        c = conn.cursor()
-                        c.execute("SELECT rif FROM entidades WHERE rif = %s", (rif_limpio,))
-                        if c.fetchone():
-                            st.warning(f"⚠️ El RIF {rif_limpio} ya existe.")
-                        else:
-                            query = "INSERT INTO entidades (rif, nombre, direccion, tipo_persona, tipo_contribuyente, categoria, retencion_islr_pct, retencion_iva_pct) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
-                            c.execute(query, (rif_limpio, nombre, direccion, tipo_persona, tipo_c, categoria, islr_pct, iva_pct))
-                            conn.commit()
-                            st.success("✅ Guardado.")
-                        c.close()
-                        conn.close()
+                        with database.obtener_conexion() as conn:
+                            c = conn.cursor()
+                            c.execute("SELECT rif FROM entidades WHERE rif = %s", (rif_limpio,))
+                            if c.fetchone():
+                                st.warning(f"⚠️ El RIF {rif_limpio} ya existe.")
+                            else:
+                                query = "INSERT INTO entidades (rif, nombre, direccion, tipo_persona, tipo_contribuyente, categoria, retencion_islr_pct, retencion_iva_pct) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+                                c.execute(query, (rif_limpio, nombre, direccion, tipo_persona, tipo_c, categoria, islr_pct, iva_pct))
+                                conn.commit()
+                                cache_datos.invalidar("entidades")
+                                st.success("✅ Guardado.")
+                            c.close()
                     except Exception as e:
                         st.error(f"Error: {e}")
 
@@ -53,13 +56,41 @@ def modulo_maestro_entidades():
 
 def ver_listado_completo():
     st.subheader("🗂️ Base de Datos")
+    f1, f2, f3, f4 = st.columns([1, 1, 2, 1])
+    categoria = f1.selectbox("Categoría", ["Todas", "PROVEEDOR", "CLIENTE", "AMBOS"])
+    tipo_c = f2.selectbox("Contribuyente", ["Todos", "Especial", "Ordinario", "Exento", "Formal"])
+    texto = f3.text_input("Buscar por RIF o nombre").strip()
+    orden = f4.selectbox("Ordenar por", list(listado_entidades.ORDENES))
+    descendente = f4.checkbox("Descendente")
+    filtros = {"categoria": None if categoria == "Todas" else categoria,
+               "tipo_contribuyente": None if tipo_c == "Todos" else tipo_c,
+               "texto": texto, "orden": orden, "descendente": descendente}
+
     try:
-        conn = database.conectar()
-        df = pd.read_sql_query("SELECT * FROM entidades", conn)
-        conn.close()
+        total, exacto = listado_entidades.contar(filtros["categoria"], filtros["tipo_contribuyente"], texto)
+        if exacto:
+            st.caption(f"{total:,} registros")
+        elif texto or filtros["categoria"] or filtros["tipo_contribuyente"]:
+            st.caption(f"Más de {total:,} registros")
+        else:
+            st.caption(f"~{total:,} registros")
+
+        clave = "pag_entidades"
+        df, hay_mas = listado_entidades.pagina(**filtros, despues_de=paginacion.llave_inicio(clave, tuple(filtros.values())))
         if not df.empty:
             st.dataframe(df, use_container_width=True, hide_index=True)
         else:
             st.info("Sin datos.")
+        paginacion.controles(clave, listado_entidades.llave(df, orden), hay_mas)
+
+        e1, e2 = st.columns(2)
+        sql, params = listado_entidades.consulta_exportacion(**filtros)
+        if e1.button("⬇️ Preparar CSV"):
+            e1.download_button("Descargar CSV", data=exportacion.para_descarga(exportacion.a_csv(sql, params)),
+                               file_name="entidades.csv", mime="text/csv")
+        if e2.button("⬇️ Preparar Excel"):
+            archivo, filas = exportacion.a_xlsx(sql, params, hoja="Entidades")
+            e2.download_button(f"Descargar Excel ({filas:,} filas)", data=exportacion.para_descarga(archivo),
+                               file_name="entidades.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
     except Exception as e:
         st.error(f"Error: {e}")
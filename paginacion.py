@@ -0,0 +1,32 @@
+# paginacion.py
+"""Paginación por llave (keyset) para las tablas largas de la interfaz.
+
+En lugar de OFFSET, cada página se pide "después de" la última llave vista,
+así el costo no crece con el número de página. La pila de llaves de inicio
+vive en `st.session_state` para poder volver atrás.
+"""
+import streamlit as st
+
+def llave_inicio(clave, filtros):
+    """Llave desde la cual pedir la página actual (None = primera página).
+
+    Si cambian los filtros la navegación vuelve a la primera página.
+    """
+    estado = st.session_state.get(clave)
+    if estado is None or estado["filtros"] != filtros:
+        estado = {"filtros": filtros, "pila": [None]}
+        st.session_state[clave] = estado
+    return estado["pila"][-1]
+
+def controles(clave, ultima_llave, hay_mas):
+    """Botones Anterior/Siguiente. `ultima_llave` es la llave de la última fila mostrada."""
+    estado = st.session_state[clave]
+    pagina = len(estado["pila"])
+    c1, c2, c3 = st.columns([1, 2, 1])
+    if c1.button("◀ Anterior", key=f"{clave}_ant", disabled=pagina == 1):
+        estado["pila"].pop()
+        st.rerun()
+    c2.markdown(f"<div style='text-align: center;'>Página {pagina}</div>", unsafe_allow_html=True)
+    if c3.button("Siguiente ▶", key=f"{clave}_sig", disabled=not hay_mas):
+        estado["pila"].append(ultima_llave)
+        st.rerun()
@@ -0,0 +1,168 @@
+# pagos.py
+"""Pagos a proveedores y antigüedad de saldos.
+
+Un pago se aplica a muchas facturas en una sola transacción. Los documentos con
+saldo del proveedor se toman por bloques, del más antiguo al más nuevo, con
+`FOR UPDATE SKIP LOCKED`: dos usuarios pagando al mismo proveedor nunca se
+esperan ni se bloquean en ciclo, cada uno aplica a facturas distintas y lo que
+otro tiene tomado se salta. Un pago a facturas elegidas a mano, en cambio, usa
+`FOR UPDATE NOWAIT`: si alguna está tomada se aborta en vez de aplicar a medias
+lo seleccionado. Todo lo que lee saldos filtra `saldo_pendiente <> 0` para usar
+el índice parcial `idx_compras_abiertas`, que solo contiene los documentos
+abiertos; por eso sigue siendo pequeño aunque el histórico pagado crezca.
+
+Las NC (saldo negativo) no se aplican automáticamente: restan en la antigüedad.
+"""
+from datetime import date
+from decimal import Decimal
+import psycopg2.errors
+import psycopg2.extras
+import contabilizacion
+import correlativos
+import database
+import periodos
+
+BLOQUE = 50
+CENTAVO = Decimal("0.01")
+
+SQL_TOMAR_ABIERTAS = """
+    SELECT id, fecha, saldo_pendiente FROM compras
+    WHERE rif_proveedor = %(rif)s AND saldo_pendiente <> 0 AND saldo_pendiente > 0
+      AND (fecha, id) > (%(fecha)s, %(id)s) {seleccion}
+    ORDER BY fecha, id
+    LIMIT %(bloque)s
+    FOR UPDATE {bloqueo}
+"""
+
+SQL_APLICAR = """
+    UPDATE compras c SET saldo_pendiente = c.saldo_pendiente - a.monto
+    FROM pago_aplicaciones a
+    WHERE a.pago_id = %s AND c.id = a.compra_id
+"""
+
+SQL_ABIERTAS = """
+    SELECT id, fecha, tipo_documento, num_factura, num_control, total_factura, saldo_pendiente,
+           %(corte)s - fecha AS dias
+    FROM compras
+    WHERE rif_proveedor = %(rif)s AND saldo_pendiente <> 0
+    ORDER BY fecha, id
+"""
+
+# Saldo al corte = saldo de hoy + lo abonado por pagos posteriores al corte. Los documentos
+# que esos pagos dejaron en cero no están en el índice parcial y entran por la segunda rama.
+SQL_ANTIGUEDAD = """
+    WITH posteriores AS (
+        SELECT a.compra_id, SUM(a.monto) AS monto
+        FROM pago_aplicaciones a JOIN pagos p ON p.id = a.pago_id
+        WHERE p.fecha > %(corte)s
+        GROUP BY a.compra_id
+    ), documentos AS (
+        SELECT id, rif_proveedor, fecha, saldo_pendiente FROM compras
+        WHERE saldo_pendiente <> 0 AND (fecha <= %(corte)s OR fecha IS NULL) {filtro}
+        UNION ALL
+        SELECT c.id, c.rif_proveedor, c.fecha, c.saldo_pendiente FROM compras c JOIN posteriores p ON p.compra_id = c.id
+        WHERE c.saldo_pendiente = 0 AND c.fecha <= %(corte)s {filtro}
+    )
+    SELECT a.rif_proveedor AS rif, COALESCE(e.nombre, a.rif_proveedor) AS nombre,
+           COALESCE(SUM(a.saldo_pendiente) FILTER (WHERE a.dias <= 30), 0) AS "0-30",
+           COALESCE(SUM(a.saldo_pendiente) FILTER (WHERE a.dias BETWEEN 31 AND 60), 0) AS "31-60",
+           COALESCE(SUM(a.saldo_pendiente) FILTER (WHERE a.dias BETWEEN 61 AND 90), 0) AS "61-90",
+           COALESCE(SUM(a.saldo_pendiente) FILTER (WHERE a.dias > 90), 0) AS "90+",
+           SUM(a.saldo_pendiente) AS total, COUNT(*) AS documentos
+    FROM (SELECT d.rif_proveedor, d.saldo_pendiente + COALESCE(p.monto, 0) AS saldo_pendiente,
+                 COALESCE(%(corte)s - d.fecha, 0) AS dias
+          FROM documentos d LEFT JOIN posteriores p ON p.compra_id = d.id) a
+    LEFT JOIN entidades e ON e.rif = a.rif_proveedor
+    GROUP BY 1, 2
+    ORDER BY total DESC
+"""
+
+SQL_HISTORIAL = """
+    SELECT p.id, p.fecha, p.monto, p.monto_aplicado, p.referencia, a.num_asiento, p.creado_por
+    FROM pagos p LEFT JOIN asientos_cabecera a ON a.id = p.asiento_id
+    WHERE p.rif_proveedor = %(rif)s
+    ORDER BY p.fecha DESC, p.id DESC
+    LIMIT %(limite)s
+"""
+
+TRAMOS = ("0-30", "31-60", "61-90", "90+")
+
+def _tomar_documentos(c, rif, monto, compras_ids=None):
+    """Bloquea y reparte `monto` entre los documentos abiertos. Retorna [(compra_id, abono)] y lo no aplicado."""
+    # Las facturas elegidas no se saltan: si otro pago las tiene tomadas, se aborta
+    seleccion, bloqueo = ("AND id = ANY(%(ids)s)", "NOWAIT") if compras_ids else ("", "SKIP LOCKED")
+    sql = SQL_TOMAR_ABIERTAS.format(seleccion=seleccion, bloqueo=bloqueo)
+    params = {"rif": rif, "fecha": date.min, "id": 0, "bloque": BLOQUE, "ids": list(compras_ids or [])}
+    restante, aplicaciones = monto, []
+    while restante > 0:
+        try:
+            c.execute(sql, params)
+        except psycopg2.errors.LockNotAvailable:
+            raise ValueError("Otro usuario está aplicando un pago a las facturas seleccionadas; intente de nuevo.") from None
+        filas = c.fetchall()
+        for compra_id, _, saldo in filas:
+            abono = min(saldo, restante)
+            aplicaciones.append((compra_id, abono))
+            restante -= abono
+            if restante == 0:
+                break
+        if len(filas) < BLOQUE:
+            break
+        params["fecha"], params["id"] = filas[-1][1], filas[-1][0]
+    return aplicaciones, restante
+
+def registrar_pago(rif, monto, fecha, referencia, usuario, compras_ids=None):
+    """Registra un pago y lo aplica a los documentos abiertos del proveedor (o solo a `compras_ids`).
+
+    Genera el asiento (Debe proveedores / Haber bancos) por el monto completo; lo que no
+    alcanza a aplicarse queda como anticipo en `pagos.monto - monto_aplicado`.
+    Retorna un resumen con pago_id, num_asiento, aplicado, sin_aplicar y documentos.
+    """
+    monto = Decimal(str(monto)).quantize(CENTAVO)
+    if monto <= 0:
+        raise ValueError("El monto del pago debe ser mayor que cero.")
+    if periodos.esta_cerrado(periodos.nombre(fecha.month, fecha.year)):
+        raise ValueError(f"El período {periodos.nombre(fecha.month, fecha.year)} está cerrado.")
+
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            aplicaciones, restante = _tomar_documentos(c, rif, monto, compras_ids)
+            aplicado = monto - restante
+
+            num_asiento = correlativos.siguiente("CP", fecha.year, conn)
+            c.execute("""INSERT INTO asientos_cabecera (num_asiento, fecha, concepto, origen, creado_por)
+                         VALUES (%s, %s, %s, 'CP', %s) RETURNING id""",
+                      (num_asiento, fecha, f"PAGO {referencia} - {rif}" if referencia else f"PAGO - {rif}", usuario))
+            asiento_id = c.fetchone()[0]
+            c.execute("""INSERT INTO pagos (fecha, rif_proveedor, monto, monto_aplicado, referencia, asiento_id, creado_por)
+                         VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id""",
+                      (fecha, rif, monto, aplicado, referencia, asiento_id, usuario))
+            pago_id = c.fetchone()[0]
+            if aplicaciones:
+                psycopg2.extras.execute_values(
+                    c, "INSERT INTO pago_aplicaciones (pago_id, compra_id, monto) VALUES %s",
+                    [(pago_id, compra_id, abono) for compra_id, abono in aplicaciones], page_size=len(aplicaciones))
+                c.execute(SQL_APLICAR, (pago_id,))
+        contabilizacion.registrar(conn, contabilizacion.lineas_pago(asiento_id, monto))
+        conn.commit()
+    return {"pago_id": pago_id, "num_asiento": num_asiento, "aplicado": float(aplicado),
+            "sin_aplicar": float(restante), "documentos": len(aplicaciones)}
+
+def documentos_abiertos(rif, corte=None):
+    """Documentos con saldo del proveedor, del más antiguo al más nuevo, con sus días de antigüedad."""
+    return database.consultar_df(SQL_ABIERTAS, {"rif": rif, "corte": corte or date.today()})
+
+def antiguedad(corte=None, rif=None):
+    """Saldos por proveedor a la fecha de `corte`, en tramos 0-30 / 31-60 / 61-90 / 90+ días desde la fecha del documento.
+
+    Solo entran documentos emitidos hasta el corte, y los pagos posteriores no descuentan.
+    """
+    params = {"corte": corte or date.today()}
+    filtro = ""
+    if rif:
+        filtro = "AND rif_proveedor = %(rif)s"
+        params["rif"] = rif
+    return database.consultar_df(SQL_ANTIGUEDAD.format(filtro=filtro), params)
+
+def historial(rif, limite=50):
+    return database.consultar_df(SQL_HISTORIAL, {"rif": rif, "limite": limite})
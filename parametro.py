@@ -1,20 +1,57 @@
 # parametro.py
 import streamlit as st
 import database
+import cache_datos
+import configuracion
+import importador
+import impuestos
+import lector_archivos
+import migraciones
 import pandas as pd
+from datetime import date
+
+def cargador_maestro(categoria, plural, key):
+    """Carga común de clientes y proveedores: detección de cabecera, vista previa e importación masiva."""
+    archivo = st.file_uploader(f"Selecciona el Excel o CSV de {plural} (.xlsx, .csv)", type=["xlsx", "csv"], key=key)
+    if archivo is None:
+        return
+    try:
+        carga = lector_archivos.ArchivoCarga(archivo, archivo.name)
+        if not carga.valido:
+            st.error("No se encontró la fila con los encabezados 'RIF' y 'NOMBRE'.")
+            return
+
+        st.dataframe(carga.vista_previa(), use_container_width=True)
+
+        if st.button(f"🚀 Confirmar e Importar {plural}", key=f"btn_{key}"):
+            barra = st.progress(0.0, text="Preparando importación...")
+            def avance(procesadas, total):
+                if total:
+                    barra.progress(min(procesadas / total, 1.0), text=f"{procesadas:,} de ~{total:,} filas procesadas")
+                else:
+                    barra.progress(0.5, text=f"{procesadas:,} filas procesadas")
+
+            resumen = importador.importar_entidades(carga.lotes(), categoria, progreso=avance, total=carga.total_estimado)
+            cache_datos.invalidar("entidades")
+            barra.progress(1.0, text=f"{resumen['leidas']:,} filas procesadas")
+            database.registrar_log(st.session_state.get('usuario_autenticado', 'admin'), "IMPORTAR", "entidades",
+                                   f"Carga masiva {categoria}: {resumen}")
+            st.success(f"🎉 ¡Éxito! {resumen['insertadas']} nuevos y {resumen['actualizadas']} {plural.lower()} actualizados en Neon.")
+            st.caption(f"Filas leídas: {resumen['leidas']} | Rechazadas (RIF o nombre inválido): {resumen['rechazadas']} | Duplicadas en el archivo: {resumen['duplicadas']}")
+    except Exception as e: st.error(f"Error: {e}")
 
 def modulo_configuracion_sistema():
     st.title("⚙️ Configuración Global del Sistema")
-    conf = database.obtener_configuracion_empresa()
+    conf = configuracion.obtener()
     
     with st.form("form_config_global"):
         st.subheader("Datos del Agente de Retención (Tu Empresa)")
         col1, col2 = st.columns(2)
-        n = col1.text_input("Razón Social / Nombre Legal", value=conf.get('nombre_empresa', 'ADONAI GROUP'))
-        r = col2.text_input("RIF de la Empresa", value=conf.get('rif_empresa', ''))
-        d = st.text_area("Dirección Fiscal", value=conf.get('direccion_empresa', ''))
+        n = col1.text_input("Razón Social / Nombre Legal", value=conf.nombre_empresa)
+        r = col2.text_input("RIF de la Empresa", value=conf.rif_empresa)
+        d = st.text_area("Dirección Fiscal", value=conf.direccion_empresa)
         
-        contribuyente_actual = conf.get('tipo_contribuyente', 'Ordinario')
+        contribuyente_actual = conf.tipo_contribuyente
         opciones_contribuyente = ["Especial", "Ordinario", "Formal"]
         try: posicion_index = opciones_contribuyente.index(contribuyente_actual)
         except ValueError: posicion_index = 1
@@ -24,17 +61,35 @@ def modulo_configuracion_sistema():
         st.divider()
         st.subheader("Parámetros Fiscales de Control")
         col3, col4 = st.columns(2)
-        nueva_ut = col3.number_input("Valor Unidad Tributaria (Bs.)", value=float(conf.get('ut_valor', 0.00)), format="%.2f")
-        factor = col4.number_input("Factor Sustraendo (Estándar 83.3334)", value=float(conf.get('factor_sustraendo', 83.3334)), format="%.4f")
+        vigentes = impuestos.parametros()
+        nueva_ut = col3.number_input("Valor Unidad Tributaria (Bs.)", value=float(vigentes.ut_valor), format="%.2f")
+        factor = col4.number_input("Factor Sustraendo (Estándar 83.3334)", value=float(vigentes.factor_sustraendo), format="%.4f")
+        tasa_iva = col3.number_input("Alícuota General de IVA (%)", value=float(vigentes.tasa_iva * 100), format="%.2f")
+        vigencia = col4.date_input("Vigentes desde", value=date.today(), help="Los documentos anteriores a esta fecha conservan los parámetros previos.")
         
         if st.form_submit_button("Actualizar Todo el Sistema"):
-            database.ejecutar_transaccion(
-                """UPDATE configuracion SET 
-                   nombre_empresa=%s, rif_empresa=%s, direccion_empresa=%s, 
-                   tipo_contribuyente=%s, ut_valor=%s, factor_sustraendo=%s 
-                   WHERE id=1""",
-                (n, r, d, t, nueva_ut, factor)
-            )
+            # Empresa y parámetros fiscales en una sola transacción; UT y factor viven solo en parametros_fiscales.
+            # Una nueva vigencia solo se registra si cambió alguno de los valores fiscales.
+            fiscales_cambiaron = (round(nueva_ut, 2), round(factor, 4), round(tasa_iva / 100, 4)) != (
+                round(vigentes.ut_valor, 2), round(vigentes.factor_sustraendo, 4), round(vigentes.tasa_iva, 4))
+            try:
+                with database.obtener_conexion() as conn:
+                    with conn.cursor() as c:
+                        c.execute("""UPDATE configuracion SET
+                                     nombre_empresa=%s, rif_empresa=%s, direccion_empresa=%s, tipo_contribuyente=%s
+                                     WHERE id=1""", (n, r, d, t))
+                        if fiscales_cambiaron:
+                            c.execute("""INSERT INTO parametros_fiscales (vigente_desde, tasa_iva, ut_valor, factor_sustraendo) VALUES (%s, %s, %s, %s)
+                                         ON CONFLICT (vigente_desde) DO UPDATE SET tasa_iva = EXCLUDED.tasa_iva, ut_valor = EXCLUDED.ut_valor,
+                                         factor_sustraendo = EXCLUDED.factor_sustraendo""",
+                                      (vigencia, tasa_iva / 100, nueva_ut, factor))
+                    conn.commit()
+            except Exception as e:
+                st.error(f"Error en transacción: {e}")
+                st.stop()
+            configuracion.invalidar()
+            if fiscales_cambiaron:
+                cache_datos.invalidar("parametros_fiscales")
             database.registrar_log(st.session_state.get('usuario_autenticado', 'admin'), "EDITAR", "configuracion", "Actualizó datos de empresa")
             st.success("✅ Configuración corporativa sincronizada.")
             st.rerun()
@@ -43,96 +98,71 @@ def modulo_configuracion_sistema():
     st.subheader("📥 Inicialización y Mantenimiento de Datos Maestros")
     
     # --- SUBSISTEMA DE CARGA MASIVA DE CLIENTES ---
-    with st.expander("👥 Cargar Listado Maestro de Clientes (Excel)"):
+    with st.expander("👥 Cargar Listado Maestro de Clientes (Excel/CSV)"):
         st.markdown("Sube tu archivo de clientes. El escáner buscará las columnas `RIF`, `NOMBRE` y `DIRECCION` automáticamente.")
-        archivo_clientes = st.file_uploader("Selecciona el Excel de Clientes (.xlsx)", type=["xlsx"], key="cfg_clientes")
-        
-        if archivo_clientes is not None:
-            try:
-                df_crudo = pd.read_excel(archivo_clientes, header=None)
-                fila_cabecera = None
-                for idx, fila in df_crudo.iterrows():
-                    valores_fila = fila.astype(str).str.strip().str.upper().tolist()
-                    if 'RIF' in valores_fila and 'NOMBRE' in valores_fila:
-                        fila_cabecera = idx
-                        break
-                
-                if fila_cabecera is not None:
-                    df = pd.read_excel(archivo_clientes, header=fila_cabecera)
-                    df.columns = df.columns.str.strip().str.upper()
-                    st.dataframe(df.head(3), use_container_width=True)
-                    
-                    if st.button("🚀 Confirmar e Importar Clientes", key="btn_cfg_clientes"):
-                        conn = database.conectar()
-                        cursor = conn.cursor()
-                        contador = 0
-                        for index, fila in df.iterrows():
-                            if pd.isna(fila['RIF']) or pd.isna(fila['NOMBRE']) or str(fila['RIF']).strip().upper() == 'RIF':
-                                continue
-                            rif = str(fila['RIF']).strip()
-                            nombre = str(fila['NOMBRE']).strip()
-                            direccion = str(fila['DIRECCION']).strip() if 'DIRECCION' in df.columns and not pd.isna(fila['DIRECCION']) else "Dirección no especificada"
-                            
-                            cursor.execute("""
-                                INSERT INTO entidades (rif, nombre, direccion, tipo_persona, tipo_contribuyente, categoria) 
-                                VALUES (%s, %s, %s, 'Jurídica Domiciliada', 'Ordinario', 'CLIENTE')
-                                ON CONFLICT (rif) DO UPDATE SET nombre = EXCLUDED.nombre, direccion = EXCLUDED.direccion
-                            """, (rif, nombre, direccion))
-                            contador += 1
-                        conn.commit()
-                        cursor.close()
-                        conn.close()
-                        st.success(f"🎉 ¡Éxito! {contador} clientes migrados a Neon.")
-                        st.rerun()
-                else:
-                    st.error("No se encontró la fila con los encabezados 'RIF' y 'NOMBRE'.")
-            except Exception as e: st.error(f"Error: {e}")
+        cargador_maestro("CLIENTE", "Clientes", "cfg_clientes")
 
     # --- SUBSISTEMA DE CARGA MASIVA DE PROVEEDORES ---
-    with st.expander("🚛 Cargar Listado Maestro de Proveedores (Excel)"):
+    with st.expander("🚛 Cargar Listado Maestro de Proveedores (Excel/CSV)"):
         st.markdown("Sube tu archivo de proveedores. El sistema mantendrá la integridad si un proveedor también actúa como cliente.")
-        archivo_proveedores = st.file_uploader("Selecciona el Excel de Proveedores (.xlsx)", type=["xlsx"], key="cfg_proveedores")
-        
-        if archivo_proveedores is not None:
+        cargador_maestro("PROVEEDOR", "Proveedores", "cfg_proveedores")
+
+    # --- MIGRACIONES DEL ESQUEMA ---
+    st.markdown("---")
+    with st.expander("🗄️ Migraciones del Esquema"):
+        st.dataframe(pd.DataFrame(migraciones.estado()), use_container_width=True, hide_index=True)
+        if st.button("▶️ Aplicar Migraciones Pendientes", key="btn_migrar"):
             try:
-                df_crudo_prov = pd.read_excel(archivo_proveedores, header=None)
-                fila_cabecera_prov = None
-                for idx, fila in df_crudo_prov.iterrows():
-                    valores_fila = fila.astype(str).str.strip().str.upper().tolist()
-                    if 'RIF' in valores_fila and 'NOMBRE' in valores_fila:
-                        fila_cabecera_prov = idx
-                        break
-                
-                if fila_cabecera_prov is not None:
-                    df_prov = pd.read_excel(archivo_proveedores, header=fila_cabecera_prov)
-                    df_prov.columns = df_prov.columns.str.strip().str.upper()
-                    st.dataframe(df_prov.head(3), use_container_width=True)
-                    
-                    if st.button("🚀 Confirmar e Importar Proveedores", key="btn_cfg_prov"):
-                        conn = database.conectar()
-                        cursor = conn.cursor()
-                        contador_prov = 0
-                        for index, fila in df_prov.iterrows():
-                            if pd.isna(fila['RIF']) or pd.isna(fila['NOMBRE']) or str(fila['RIF']).strip().upper() == 'RIF':
-                                continue
-                            rif = str(fila['RIF']).strip()
-                            nombre = str(fila['NOMBRE']).strip()
-                            direccion = str(fila['DIRECCION']).strip() if 'DIRECCION' in df_prov.columns and not pd.isna(fila['DIRECCION']) else "Dirección no especificada"
-                            
-                            cursor.execute("""
-                                INSERT INTO entidades (rif, nombre, direccion, tipo_persona, tipo_contribuyente, categoria) 
-                                VALUES (%s, %s, %s, 'Jurídica Domiciliada', 'Ordinario', 'PROVEEDOR')
-                                ON CONFLICT (rif) DO UPDATE SET 
-                                    nombre = EXCLUDED.nombre, 
-                                    direccion = EXCLUDED.direccion,
-                                    categoria = CASE WHEN entidades.categoria = 'CLIENTE' THEN 'AMBOS' ELSE 'PROVEEDOR' END
-                            """, (rif, nombre, direccion))
-                            contador_prov += 1
-                        conn.commit()
-                        cursor.close()
-                        conn.close()
-                        st.success(f"✨ ¡Éxito! {contador_prov} proveedores migrados a Neon.")
-                        st.rerun()
-                else:
-                    st.error("No se encontró la fila con los encabezados 'RIF' y 'NOMBRE'.")
-            except Exception as e: st.error(f"Error: {e}")
+                with database.obtener_conexion() as conn:
+                    nuevas = migraciones.migrar(conn)
+                migraciones.asegurar_esquema.clear()
+                database.registrar_log(st.session_state.get('usuario_autenticado', 'admin'), "MIGRAR", "schema_version", f"Aplicó migraciones: {nuevas}")
+                st.success(f"Migraciones aplicadas: {nuevas}" if nuevas else "El esquema ya está al día.")
+            except migraciones.ErrorMigracion as e:
+                st.error(f"Error: {e}")
+
+    # --- DIAGNÓSTICO DEL POOL DE CONEXIONES ---
+    with st.expander("🩺 Estado del Pool de Conexiones"):
+        st.markdown("Si `timeouts` o `esperas` crecen, aumente `pool_max` en los secrets; si `libres` se mantiene alto, reduzca `pool_min`.")
+        stats = database.estadisticas_pool()
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("En uso", stats["en_uso"], help=f"Máximo observado: {stats['max_en_uso']}")
+        m2.metric("Abiertas", f"{stats['abiertas']} / {stats['maximo']}")
+        m3.metric("Esperas", stats["esperas"], help=f"Promedio: {stats['espera_promedio_ms']} ms")
+        m4.metric("Timeouts", stats["timeouts"])
+        st.json(stats)
+
+    with st.expander("📝 Escritor de Auditoría"):
+        st.markdown("Los eventos de auditoría se escriben por lotes en segundo plano. `descartados` debe mantenerse en cero.")
+        aud = database.estadisticas_auditoria()
+        a1, a2, a3, a4 = st.columns(4)
+        a1.metric("Encolados", aud["encolados"])
+        a2.metric("Escritos", aud["escritos"], help=f"Lotes: {aud['lotes']}")
+        a3.metric("En cola", aud["en_cola"])
+        a4.metric("Descartados", aud["descartados"])
+        st.json(aud)
+
+    with st.expander("🗃️ Caché de Datos de Referencia"):
+        st.markdown("Si `escuchando` es falso, los cambios hechos desde otras instancias se verán al vencer el TTL.")
+        st.json(cache_datos.estadisticas())
+
+    with st.expander("⏱️ Consultas a la Base"):
+        monitor = database.obtener_monitor()
+        st.markdown(f"Latencias de este proceso desde su inicio (o el último reinicio). Las consultas de más de "
+                    f"**{monitor.umbral_lenta_ms:.0f} ms** quedan en el registro de lentas (`umbral_lenta_ms` en secrets [monitoreo]).")
+        st.markdown("**Tiempo de base por rerun**")
+        st.dataframe(monitor.reruns(), use_container_width=True, hide_index=True)
+
+        consultas = monitor.consultas()
+        paginas = ["Todas"] + sorted(consultas["pagina"].unique().tolist())
+        pagina_sel = st.selectbox("Página", paginas, key="mon_pagina")
+        if pagina_sel != "Todas":
+            consultas = consultas[consultas["pagina"] == pagina_sel]
+        st.markdown("**Consultas más pesadas (tiempo total)**")
+        st.dataframe(consultas.head(25), use_container_width=True, hide_index=True)
+
+        st.markdown("**Consultas lentas recientes**")
+        st.dataframe(monitor.lentas(), use_container_width=True, hide_index=True)
+        if st.button("🧹 Reiniciar Métricas", key="btn_mon_reiniciar"):
+            monitor.reiniciar()
+            st.rerun()
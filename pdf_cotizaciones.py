@@ -0,0 +1,172 @@
+# pdf_cotizaciones.py
+"""Motor de PDF para cotizaciones.
+
+Estilos, encabezado de la empresa y formato de tabla se arman una sola vez por
+motor (y por proceso, vía `obtener_motor`). Una cotización se genera en el
+mismo proceso; los lotes grandes se reparten en un pool de procesos y los PDF
+se escriben en un ZIP a medida que llegan.
+
+No importa streamlit: los procesos del pool lo cargan rápido.
+
+Uso administrativo:  python pdf_cotizaciones.py --benchmark [N]
+"""
+import io
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import lru_cache
+from xml.sax.saxutils import escape
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+TASA_IVA = 0.16  # solo si la cotización no trae su tasa_iva
+ANCHOS_COLUMNAS = [50, 250, 80, 80]
+
+class MotorPDF:
+    """Genera cotizaciones con estilos y datos de empresa precargados.
+
+    Cada cotización es un dict: numero, fecha, cliente {nombre, rif}, items
+    [{cantidad, descripcion, precio, total}] y, opcional, tasa_iva (la vigente
+    según `impuestos`; este módulo no consulta la base).
+    """
+
+    def __init__(self, info_empresa):
+        estilos = getSampleStyleSheet()
+        self.estilo_titulo = ParagraphStyle('TituloCotizacion', parent=estilos['Title'], fontSize=16, alignment=0)
+        self.estilo_normal = ParagraphStyle('NormalCotizacion', parent=estilos['Normal'], fontSize=10)
+        self.estilo_celda = ParagraphStyle('CeldaCotizacion', parent=self.estilo_normal, fontSize=9)
+        self.encabezado = [
+            Paragraph(f"<b>{escape(info_empresa.get('nombre_empresa') or '')}</b>", self.estilo_titulo),
+            Paragraph(f"RIF: {info_empresa.get('rif_empresa') or ''}", self.estilo_normal),
+            Paragraph(escape(info_empresa.get('direccion_empresa') or ''), self.estilo_normal),
+            Spacer(1, 12),
+        ]
+        self.formato_tabla = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1F3B5C')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -4), 0.5, colors.grey),
+            ('LINEABOVE', (2, -3), (-1, -3), 1, colors.black),
+            ('FONTNAME', (2, -1), (-1, -1), 'Helvetica-Bold'),
+        ])
+
+    def _construir(self, cotizacion):
+        """Arma el PDF; retorna (bytes, páginas)."""
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=letter, title=f"Cotización {cotizacion['numero']}")
+        cliente = cotizacion['cliente']
+        story = list(self.encabezado)
+        story.append(Paragraph(f"<b>Cotización:</b> {cotizacion['numero']} | <b>Fecha:</b> {cotizacion['fecha']}", self.estilo_normal))
+        story.append(Paragraph(f"<b>Cliente:</b> {escape(cliente['nombre'])} | <b>RIF:</b> {cliente['rif']}", self.estilo_normal))
+        story.append(Spacer(1, 12))
+
+        tabla_data = [["Cant", "Descripción", "Precio", "Total"]]
+        subtotal = 0
+        for item in cotizacion['items']:
+            subtotal += item['total']
+            tabla_data.append([str(item['cantidad']), Paragraph(escape(str(item['descripcion'])), self.estilo_celda),
+                               f"${item['precio']:,.2f}", f"${item['total']:,.2f}"])
+        tasa_iva = cotizacion.get('tasa_iva', TASA_IVA)
+        iva = round(subtotal * tasa_iva, 2)
+        tabla_data.append(["", "", "Subtotal:", f"${subtotal:,.2f}"])
+        tabla_data.append(["", "", f"IVA {tasa_iva:.0%}:", f"${iva:,.2f}"])
+        tabla_data.append(["", "", "Total:", f"${subtotal + iva:,.2f}"])
+
+        tabla = Table(tabla_data, colWidths=ANCHOS_COLUMNAS, repeatRows=1)
+        tabla.setStyle(self.formato_tabla)
+        story.append(tabla)
+        doc.build(story)
+        return buffer.getvalue(), doc.page
+
+    def generar(self, cotizacion):
+        """PDF de una cotización como bytes."""
+        return self._construir(cotizacion)[0]
+
+@lru_cache(maxsize=8)
+def _motor_cacheado(datos_empresa):
+    return MotorPDF(dict(datos_empresa))
+
+def obtener_motor(info_empresa):
+    """Motor reutilizado mientras los datos de la empresa no cambien."""
+    return _motor_cacheado(tuple(sorted((k, v) for k, v in info_empresa.items() if isinstance(v, str))))
+
+# --- Lotes en un pool de procesos ---
+
+_motor_proceso = None
+
+def _iniciar_proceso(info_empresa):
+    global _motor_proceso
+    _motor_proceso = MotorPDF(info_empresa)
+
+def _generar_en_proceso(cotizacion):
+    contenido, paginas = _motor_proceso._construir(cotizacion)
+    return cotizacion['numero'], contenido, paginas
+
+def nombre_archivo(numero):
+    return f"Cotizacion_{numero}.pdf"
+
+def generar_lote(info_empresa, cotizaciones, destino=None, procesos=None, tamano_bloque=8):
+    """Genera muchas cotizaciones en paralelo y las escribe en un ZIP.
+
+    `destino` es un archivo binario abierto (por defecto un BytesIO nuevo). Cada
+    proceso del pool arma su motor una sola vez. Retorna (destino, páginas totales).
+    """
+    destino = destino if destino is not None else io.BytesIO()
+    paginas = 0
+    with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        with ProcessPoolExecutor(max_workers=procesos or os.cpu_count(),
+                                 initializer=_iniciar_proceso, initargs=(info_empresa,)) as pool:
+            for numero, contenido, n in pool.map(_generar_en_proceso, cotizaciones, chunksize=tamano_bloque):
+                zf.writestr(nombre_archivo(numero), contenido)
+                paginas += n
+    if hasattr(destino, "seek"):
+        destino.seek(0)
+    return destino, paginas
+
+# --- Benchmark ---
+
+def _cotizacion_prueba(i, items=40):
+    lineas = [{"cantidad": j % 7 + 1, "descripcion": f"Repuesto de prueba {j:03d}", "precio": 12.5 + j,
+               "total": (j % 7 + 1) * (12.5 + j)} for j in range(items)]
+    return {"numero": f"PRUEBA-{i:06d}", "fecha": date.today(), "cliente": {"nombre": f"Cliente {i}", "rif": "J-00000000-0"},
+            "items": lineas}
+
+def benchmark(n=200, procesos=None):
+    """Páginas por segundo generando `n` cotizaciones en el proceso y en el pool."""
+    empresa = {"nombre_empresa": "ADONAI GROUP", "rif_empresa": "J-00000000-0", "direccion_empresa": "Caracas"}
+    cotizaciones = [_cotizacion_prueba(i) for i in range(n)]
+
+    motor = obtener_motor(empresa)
+    inicio = time.perf_counter()
+    paginas_local = sum(motor._construir(c)[1] for c in cotizaciones)
+    seg_local = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    _, paginas_pool = generar_lote(empresa, cotizaciones, procesos=procesos)
+    seg_pool = time.perf_counter() - inicio
+
+    return {
+        "cotizaciones": n,
+        "en_proceso": {"paginas": paginas_local, "segundos": round(seg_local, 3), "paginas_por_segundo": round(paginas_local / seg_local, 1)},
+        "pool": {"procesos": procesos or os.cpu_count(), "paginas": paginas_pool, "segundos": round(seg_pool, 3),
+                 "paginas_por_segundo": round(paginas_pool / seg_pool, 1)},
+    }
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        pos = sys.argv.index("--benchmark")
+        n = int(sys.argv[pos + 1]) if len(sys.argv) > pos + 1 else 200
+        res = benchmark(n)
+        for modo in ("en_proceso", "pool"):
+            r = res[modo]
+            print(f"{modo:<11} {r['paginas']:>6} páginas en {r['segundos']:>7.3f}s  ->  {r['paginas_por_segundo']:>8.1f} páginas/s")
+    else:
+        print(__doc__)
@@ -0,0 +1,142 @@
+# periodos.py
+"""Cierre y reapertura de períodos fiscales (AAAA-MM).
+
+Cerrar un período lo valida, lo bloquea (los triggers de la migración 13
+rechazan escrituras en `compras`, `asientos_cabecera` y `asientos_detalle` con
+fecha en un período cerrado) y deja instantáneas inmutables de los saldos por
+cuenta y del Libro de Compras. Los reportes de períodos cerrados leen esas
+instantáneas. Reabrir no borra nada: el siguiente cierre solo aplica las
+diferencias. Los triggers leen la fila del período con FOR SHARE (migración 17),
+así el cierre espera a que confirmen los registros del mes que ya estaban en curso.
+"""
+from datetime import date
+import cache_datos
+import contabilizacion
+import database
+
+CERRADO = "Cerrado"
+ABIERTO = "Abierto"
+
+SQL_VALIDAR = """
+    SELECT 'Asientos descuadrados' AS problema, COUNT(*) AS cantidad
+    FROM asientos_cabecera WHERE fecha >= %(desde)s AND fecha < %(hasta)s AND total_debe <> total_haber
+    UNION ALL
+    SELECT 'Asientos sin líneas', COUNT(*)
+    FROM asientos_cabecera WHERE fecha >= %(desde)s AND fecha < %(hasta)s AND total_debe = 0 AND total_haber = 0
+    UNION ALL
+    SELECT 'Compras sin asiento', COUNT(*)
+    FROM compras WHERE fecha >= %(desde)s AND fecha < %(hasta)s AND asiento_id IS NULL
+"""
+
+SQL_INSTANTANEA_SALDOS = """
+    INSERT INTO snapshot_saldos (periodo, cuenta_codigo, centro_costo_id, debe, haber)
+    SELECT periodo, cuenta_codigo, centro_costo_id, debe, haber FROM saldos_cuenta WHERE periodo = %(periodo)s
+    ON CONFLICT (periodo, cuenta_codigo, centro_costo_id) DO UPDATE SET debe = EXCLUDED.debe, haber = EXCLUDED.haber
+    WHERE (snapshot_saldos.debe, snapshot_saldos.haber) IS DISTINCT FROM (EXCLUDED.debe, EXCLUDED.haber);
+    DELETE FROM snapshot_saldos s WHERE s.periodo = %(periodo)s AND NOT EXISTS (
+        SELECT 1 FROM saldos_cuenta c
+        WHERE c.periodo = s.periodo AND c.cuenta_codigo = s.cuenta_codigo AND c.centro_costo_id = s.centro_costo_id);
+"""
+
+SQL_INSTANTANEA_LIBRO = """
+    INSERT INTO snapshot_libro_compras (periodo, compra_id, fecha, rif, nombre, num_factura, num_control, tipo_documento,
+                                        base_imponible, monto_exento, iva_monto, iva_retenido, total_factura,
+                                        saldo_pendiente)
+    SELECT %(periodo)s, c.id, c.fecha, e.rif, e.nombre, c.num_factura, c.num_control, c.tipo_documento,
+           c.base_imponible, COALESCE(c.monto_exento, 0), c.iva_monto, c.iva_retenido, c.total_factura, c.saldo_pendiente
+    FROM compras c JOIN entidades e ON c.rif_proveedor = e.rif
+    WHERE c.fecha >= %(desde)s AND c.fecha < %(hasta)s
+    ON CONFLICT (periodo, compra_id) DO UPDATE SET
+        fecha = EXCLUDED.fecha, rif = EXCLUDED.rif, nombre = EXCLUDED.nombre, num_factura = EXCLUDED.num_factura,
+        num_control = EXCLUDED.num_control, tipo_documento = EXCLUDED.tipo_documento,
+        base_imponible = EXCLUDED.base_imponible, monto_exento = EXCLUDED.monto_exento, iva_monto = EXCLUDED.iva_monto,
+        iva_retenido = EXCLUDED.iva_retenido, total_factura = EXCLUDED.total_factura, saldo_pendiente = EXCLUDED.saldo_pendiente
+    WHERE (snapshot_libro_compras.fecha, snapshot_libro_compras.rif, snapshot_libro_compras.nombre,
+           snapshot_libro_compras.num_factura, snapshot_libro_compras.num_control, snapshot_libro_compras.tipo_documento,
+           snapshot_libro_compras.base_imponible, snapshot_libro_compras.monto_exento, snapshot_libro_compras.iva_monto,
+           snapshot_libro_compras.iva_retenido, snapshot_libro_compras.total_factura, snapshot_libro_compras.saldo_pendiente)
+        IS DISTINCT FROM
+          (EXCLUDED.fecha, EXCLUDED.rif, EXCLUDED.nombre, EXCLUDED.num_factura, EXCLUDED.num_control,
+           EXCLUDED.tipo_documento, EXCLUDED.base_imponible, EXCLUDED.monto_exento, EXCLUDED.iva_monto,
+           EXCLUDED.iva_retenido, EXCLUDED.total_factura, EXCLUDED.saldo_pendiente);
+    DELETE FROM snapshot_libro_compras s WHERE s.periodo = %(periodo)s AND NOT EXISTS (
+        SELECT 1 FROM compras c JOIN entidades e ON c.rif_proveedor = e.rif
+        WHERE c.id = s.compra_id AND c.fecha >= %(desde)s AND c.fecha < %(hasta)s);
+"""
+
+def nombre(mes, ano):
+    return f"{int(ano)}-{int(mes):02d}"
+
+def rango(periodo):
+    """Primer día del período y primer día del siguiente."""
+    ano, mes = map(int, periodo.split("-"))
+    desde = date(ano, mes, 1)
+    hasta = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    return desde, hasta
+
+def cerrados():
+    """Conjunto de períodos cerrados (caché de referencia, invalidada por NOTIFY)."""
+    df = cache_datos.consultar(("periodos_fiscales",), "SELECT periodo FROM periodos_fiscales WHERE estatus = 'Cerrado'")
+    return set(df["periodo"])
+
+def esta_cerrado(periodo):
+    return periodo in cerrados()
+
+def listado():
+    return database.consultar_df("""SELECT periodo, estatus, cerrado_por, cerrado_en
+                                    FROM periodos_fiscales ORDER BY periodo DESC""")
+
+def validar(periodo, conn=None):
+    """Problemas que impiden cerrar: lista de (descripción, cantidad), vacía si el período está en orden."""
+    desde, hasta = rango(periodo)
+    if conn is None:
+        with database.obtener_conexion() as propia:
+            return validar(periodo, propia)
+    with conn.cursor() as c:
+        c.execute(SQL_VALIDAR, {"desde": desde, "hasta": hasta})
+        return [(problema, cantidad) for problema, cantidad in c.fetchall() if cantidad]
+
+def cerrar(periodo, usuario):
+    """Valida, sincroniza las instantáneas y marca el período como cerrado, todo en una transacción.
+
+    Retorna (True, filas de instantánea modificadas) o (False, problemas de validación).
+    """
+    desde, hasta = rango(periodo)
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            # La fila del período bloqueada: nadie más cierra ni reabre, ni registra en el mes, mientras tanto
+            c.execute("INSERT INTO periodos_fiscales (periodo, estatus) VALUES (%s, %s) ON CONFLICT (periodo) DO NOTHING",
+                      (periodo, ABIERTO))
+            c.execute("SELECT estatus FROM periodos_fiscales WHERE periodo = %s FOR UPDATE", (periodo,))
+            if c.fetchone()[0] == CERRADO:
+                conn.rollback()
+                return True, 0
+            # Las compras anteriores a la contabilización automática reciben sus líneas antes de validar
+            contabilizacion.contabilizar_pendientes(conn, desde, hasta)
+            problemas = validar(periodo, conn)
+            if problemas:
+                conn.rollback()
+                return False, problemas
+            c.execute("SET LOCAL adonai.cierre = 'on'")
+            params = {"periodo": periodo, "desde": desde, "hasta": hasta}
+            cambios = 0
+            for sentencia in (SQL_INSTANTANEA_SALDOS + SQL_INSTANTANEA_LIBRO).split(";"):
+                if sentencia.strip():
+                    c.execute(sentencia, params)
+                    cambios += c.rowcount
+            c.execute("""UPDATE periodos_fiscales SET estatus = %s, cerrado_por = %s, cerrado_en = CURRENT_TIMESTAMP
+                         WHERE periodo = %s""", (CERRADO, usuario, periodo))
+        conn.commit()
+    cache_datos.invalidar("periodos_fiscales")
+    return True, cambios
+
+def reabrir(periodo):
+    """Vuelve a abrir el período. Las instantáneas se conservan y el próximo cierre solo aplica diferencias."""
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            c.execute("""UPDATE periodos_fiscales SET estatus = %s, cerrado_por = NULL, cerrado_en = NULL
+                         WHERE periodo = %s AND estatus = %s""", (ABIERTO, periodo, CERRADO))
+            reabierto = c.rowcount > 0
+        conn.commit()
+    cache_datos.invalidar("periodos_fiscales")
+    return reabierto
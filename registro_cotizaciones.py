@@ -0,0 +1,131 @@
+# registro_cotizaciones.py
+"""Persistencia y búsqueda de cotizaciones.
+
+Los números salen del asignador de correlativos (origen COT, por año), así que
+no se repiten. Cada cotización se guarda con todas sus líneas en una sola
+sentencia: un INSERT de la cabecera en un CTE y un INSERT de varias filas del
+detalle. El historial pagina por llave (fecha, id) descendente.
+"""
+from datetime import date, timedelta
+import database
+import correlativos
+import impuestos
+
+ORIGEN = "COT"
+
+SQL_GUARDAR = """
+    WITH cab AS (
+        INSERT INTO cotizaciones (numero, fecha, rif_cliente, subtotal, iva, total, creado_por)
+        VALUES (%(numero)s, %(fecha)s, %(rif)s, %(subtotal)s, %(iva)s, %(total)s, %(usuario)s)
+        RETURNING id
+    )
+    INSERT INTO cotizacion_items (cotizacion_id, linea, descripcion, cantidad, precio, total)
+    SELECT cab.id, v.linea, v.descripcion, v.cantidad, v.precio, v.total
+    FROM cab, (VALUES {valores}) AS v (linea, descripcion, cantidad, precio, total)
+"""
+
+SQL_BUSCAR = """
+    SELECT q.id, q.numero, q.fecha, q.rif_cliente, e.nombre AS cliente, q.subtotal, q.iva, q.total, q.creado_por
+    FROM cotizaciones q LEFT JOIN entidades e ON e.rif = q.rif_cliente
+    WHERE TRUE {filtros}
+    ORDER BY q.fecha DESC, q.id DESC
+"""
+
+def totales(items, fecha=None):
+    subtotal = round(sum(item["total"] for item in items), 2)
+    iva = round(subtotal * impuestos.parametros(fecha).tasa_iva, 2)
+    return subtotal, iva, round(subtotal + iva, 2)
+
+def guardar(rif_cliente, items, usuario, fecha=None):
+    """Guarda la cotización con sus líneas en una transacción y retorna su número."""
+    if not items:
+        raise ValueError("La cotización no tiene artículos.")
+    fecha = fecha or date.today()
+    subtotal, iva, total = totales(items, fecha)
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            numero = correlativos.siguiente(ORIGEN, fecha.year, conn)
+            fila = "(%s::int, %s::text, %s::numeric, %s::numeric, %s::numeric)"
+            valores = ",".join(
+                c.mogrify(fila, (i, item["descripcion"], item["cantidad"], item["precio"], item["total"])).decode()
+                for i, item in enumerate(items, start=1))
+            # Los valores ya van citados; se escapan los % para el segundo paso de parámetros
+            c.execute(SQL_GUARDAR.replace("{valores}", valores.replace("%", "%%")),
+                      {"numero": numero, "fecha": fecha, "rif": rif_cliente, "subtotal": subtotal,
+                       "iva": iva, "total": total, "usuario": usuario})
+        conn.commit()
+    return numero
+
+def _filtros(rif_cliente=None, desde=None, hasta=None, numero=None):
+    """Condiciones SQL y parámetros para los filtros indicados (los vacíos se omiten)."""
+    condiciones, params = [], {}
+    if rif_cliente:
+        condiciones.append("q.rif_cliente = %(rif)s")
+        params["rif"] = rif_cliente
+    if desde:
+        condiciones.append("q.fecha >= %(desde)s")
+        params["desde"] = desde
+    if hasta:
+        condiciones.append("q.fecha <= %(hasta)s")
+        params["hasta"] = hasta
+    if numero:
+        # Prefijo con LIKE: usa idx_cotizaciones_numero (text_pattern_ops)
+        condiciones.append("q.numero LIKE %(numero)s")
+        params["numero"] = numero.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return condiciones, params
+
+def buscar(rif_cliente=None, desde=None, hasta=None, numero=None, despues_de=None, tamano=100):
+    """Página del historial, de la cotización más reciente a la más antigua.
+
+    `despues_de` es la llave (fecha, id) de la última fila vista; `hasta` es inclusivo.
+    """
+    condiciones, params = _filtros(rif_cliente, desde, hasta, numero)
+    if despues_de is not None:
+        condiciones.append("(q.fecha, q.id) < (%(fecha)s, %(id)s)")
+        params.update({"fecha": despues_de[0], "id": despues_de[1]})
+    filtros = "".join(f" AND {cond}" for cond in condiciones)
+    return database.consultar_pagina(SQL_BUSCAR.format(filtros=filtros), params, tamano)
+
+def _armar(cabeceras, lineas):
+    """Dicts listos para pdf_cotizaciones a partir de filas de cabecera y de detalle."""
+    por_id = {}
+    for id_q, numero, fecha, rif, nombre in cabeceras:
+        por_id[id_q] = {"numero": numero, "fecha": fecha, "cliente": {"nombre": nombre or rif, "rif": rif}, "items": [],
+                        "tasa_iva": impuestos.parametros(fecha).tasa_iva}
+    for id_q, descripcion, cantidad, precio, total in lineas:
+        por_id[id_q]["items"].append({"descripcion": descripcion, "cantidad": float(cantidad),
+                                      "precio": float(precio), "total": float(total)})
+    return list(por_id.values())
+
+SQL_CABECERAS = """
+    SELECT q.id, q.numero, q.fecha, q.rif_cliente, e.nombre
+    FROM cotizaciones q LEFT JOIN entidades e ON e.rif = q.rif_cliente
+    WHERE {condicion}
+    ORDER BY q.fecha, q.id
+"""
+
+SQL_LINEAS = """
+    SELECT cotizacion_id, descripcion, cantidad, precio, total
+    FROM cotizacion_items WHERE cotizacion_id = ANY(%s)
+    ORDER BY cotizacion_id, linea
+"""
+
+def _cargar(condicion, params):
+    with database.obtener_conexion() as conn:
+        with conn.cursor() as c:
+            c.execute(SQL_CABECERAS.format(condicion=condicion), params)
+            cabeceras = c.fetchall()
+            c.execute(SQL_LINEAS, ([fila[0] for fila in cabeceras],))
+            lineas = c.fetchall()
+    return _armar(cabeceras, lineas)
+
+def obtener(numero):
+    """Cotización guardada con sus líneas, lista para regenerar el PDF (None si no existe)."""
+    encontradas = _cargar("q.numero = %(numero)s", {"numero": numero})
+    return encontradas[0] if encontradas else None
+
+def del_mes(mes, ano):
+    """Todas las cotizaciones del mes con sus líneas, para reemitirlas en lote."""
+    desde = date(ano, mes, 1)
+    hasta = (desde + timedelta(days=32)).replace(day=1)
+    return _cargar("q.fecha >= %(desde)s AND q.fecha < %(hasta)s", {"desde": desde, "hasta": hasta})